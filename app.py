@@ -5,46 +5,38 @@ Three-column layout with no sidebar
 import streamlit as st
 import time
 import base64
-import re
-import requests
-import io
-import pandas as pd
+import functools
+import html
 from pathlib import Path
-from bs4 import BeautifulSoup
-from PIL import Image
-from openai import OpenAI
-import anthropic
-import google.generativeai as genai
-
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
-try:
-    import pdfplumber
-except ImportError:
-    pdfplumber = None
 
 from config import (
-    OPENAI_API_KEY, ANTHROPIC_API_KEY, GOOGLE_API_KEY,
     OPENAI_MODELS, ANTHROPIC_MODELS, GOOGLE_MODELS, ALL_MODELS,
-    NO_TEMPERATURE_MODELS, get_system_prompt, get_facilitator_prompt,
+    get_facilitator_prompt,
     get_avatar, check_api_keys,
     # Personality system
     AI_PERSONALITIES, PERSONALITY_MODES,
-    get_personality_info, get_personality_avatar, get_all_personality_ids,
-    # URL reading
-    URL_READING_CONFIG, URL_PATTERN, URL_ANALYSIS_PROMPT_ADDITION,
+    get_personality_info, get_personality_avatar,
     # Dynamic expertise
-    EXPERTISE_EXTRACTION_PROMPT, DYNAMIC_EXPERTISE_PROMPT_TEMPLATE,
+    DYNAMIC_EXPERTISE_PROMPT_TEMPLATE,
     # File upload
-    FILE_UPLOAD_CONFIG, VISION_ANALYSIS_PROMPT,
+    FILE_UPLOAD_CONFIG, INGESTION_CONFIG,
     # NotebookLM settings
     NOTEBOOKLM_ENABLED, NOTEBOOKLM_REGION, GCP_PROJECT_NUMBER,
-    DEFAULT_FACILITATOR,
+    DEFAULT_FACILITATOR, JOB_CONFIG,
     # Synthesis report formats
-    SYNTHESIS_FORMATS, get_facilitator_prompt_by_format
+    SYNTHESIS_FORMATS
 )
+from providers import get_clients, client_errors
+from routing import get_router
+from hedging import get_hedger
+from rate_limit import get_rate_limiter
+from response_cache import get_response_cache
+from expertise import build_expertise_source, prefetch_dynamic_expertise
+from discussion import assign_personalities, detect_url, fetch_url_content
+from jobs import get_job_registry
+from checkpoints import load_checkpoint
+from reports import REPORT_FORMATS, render_reports, safe_filename
+from ingestion import get_ingestion_queue
 
 
 
@@ -62,6 +54,7 @@ st.set_page_config(
 )
 
 # --- Logo Helper Function ---
+@functools.lru_cache(maxsize=1)
 def get_logo_base64():
     """Load logo as base64 for embedding"""
     logo_path = Path(__file__).parent / "assets" / "xexon_logo.png"
@@ -941,546 +934,63 @@ header {visibility: hidden;}
     font-weight: 600;
     margin-left: 0.5rem;
 }
+
+.turn-note {
+    color: var(--text-secondary);
+    font-size: 0.875rem;
+    margin: 0.25rem 0;
+}
 </style>
 """, unsafe_allow_html=True)
 
 
 # --- API Status ---
 api_status = check_api_keys()
+for _provider in client_errors():
+    api_status[_provider] = False  # Key set but unusable: keep its models unselectable
 
 # --- Initialize Clients ---
-@st.cache_resource
 def init_clients():
-    clients = {"openai": None, "anthropic": None, "google": None}
-    if OPENAI_API_KEY:
-        try:
-            clients["openai"] = OpenAI(api_key=OPENAI_API_KEY)
-        except Exception:
-            pass
-    if ANTHROPIC_API_KEY:
-        try:
-            clients["anthropic"] = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        except Exception:
-            pass
-    if GOOGLE_API_KEY:
-        try:
-            genai.configure(api_key=GOOGLE_API_KEY)
-            clients["google"] = True
-        except Exception:
-            pass
-    return clients
-
-
-# --- URL Detection and Content Fetching ---
-def detect_url(text: str) -> str | None:
-    """Detect first URL in text"""
-    match = re.search(URL_PATTERN, text)
-    return match.group(0) if match else None
-
-
-def fetch_url_content(url: str) -> dict:
-    """
-    Fetch and extract content from URL
-    Returns: {"success": bool, "title": str, "content": str, "error": str}
-    """
-    if not URL_READING_CONFIG.get("enabled", True):
-        return {"success": False, "title": "", "content": "", "error": "URL reading disabled"}
-    
-    try:
-        headers = {"User-Agent": URL_READING_CONFIG.get("user_agent", "")}
-        response = requests.get(
-            url, 
-            headers=headers, 
-            timeout=URL_READING_CONFIG.get("timeout", 10)
-        )
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove script, style, nav, footer elements
-        for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-            element.decompose()
-        
-        # Extract title
-        title = ""
-        if soup.title:
-            title = soup.title.string.strip() if soup.title.string else ""
-        elif soup.find('h1'):
-            title = soup.find('h1').get_text(strip=True)
-        
-        # Extract main content (try common article selectors)
-        content = ""
-        article_selectors = ['article', 'main', '.article-body', '.post-content', '#content', '.entry-content']
-        
-        for selector in article_selectors:
-            article = soup.select_one(selector)
-            if article:
-                content = article.get_text(separator='\n', strip=True)
-                break
-        
-        # Fallback: get body text
-        if not content:
-            body = soup.find('body')
-            if body:
-                content = body.get_text(separator='\n', strip=True)
-        
-        # Truncate if too long
-        max_length = URL_READING_CONFIG.get("max_content_length", 8000)
-        if len(content) > max_length:
-            content = content[:max_length] + "\n\n[... Article content truncated ...]"
-        
-        return {
-            "success": True,
-            "title": title,
-            "content": content,
-            "url": url,
-            "error": ""
-        }
-        
-    except requests.Timeout:
-        return {"success": False, "title": "", "content": "", "error": "Timeout: No response from server"}
-    except requests.RequestException as e:
-        return {"success": False, "title": "", "content": "", "error": f"Fetch error: {str(e)}"}
-    except Exception as e:
-        return {"success": False, "title": "", "content": "", "error": f"Parse error: {str(e)}"}
-
-
-# --- Dynamic Expertise Extraction ---
-def extract_dynamic_expertise(content: str, clients: dict) -> str:
-    """
-    トピックまたは記事内容から動的に専門性コンテキストを生成
-    軽量モデルを使用してコスト節約
-    """
-    if not content or len(content.strip()) < 10:
-        return ""
-    
-    # 入力を適切な長さに制限
-    truncated_content = content[:3000]
-    
-    extraction_prompt = EXPERTISE_EXTRACTION_PROMPT.format(content=truncated_content)
-    
-    try:
-        # 軽量・高速モデルを優先使用
-        if clients.get("google"):
-            model = genai.GenerativeModel("gemini-2.0-flash-exp")
-            response = model.generate_content(extraction_prompt)
-            return response.text.strip()
-        elif clients.get("openai"):
-            client = clients["openai"]
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": extraction_prompt}],
-                temperature=0.3,
-                max_tokens=300
-            )
-            return response.choices[0].message.content.strip()
-        elif clients.get("anthropic"):
-            client = clients["anthropic"]
-            response = client.messages.create(
-                model="claude-3-5-haiku-20241022",
-                max_tokens=300,
-                temperature=0.3,
-                messages=[{"role": "user", "content": extraction_prompt}]
-            )
-            return response.content[0].text.strip()
-    except Exception as e:
-        print(f"Expertise extraction failed: {e}")
-        return ""
-    
-    return ""
-
-
-# --- File Upload Processing Functions ---
-def get_file_extension(filename: str) -> str:
-    """Get file extension from filename"""
-    return filename.split('.')[-1].lower() if '.' in filename else ""
-
-
-def extract_pdf_text(file_bytes: bytes) -> dict:
-    """
-    Extract text from PDF
-    Returns: {"success": bool, "content": str, "error": str, "pages": int}
-    """
-    try:
-        # Try pdfplumber first (better text extraction)
-        if pdfplumber:
-            pdf_file = io.BytesIO(file_bytes)
-            with pdfplumber.open(pdf_file) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n\n"
-                
-                return {
-                    "success": True,
-                    "content": text.strip(),
-                    "error": "",
-                    "pages": len(pdf.pages)
-                }
-        
-        # Fallback to PyPDF2
-        elif PyPDF2:
-            pdf_file = io.BytesIO(file_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n\n"
-            
-            return {
-                "success": True,
-                "content": text.strip(),
-                "error": "",
-                "pages": len(pdf_reader.pages)
-            }
-        else:
-            return {"success": False, "content": "", "error": "PDF processing library not installed", "pages": 0}
-            
-    except Exception as e:
-        return {"success": False, "content": "", "error": f"PDF extraction error: {str(e)}", "pages": 0}
-
-
-def analyze_csv_excel(file_bytes: bytes, filename: str) -> dict:
-    """
-    Analyze CSV/Excel file and generate summary
-    Returns: {"success": bool, "content": str, "error": str}
-    """
-    try:
-        file_ext = get_file_extension(filename)
-        
-        # Read file
-        if file_ext == "csv":
-            df = pd.read_csv(io.BytesIO(file_bytes))
-        elif file_ext in ["xlsx", "xls"]:
-            df = pd.read_excel(io.BytesIO(file_bytes))
-        else:
-            return {"success": False, "content": "", "error": "Unsupported file format"}
-        
-        # Generate summary
-        summary = f"""
-# Data File Analysis Summary
-
-## Basic Info
-- Filename: {filename}
-- Rows: {len(df)}
-- Columns: {len(df.columns)}
-
-## Column List
-{', '.join(df.columns.tolist())}
-
-## Data Preview (First 5 rows)
-{df.head().to_string()}
+    """Shared provider clients (pooled connections, built once per process)"""
+    return get_clients()
 
-## Statistical Summary
-{df.describe().to_string()}
 
-## Data Types
-{df.dtypes.to_string()}
-"""
-        
-        return {"success": True, "content": summary, "error": ""}
-        
-    except Exception as e:
-        return {"success": False, "content": "", "error": f"Data analysis error: {str(e)}"}
-
-
-def analyze_image_with_vision(image_bytes: bytes, clients: dict) -> dict:
-    """
-    Analyze image using Vision API
-    Returns: {"success": bool, "content": str, "error": str}
-    """
-    try:
-        # Try OpenAI GPT-4o (best vision capabilities)
-        if clients.get("openai"):
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            
-            response = clients["openai"].chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": VISION_ANALYSIS_PROMPT},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            return {"success": True, "content": response.choices[0].message.content, "error": ""}
-        
-        # Try Google Gemini (good vision support)
-        elif clients.get("google"):
-            image = Image.open(io.BytesIO(image_bytes))
-            model = genai.GenerativeModel("gemini-2.0-flash-exp")
-            response = model.generate_content([VISION_ANALYSIS_PROMPT, image])
-            return {"success": True, "content": response.text, "error": ""}
-        
-        # Try Anthropic Claude (vision support)
-        elif clients.get("anthropic"):
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            
-            response = clients["anthropic"].messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/jpeg",
-                                    "data": base64_image,
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": VISION_ANALYSIS_PROMPT
-                            }
-                        ]
-                    }
-                ]
-            )
-            return {"success": True, "content": response.content[0].text, "error": ""}
-        
-        else:
-            return {"success": False, "content": "", "error": "Vision API not available (OpenAI/Google/Anthropic API key required)"}
-            
-    except Exception as e:
-        return {"success": False, "content": "", "error": f"Image analysis error: {str(e)}"}
+# --- File Ingestion Status ---
+INGESTION_STATUS_LABELS = {"queued": "⏳ 待機中", "processing": "⚙️ 処理中", "done": "✅ 完了", "failed": "❌ 失敗"}
 
 
-def process_uploaded_file(uploaded_file, clients: dict) -> dict:
+@st.fragment(run_every=INGESTION_CONFIG.get("poll_interval", 0.5))
+def ingestion_status():
     """
-    Process uploaded file and extract content
-    Returns: {"success": bool, "content": str, "error": str, "file_info": dict}
+    Per-file status of the queued uploads, refreshed on its own while they process.
+    Once every file has finished the results are added in upload order and the page reruns.
     """
-    file_bytes = uploaded_file.read()
-    filename = uploaded_file.name
-    file_ext = get_file_extension(filename)
-    file_size_mb = len(file_bytes) / (1024 * 1024)
-    
-    # Check file size
-    max_size = FILE_UPLOAD_CONFIG.get("max_file_size_mb", 10)
-    if file_size_mb > max_size:
-        return {
-            "success": False,
-            "content": "",
-            "error": f"File size too large ({file_size_mb:.1f}MB > {max_size}MB)",
-            "file_info": {}
-        }
-    
-    # Check extension
-    allowed_exts = FILE_UPLOAD_CONFIG.get("allowed_extensions", {})
-    if file_ext not in allowed_exts:
-        return {
-            "success": False,
-            "content": "",
-            "error": f"Unsupported file format: .{file_ext}",
-            "file_info": {}
-        }
-    
-    file_info = {
-        "name": filename,
-        "extension": file_ext,
-        "size_mb": file_size_mb,
-        "icon": allowed_exts[file_ext]["icon"]
-    }
-    
-    # Process based on file type
-    if file_ext == "pdf":
-        result = extract_pdf_text(file_bytes)
-        result["file_info"] = file_info
-        return result
-    
-    elif file_ext in ["csv", "xlsx", "xls"]:
-        result = analyze_csv_excel(file_bytes, filename)
-        result["file_info"] = file_info
-        return result
-    
-    elif file_ext in ["png", "jpg", "jpeg"]:
-        result = analyze_image_with_vision(file_bytes, clients)
-        result["file_info"] = file_info
-        return result
-    
-    elif file_ext in ["txt", "md"]:
-        try:
-            content = file_bytes.decode('utf-8')
-            return {
-                "success": True,
-                "content": content,
-                "error": "",
-                "file_info": file_info
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "content": "",
-                "error": f"Text reading error: {str(e)}",
-                "file_info": file_info
-            }
-    
-    return {
-        "success": False,
-        "content": "",
-        "error": "Unsupported file format",
-        "file_info": file_info
-    }
-
-
-# --- AI Call Function ---
-def ask_ai(model_name: str, clients: dict, history_text: str, is_first: bool = False, 
-           topic: str = "", temperature: float = 0.7, expertise: str = "General",
-           personality: str = None, url_content: dict = None, 
-           file_content: list = None,  # Now accepts list of file results
-           dynamic_expertise: str = None) -> str:
-    provider, model_id = ALL_MODELS[model_name]
-    system_prompt = get_system_prompt(expertise, personality, dynamic_expertise)
-    
-    # File content integration (highest priority) - now handles list
-    if file_content and len(file_content) > 0:
-        # Build combined file context
-        file_summaries = []
-        combined_content = []
-        
-        for f in file_content:
-            if f.get("success"):
-                file_info = f.get("file_info", {})
-                file_summaries.append(f"- {file_info.get('icon', '')} {file_info.get('name', 'unknown')} ({file_info.get('extension', '').upper()})")
-                combined_content.append(f"[{file_info.get('name', 'unknown')}]\n{f['content'][:4000]}")
-        
-        if combined_content:
-            file_context = f"""
-**Context: Analyzing Uploaded Files**
-You are analyzing content from {len(combined_content)} uploaded file(s).
-The user's question/instruction is: "{topic}"
-
-**Files:**
-{chr(10).join(file_summaries)}
-
-**File Contents:**
-{chr(10).join(combined_content)[:8000]}
-
-Focus your discussion on the file contents while addressing the user's question.
-"""
-            system_prompt = system_prompt + "\n" + file_context
-    
-    # URL content integration (if no file)
-    elif url_content and url_content.get("success"):
-        url_context = URL_ANALYSIS_PROMPT_ADDITION.format(
-            article_content=url_content["content"][:6000],
-            url=url_content.get("url", "")
-        )
-        system_prompt = system_prompt + "\n" + url_context
-
-    if is_first:
-        prompt = f"Topic: {topic}\n\nPlease propose your initial idea on this topic."
-    else:
-        prompt = f"Discussion so far:\n{history_text}\n\nBuild upon the previous ideas and add your unique perspective."
-
-    try:
-        if provider == "openai":
-            if not clients["openai"]:
-                return "❌ OpenAI API key not configured"
-            params = {
-                "model": model_id,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ]
-            }
-            if model_id not in NO_TEMPERATURE_MODELS:
-                params["temperature"] = temperature
-            response = clients["openai"].chat.completions.create(**params)
-            return response.choices[0].message.content
-
-        elif provider == "anthropic":
-            if not clients["anthropic"]:
-                return "❌ Anthropic API key not configured"
-            response = clients["anthropic"].messages.create(
-                model=model_id,
-                max_tokens=1500,
-                temperature=temperature,
-                system=system_prompt,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response.content[0].text
-
-        elif provider == "google":
-            if not clients["google"]:
-                return "❌ Google API key not configured"
-            model = genai.GenerativeModel(model_id, generation_config={"temperature": temperature})
-            full_prompt = f"{system_prompt}\n\n{prompt}"
-            response = model.generate_content(full_prompt)
-            return response.text
-
-    except Exception as e:
-        return f"❌ Error ({model_name}): {e}"
-
-
-# --- Facilitator Function ---
-def facilitate(facilitator_name: str, clients: dict, topic: str, full_log: str, collaborators: list, expertise: str = "General", synthesis_format: str = "default") -> str:
-    provider, model_id = ALL_MODELS[facilitator_name]
-
-    collab_list = "\n".join([f"- **{c}**" for c in collaborators])
-    facilitator_prompt = get_facilitator_prompt_by_format(synthesis_format, expertise).format(topic=topic, collaborator_list=collab_list)
-    
-    # Compress log for long discussions to avoid token limits
-    # Estimate: ~4 chars per token, keep under 8000 tokens for log
-    max_log_chars = 32000
-    if len(full_log) > max_log_chars:
-        # Keep first 25% and last 75% of discussion
-        split_point = len(full_log) // 4
-        compressed_log = full_log[:split_point] + "\n\n[... middle discussion compressed ...]\n\n" + full_log[-split_point*3:]
-        full_prompt = f"{facilitator_prompt}\n\n--- Discussion Log (Compressed) ---\n{compressed_log}"
-    else:
-        full_prompt = f"{facilitator_prompt}\n\n--- Discussion Log ---\n{full_log}"
-
-    try:
-        if provider == "openai":
-            if not clients["openai"]:
-                return "❌ OpenAI API key not configured"
-            params = {
-                "model": model_id,
-                "messages": [
-                    {"role": "system", "content": "You are a discussion facilitator."},
-                    {"role": "user", "content": full_prompt}
-                ]
-            }
-            if model_id not in NO_TEMPERATURE_MODELS:
-                params["temperature"] = 0.5
-            response = clients["openai"].chat.completions.create(**params)
-            return response.choices[0].message.content
-
-        elif provider == "anthropic":
-            if not clients["anthropic"]:
-                return "❌ Anthropic API key not configured"
-            response = clients["anthropic"].messages.create(
-                model=model_id,
-                max_tokens=4000,  # Increased for longer syntheses
-                temperature=0.5,
-                system="You are a discussion facilitator.",
-                messages=[{"role": "user", "content": full_prompt}]
-            )
-            return response.content[0].text
-
-        elif provider == "google":
-            if not clients["google"]:
-                return "❌ Google API key not configured"
-            model = genai.GenerativeModel(model_id)
-            response = model.generate_content(full_prompt)
-            return response.text
+    tasks = st.session_state.ingestion_tasks
+    if not tasks:
+        return
+    if all(task.finished for task in tasks):
+        errors = []
+        for task in tasks:
+            if task.status == "done":
+                st.session_state.uploaded_files_list.append(task.result)
+                st.session_state.uploaded_file_names.add(task.filename)
+            else:
+                errors.append(f"{task.filename}: {task.result['error']}")
+        st.session_state.ingestion_tasks = []
+        st.session_state.ingestion_errors = errors
+        if st.session_state.uploaded_files_list:
+            # Speculatively start expertise extraction for the new file set
+            prefetch_dynamic_expertise(build_expertise_source(st.session_state.uploaded_files_list), init_clients())
+        st.rerun()
 
-    except Exception as e:
-        return f"❌ Facilitator Error ({facilitator_name}): {e}"
+    for task in tasks:
+        line = f"{INGESTION_STATUS_LABELS[task.status]} **{task.filename}** ({task.size_mb:.1f}MB)"
+        if task.status == "processing" and task.progress:
+            done, total = task.progress
+            line += f" — 📄 {done}/{total} pages"
+        elif task.finished:
+            line += f" — {task.finished_at - task.submitted_at:.1f}s"
+        st.markdown(line)
 
 
 # --- Session State ---
@@ -1516,6 +1026,12 @@ if "uploaded_files_list" not in st.session_state:
     st.session_state.uploaded_files_list = []  # List of file results
 if "uploaded_file_names" not in st.session_state:
     st.session_state.uploaded_file_names = set()  # Set of uploaded file names
+if "ingestion_tasks" not in st.session_state:
+    st.session_state.ingestion_tasks = []  # Files being processed (ingestion.IngestionTask)
+if "ingestion_errors" not in st.session_state:
+    st.session_state.ingestion_errors = []
+if "upload_batch" not in st.session_state:
+    st.session_state.upload_batch = 0  # Uploader key suffix; bumped to clear the widget
 # Form key for reset
 if "form_key" not in st.session_state:
     st.session_state.form_key = 0
@@ -1528,6 +1044,13 @@ if "loop_current_model" not in st.session_state:
     st.session_state.loop_current_model = 0
 if "loop_config" not in st.session_state:
     st.session_state.loop_config = None
+# Background discussion job
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+if "celebrated_job" not in st.session_state:
+    st.session_state.celebrated_job = None
+if "report_exports" not in st.session_state:
+    st.session_state.report_exports = None  # (report version, ReportExports)
 if "history_log" not in st.session_state:
     st.session_state.history_log = []
 # Re-discussion context
@@ -1562,11 +1085,42 @@ with col_config:
     with st.expander("", expanded=True):
         # API Status
         st.markdown('<p class="section-header">API Keys</p>', unsafe_allow_html=True)
+        failed_clients = client_errors()
         for provider, is_set in api_status.items():
-            if is_set:
+            if provider in failed_clients:
+                # Key set, but the SDK client could not be built (e.g. an incompatible SDK version)
+                st.markdown(f'<div class="api-badge disconnected">✗ {provider.upper()}</div>', unsafe_allow_html=True)
+                st.caption(f"⚠️ {failed_clients[provider]}")
+            elif is_set:
                 st.markdown(f'<div class="api-badge connected">✓ {provider.upper()}</div>', unsafe_allow_html=True)
             else:
                 st.markdown(f'<div class="api-badge disconnected">✗ {provider.upper()}</div>', unsafe_allow_html=True)
+        cache_stats = get_response_cache().stats
+        st.caption(
+            f"Response cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · "
+            f"{cache_stats['bypassed']} bypassed"
+        )
+        degraded = [
+            f"{name} (circuit open)" if health["open"]
+            else f"{name} (p95 {'TTFT' if health['slow'][0] == 'ttft' else 'call'} {health['slow'][1]:.0f}s)"
+            for name, health in get_router().snapshot().items() if health["open"] or health["slow"]
+        ]
+        if degraded:
+            st.caption(f"↪ Rerouting around: {', '.join(degraded)}")
+        limiter_stats = get_rate_limiter().stats
+        if limiter_stats["queued"]:
+            queued_now = ", ".join(f"{p} {n}" for p, n in get_rate_limiter().waiting().items())
+            st.caption(
+                f"⏳ Provider queue: {limiter_stats['queued']} calls waited "
+                f"(avg {limiter_stats['total_wait'] / limiter_stats['queued']:.1f}s, "
+                f"max {limiter_stats['max_wait']:.1f}s)" + (f" · waiting now: {queued_now}" if queued_now else "")
+            )
+        hedge_stats = get_hedger().stats
+        if hedge_stats["fired"]:
+            st.caption(
+                f"Hedged requests: {hedge_stats['fired']} fired · {hedge_stats['won']} won "
+                f"of {hedge_stats['requests']}"
+            )
 
         # Model Selection - OpenAI
         st.markdown('<p class="section-header">AI Collaborators</p>', unsafe_allow_html=True)
@@ -1627,6 +1181,16 @@ with col_config:
         st.markdown('<p class="section-header">Settings</p>', unsafe_allow_html=True)
         rounds = st.slider("Number of Rounds", 1, 5, 2, help="Recommended: 2-3 rounds")
         creativity = st.slider("Creativity", 0.0, 1.0, 0.7, 0.1)
+        parallel_rounds = st.checkbox(
+            "Parallel rounds",
+            value=False,
+            help="Ask all collaborators in a round at the same time. Faster, but models in the same round don't see each other's replies."
+        )
+        hedge_requests = st.checkbox(
+            "Hedge slow requests",
+            value=False,
+            help="If a model is unusually slow to start answering, send a duplicate request and keep whichever answers first. Cuts long waits for a few extra API calls."
+        )
         expertise_level = st.select_slider(
             "Expertise Level",
             options=["Beginner", "General", "Professional", "Expert"],
@@ -1692,39 +1256,55 @@ with col_main:
                     st.session_state.uploaded_file_names.discard(file_info['name'])
                     st.rerun()
     
+    # Files still being processed count against the limits too
+    pending_tasks = st.session_state.ingestion_tasks
+    pending_count = len(pending_tasks)
+    pending_mb = sum(task.size_mb for task in pending_tasks)
+    if pending_tasks:
+        ingestion_status()
+    # Shown once, after the batch they belong to
+    for error in st.session_state.ingestion_errors:
+        st.error(f"❌ {error}")
+    st.session_state.ingestion_errors = []
+
     # File uploader (disabled if limit reached)
-    can_upload = current_file_count < max_files
+    can_upload = current_file_count + pending_count < max_files
     
     if can_upload:
-        uploaded_file = st.file_uploader(
-            f"📎 ファイル追加 (残り{max_files - current_file_count})",
+        new_files = st.file_uploader(
+            f"📎 ファイル追加 (残り{max_files - current_file_count - pending_count})",
             type=list(FILE_UPLOAD_CONFIG["allowed_extensions"].keys()),
+            accept_multiple_files=True,
             help=f"PDF, CSV, Excel, 画像をアップロード (上限: {max_files}ファイル, 合計{max_total_mb}MB)",
-            key=f"file_uploader_{st.session_state.form_key}_{current_file_count}"
+            key=f"file_uploader_{st.session_state.form_key}_{st.session_state.upload_batch}"
         )
         
-        # Process uploaded file
-        if uploaded_file is not None:
-            # Check if already uploaded
-            if uploaded_file.name not in st.session_state.uploaded_file_names:
-                # Check total size limit
-                file_size_mb = len(uploaded_file.read()) / (1024 * 1024)
-                uploaded_file.seek(0)
-                
-                if current_total_mb + file_size_mb > max_total_mb:
-                    st.error(f"❌ 合計サイズ上限超過 ({current_total_mb + file_size_mb:.1f}MB > {max_total_mb}MB)")
-                else:
-                    with st.spinner(f"📄 Processing {uploaded_file.name}..."):
-                        clients = init_clients()
-                        file_result = process_uploaded_file(uploaded_file, clients)
-                        
-                        if file_result["success"]:
-                            st.session_state.uploaded_files_list.append(file_result)
-                            st.session_state.uploaded_file_names.add(uploaded_file.name)
-                            st.success(f"✅ 追加: {file_result['file_info']['icon']} {file_result['file_info']['name']}")
-                            st.rerun()
-                        else:
-                            st.error(f"❌ {file_result['error']}")
+        # Queue every selected file at once; they are processed concurrently
+        if new_files:
+            clients = init_clients()
+            queued_names = {task.filename for task in pending_tasks}
+            errors = []
+            for uploaded_file in new_files:
+                # Check if already uploaded
+                if uploaded_file.name in st.session_state.uploaded_file_names or uploaded_file.name in queued_names:
+                    continue
+                if current_file_count + pending_count >= max_files:
+                    errors.append(f"ファイル上限 ({max_files}ファイル): {uploaded_file.name}")
+                    continue
+                # The only read of the upload; the worker gets the same buffer
+                file_bytes = uploaded_file.getvalue()
+                file_size_mb = len(file_bytes) / (1024 * 1024)
+                if current_total_mb + pending_mb + file_size_mb > max_total_mb:
+                    errors.append(f"合計サイズ上限超過 ({current_total_mb + pending_mb + file_size_mb:.1f}MB > {max_total_mb}MB): {uploaded_file.name}")
+                    continue
+                pending_tasks.append(get_ingestion_queue().submit(file_bytes, uploaded_file.name, clients))
+                queued_names.add(uploaded_file.name)
+                pending_count += 1
+                pending_mb += file_size_mb
+            st.session_state.ingestion_errors = errors
+            # Clear the widget; the queued files are tracked in ingestion_tasks
+            st.session_state.upload_batch += 1
+            st.rerun()
     else:
         st.info(f"📎 ファイル上限に達しました ({max_files}ファイル)")
 
@@ -1761,66 +1341,205 @@ with col_synthesis:
     st.markdown("### ✦ Synthesis")
     synthesis_container = st.container()
 
+# --- Discussion History Rendering ---
+@functools.lru_cache(maxsize=256)
+def badge_html(model: str, personality: str = None) -> str:
+    """Model badge (+ personality badge) markup, built once per model/personality pair"""
+    markup = f'<span class="model-badge">{model}</span>'
+    if personality:
+        pinfo = get_personality_info(personality)
+        markup += (
+            f' <span class="personality-badge" style="background: {pinfo["color"]}20; '
+            f'color: {pinfo["color"]}; border: 1px solid {pinfo["color"]}40;">'
+            f'{pinfo["emoji"]} {pinfo["name_ja"]}</span>'
+        )
+    return markup
+
+
+@functools.lru_cache(maxsize=512)
+def turn_header_html(model: str, personality: str = None, notes: tuple = ()) -> str:
+    """Badges and notes of a turn as one markup block, built once per turn"""
+    return badge_html(model, personality) + "".join(
+        f'<p class="turn-note">{html.escape(note)}</p>' for note in notes
+    )
+
+
+def render_turns(turns: list):
+    """
+    Finished turns: two elements per turn (cached header markup + text) instead of one per
+    badge and note. The model's text stays plain markdown, without unsafe HTML.
+    """
+    for msg in turns:
+        with st.chat_message("assistant", avatar=msg["avatar"]):
+            st.markdown(
+                turn_header_html(msg["model"], msg.get("personality") if msg.get("personality_info") else None,
+                                 tuple(msg.get("notes") or ())),
+                unsafe_allow_html=True
+            )
+            st.markdown(msg["content"])
+
+
+def render_job_progress(job, snapshot: dict):
+    """Turn being generated, progress bar and stop button of a running job"""
+    partial = snapshot["partial"]
+    if partial:
+        with st.chat_message("assistant", avatar=get_personality_avatar(partial["personality"], partial["model"])):
+            st.markdown(badge_html(partial["model"], partial["personality"]), unsafe_allow_html=True)
+            for note in partial["notes"]:
+                st.caption(note)
+            st.markdown(partial["text"] or "…")
+
+    job_config = job.state.config
+    total_calls = job_config["rounds"] * len(job_config["selected_models"])
+    done_calls = len(snapshot["turns"]) + len(snapshot["failures"])
+    if snapshot["phase"] == "discussion":
+        st.progress(
+            min(1.0, done_calls / total_calls),
+            text=f"Round {snapshot['current_round'] + 1}/{job_config['rounds']}"
+        )
+    else:
+        st.success("✦ Discussion complete! Generating summary...")
+    if st.button("■ Stop discussion", key=f"stop_{job.id}"):
+        job.cancel()
+
+
+@st.fragment(run_every=JOB_CONFIG.get("poll_interval", 1.0))
+def live_discussion(job):
+    """
+    Running rounds, polled as a fragment: each poll re-runs only this view instead of the
+    whole script. Hands back to a full rerun once the rounds are over (synthesis, done, stopped).
+    """
+    snapshot = job.state.snapshot()
+    if job.finished or snapshot["phase"] != "discussion":
+        st.rerun()
+    render_turns(snapshot["turns"])
+    for failure in snapshot["failures"]:
+        st.error(failure["error"])
+    render_job_progress(job, snapshot)
+
+
+# --- Background Job Sync ---
+# The job id survives reruns in session state and browser refreshes in the URL
+def sync_discussion(config: dict, progress: dict, running: bool):
+    """Mirror a job snapshot (or a saved checkpoint) into session state for display and export"""
+    st.session_state.discussion_history = progress["turns"]
+    st.session_state.current_topic = config["topic"]
+    st.session_state.current_participants = config["selected_models"]
+    st.session_state.personality_assignments = config["personality_assignments"]
+    st.session_state.loop_config = {
+        key: value for key, value in config.items()
+        if key not in ("personality_assignments", "url_content", "file_content")
+    }
+    st.session_state.loop_current_round = progress["current_round"]
+    st.session_state.loop_current_model = progress["current_model"]
+    st.session_state.dynamic_expertise = progress["dynamic_expertise"]
+    st.session_state.facilitator_name = progress["facilitator"]
+    st.session_state.loop_in_progress = running
+    st.session_state.generating = running
+    if not running:
+        st.session_state.conclusion = progress["conclusion"]
+        st.session_state.full_report = progress["full_report"]
+
+
+active_job = None
+job_snapshot = None
+resumable_session = None
+job_id = st.session_state.job_id or st.query_params.get("job")
+if job_id:
+    active_job = get_job_registry().get(job_id)
+    if active_job is None:
+        # Finished long ago, or the container was recycled: fall back to the checkpoint
+        checkpoint = load_checkpoint(job_id)
+        if checkpoint is None:
+            st.session_state.job_id = None
+            st.session_state.generating = False
+            st.session_state.loop_in_progress = False
+            if "job" in st.query_params:
+                del st.query_params["job"]
+            with chat_container:
+                st.info("ℹ️ The previous discussion is no longer available on this server.")
+        else:
+            st.session_state.job_id = job_id
+            sync_discussion(checkpoint["config"], checkpoint, running=False)
+            if checkpoint["status"] != "done":
+                resumable_session = checkpoint
+    else:
+        st.session_state.job_id = job_id
+        job_snapshot = active_job.state.snapshot()
+        sync_discussion(active_job.state.config, job_snapshot, running=not active_job.finished)
+        if active_job.status == "failed":
+            st.session_state.conclusion = f"❌ **Session Error**\n\n{active_job.error}"
+        if active_job.status in ("failed", "cancelled") or (active_job.finished and job_snapshot["failures"]):
+            resumable_session = job_snapshot
+
 # --- Display Previous Discussion (if exists) ---
 with chat_container:
-    if st.session_state.discussion_history:
+    if st.session_state.discussion_history or (active_job and not active_job.finished) or resumable_session is not None:
         st.markdown("---")
         st.markdown(f"**Topic:** {st.session_state.current_topic}")
         
         # Show previous synthesis in expander if available
         st.markdown(f"**Participants:** {', '.join(st.session_state.current_participants)}")
         st.markdown(f"**Facilitator:** {st.session_state.facilitator_name}")
+        if active_job:
+            # Show content source
+            job_files = active_job.state.config.get("file_content") or []
+            job_url = active_job.state.config.get("url_content")
+            if job_files:
+                file_names = ", ".join([f["file_info"]["icon"] + " " + f["file_info"]["name"] for f in job_files])
+                st.markdown(f"**📎 Files:** {file_names}")
+            elif job_url and job_url.get("success"):
+                st.markdown(f"**📰 Article:** {job_url['title'][:60]}...")
+        if job_snapshot and job_snapshot["checkpoint_error"]:
+            st.warning(
+                f"⚠️ Progress is not being saved ({job_snapshot['checkpoint_error']}). "
+                "If this discussion is interrupted, resuming may repeat or lose turns."
+            )
+        if st.session_state.dynamic_expertise:
+            with st.expander("🎓 Auto-detected Expertise", expanded=False):
+                st.markdown(st.session_state.dynamic_expertise)
         st.markdown("---")
         
-        for msg in st.session_state.discussion_history:
-            with st.chat_message("assistant", avatar=msg["avatar"]):
-                # Display personality badge if available
-                if "personality_info" in msg and msg["personality_info"]:
-                    pinfo = msg["personality_info"]
-                    st.markdown(
-                        f'<span class="model-badge">{msg["model"]}</span> '
-                        f'<span class="personality-badge" style="background: {pinfo["color"]}20; '
-                        f'color: {pinfo["color"]}; border: 1px solid {pinfo["color"]}40;">'
-                        f'{pinfo["emoji"]} {pinfo["name_ja"]}</span>',
-                        unsafe_allow_html=True
-                    )
+        if active_job and not active_job.finished and job_snapshot["phase"] == "discussion":
+            # Only this view refreshes while the rounds run; the rest of the page stays put
+            live_discussion(active_job)
+        else:
+            render_turns(st.session_state.discussion_history)
+            if job_snapshot:
+                for failure in job_snapshot["failures"]:
+                    st.error(failure["error"])
+
+        if resumable_session is not None:
+            # Completed turns are kept; only the missing (or failed) ones are asked again
+            loop_config = st.session_state.loop_config
+            total_calls = loop_config["rounds"] * len(loop_config["selected_models"])
+            st.warning(
+                f"⏸ This discussion stopped after {len(st.session_state.discussion_history)} of "
+                f"{total_calls} turns."
+            )
+            if st.button("▶ Resume discussion", key=f"resume_{job_id}", type="primary"):
+                if get_job_registry().resume(job_id, init_clients()) is None:
+                    st.error("❌ No checkpoint found for this discussion")
                 else:
-                    st.markdown(f'<span class="model-badge">{msg["model"]}</span>', unsafe_allow_html=True)
-                st.write(msg["content"])
-
-# --- Run Session ---
-def assign_personalities(models: list, mode: str) -> dict:
-    """Assign personalities to models based on mode"""
-    import random
-    assignments = {}
-    personality_ids = get_all_personality_ids()
-    
-    if mode == "auto":
-        # Cycle through personalities for balanced discussion
-        for i, model in enumerate(models):
-            assignments[model] = personality_ids[i % len(personality_ids)]
-    elif mode == "random":
-        for model in models:
-            assignments[model] = random.choice(personality_ids)
-    elif mode == "manual":
-        # Use session state assignments
-        assignments = st.session_state.personality_assignments.copy()
-        # Fill in any missing assignments
-        for model in models:
-            if model not in assignments:
-                assignments[model] = personality_ids[0]
-    
-    return assignments
+                    st.session_state.conclusion = None
+                    st.rerun()
 
-# Start new session or continue interrupted one
-should_run_loop = False
+        if active_job and not active_job.finished and job_snapshot["phase"] != "discussion":
+            render_job_progress(active_job, job_snapshot)
 
+# --- Run Session ---
 if start_button and can_start:
-    # New session - clear and initialize
+    # A new session replaces whatever this browser session was running
+    if active_job and not active_job.finished:
+        active_job.cancel()
+
     st.session_state.discussion_history = []
     st.session_state.history_log = []
+    st.session_state.conclusion = None
+    st.session_state.full_report = None
     st.session_state.current_topic = topic
     st.session_state.current_participants = selected_models
+    st.session_state.facilitator_name = facilitator
     st.session_state.loop_in_progress = True
     st.session_state.loop_current_round = 0
     st.session_state.loop_current_model = 0
@@ -1833,16 +1552,18 @@ if start_button and can_start:
         "facilitator": facilitator,
         "creativity": creativity,
         "expertise_level": expertise_level,
-        "synthesis_format": synthesis_format
+        "synthesis_format": synthesis_format,
+        "parallel_rounds": parallel_rounds,
+        "hedge_requests": hedge_requests
     }
     
     
     # Assign personalities
     st.session_state.personality_assignments = assign_personalities(
         selected_models, 
-        st.session_state.personality_mode
+        st.session_state.personality_mode,
+        manual=st.session_state.personality_assignments
     )
-    current_assignments = st.session_state.personality_assignments
     
     # URL Detection and Content Fetching
     detected_url = detect_url(topic)
@@ -1853,235 +1574,26 @@ if start_button and can_start:
             url_content_data = fetch_url_content(detected_url)
             
             if url_content_data["success"]:
-                st.success(f"✅ Article fetched: {url_content_data['title'][:50]}...")
                 st.session_state.url_content = url_content_data
                 st.session_state.detected_url = detected_url
-                
-                # Show article preview
-                with st.expander("📄 Article Content (Preview)", expanded=False):
-                    st.markdown(f"**Title:** {url_content_data['title']}")
-                    st.markdown(f"**URL:** {detected_url}")
-                    st.text(url_content_data['content'][:1000] + "...")
             else:
                 st.warning(f"⚠️ Failed to fetch article: {url_content_data['error']}")
                 st.info("💡 Continuing discussion as text without URL")
+                time.sleep(1.5)
     
-    clients = init_clients()
-    
-    # Dynamic Expertise Extraction
-    # Content Source Priority: File > URL > Topic
-    content_to_analyze = ""
-    content_source = "topic"
-    
-    if st.session_state.uploaded_files_list:
-        # Combine all file contents
-        combined_content = "\n\n---\n\n".join([
-            f"[{f['file_info']['name']}]\n{f['content'][:3000]}"
-            for f in st.session_state.uploaded_files_list
-        ])
-        content_to_analyze = combined_content
-        content_source = "file"
-    elif url_content_data and url_content_data.get("success"):
-        # URL has second priority
-        content_to_analyze = url_content_data["content"]
-        content_source = "url"
-    else:
-        # Topic text as fallback
-        content_to_analyze = topic
-        content_source = "topic"
-    
-    with st.spinner("🎓 Analyzing required expertise..."):
-        dynamic_expertise = extract_dynamic_expertise(content_to_analyze, clients)
-        st.session_state.dynamic_expertise = dynamic_expertise
-        
-        if dynamic_expertise:
-            with st.expander("🎓 Auto-detected Expertise", expanded=False):
-                st.markdown(dynamic_expertise)
-    
-    history_log = []
+    st.session_state.dynamic_expertise = None
     st.session_state.generating = True
 
-    with chat_container:
-        st.markdown("---")
-        st.markdown(f"**Topic:** {st.session_state.current_topic}")
-        
-        # Show content source
-        if st.session_state.uploaded_files_list:
-            file_names = ", ".join([f["file_info"]["icon"] + " " + f["file_info"]["name"] for f in st.session_state.uploaded_files_list])
-            st.markdown(f"**📎 Files:** {file_names}")
-        elif detected_url and url_content_data and url_content_data.get("success"):
-            st.markdown(f"**📰 Article:** {url_content_data['title'][:60]}...")
-        
-        st.markdown(f"**Participants:** {', '.join(selected_models)}")
-        st.markdown(f"**Facilitator:** {facilitator}")
-        
-        if st.session_state.dynamic_expertise:
-            st.markdown(f"**🎓 Expertise:** {st.session_state.dynamic_expertise[:100]}...")
-        
-        st.markdown("---")
-
-        # Progress tracking - use simple counter instead of st.empty()
-        total_calls = rounds * len(selected_models)
-        progress_bar = st.progress(0)
-        current_call = 0
-
-        # Collaboration Phase
-        try:
-            for i in range(rounds):
-                st.markdown(f'<span class="round-badge">Round {i+1}/{rounds}</span>', unsafe_allow_html=True)
-
-                for j, model in enumerate(selected_models):
-                    current_call += 1
-                    progress = current_call / total_calls
-                    progress_bar.progress(progress)
-                    
-                    # Get personality for this model
-                    personality = current_assignments.get(model)
-                    personality_info = get_personality_info(personality)
-                    
-                    # Removed status_text.text() to reduce UI updates
-                    
-                    with st.chat_message("assistant", avatar=get_personality_avatar(personality, model)):
-                        # Display model name and personality badge
-                        st.markdown(
-                            f'<span class="model-badge">{model}</span> '
-                            f'<span class="personality-badge" style="background: {personality_info["color"]}20; '
-                            f'color: {personality_info["color"]}; border: 1px solid {personality_info["color"]}40;">'
-                            f'{personality_info["emoji"]} {personality_info["name_ja"]}</span>',
-                            unsafe_allow_html=True
-                        )
-
-                        # Retry logic for API calls
-                        max_retries = 2
-                        retry_count = 0
-                        msg = None
-                        
-                        while retry_count <= max_retries and msg is None:
-                            try:
-                                if i == 0 and j == 0:
-                                    msg = ask_ai(model, clients, "", is_first=True, topic=topic, 
-                                                 temperature=creativity, expertise=expertise_level,
-                                                 personality=personality, url_content=url_content_data,
-                                                 file_content=st.session_state.uploaded_files_list,
-                                                 dynamic_expertise=st.session_state.dynamic_expertise)
-                                else:
-                                    # Dynamic context window: fewer messages for longer discussions
-                                    context_window = max(3, min(6, 20 // rounds))
-                                    context_text = "\n\n".join(history_log[-context_window:])
-                                    msg = ask_ai(model, clients, context_text, 
-                                                 temperature=creativity, expertise=expertise_level,
-                                                 personality=personality, url_content=url_content_data,
-                                                 file_content=st.session_state.uploaded_files_list,
-                                                 dynamic_expertise=st.session_state.dynamic_expertise)
-                                
-                                # Check if the response is an error message
-                                if msg and msg.startswith("❌"):
-                                    if retry_count < max_retries:
-                                        st.warning(f"⚠️ Retry {retry_count + 1}/{max_retries} for {model}...")
-                                        time.sleep(2)
-                                        retry_count += 1
-                                        msg = None
-                                    else:
-                                        st.error(f"Failed after {max_retries} retries: {msg}")
-                                else:
-                                    break
-                            except Exception as e:
-                                if retry_count < max_retries:
-                                    st.warning(f"⚠️ Error occurred, retrying... ({retry_count + 1}/{max_retries})")
-                                    time.sleep(2)
-                                    retry_count += 1
-                                else:
-                                    msg = f"❌ Error after {max_retries} retries: {str(e)}"
-                                    st.error(msg)
-                                    break
-
-                        if msg:
-                            st.write(msg)
-                            history_log.append(f"[{model} ({personality_info['name_ja']})]: {msg}")
-                            # Store in session state for persistence
-                            st.session_state.discussion_history.append({
-                                "model": model,
-                                "content": msg,
-                                "avatar": get_personality_avatar(personality, model),
-                                "personality": personality,
-                                "personality_info": personality_info
-                            })
-                        else:
-                            error_msg = f"❌ {model} failed to respond"
-                            st.error(error_msg)
-                            history_log.append(f"[{model}]: {error_msg}")
-
-            progress_bar.progress(1.0)
-            st.success("✦ Discussion complete! Generating summary...")
-            
-        except Exception as e:
-            st.error(f"❌ Session error: {str(e)}")
-            st.warning("⚠️ Partial results may be available. Attempting to generate summary...")
-
-
-    # Update Canvas with results
-    full_log = "\n\n".join(history_log)
-
-    # Show progress in synthesis column during summary generation
-    with synthesis_container:
-        synthesis_progress = st.empty()
-        synthesis_progress.markdown(f"""
-        <div class="canvas-card">
-            <h2 class="report-title">✦ Idea Synthesis Report</h2>
-            <div class="generating-spinner"></div>
-            <p style="text-align: center; margin-top: 1rem;">🤖 {facilitator} is analyzing the discussion...</p>
-            <p style="text-align: center; color: var(--text-secondary); font-size: 0.9rem;">This may take 30-60 seconds for long discussions</p>
-            <p style="text-align: center; color: var(--text-secondary); font-size: 0.8rem; margin-top: 0.5rem;">Log length: {len(full_log)} chars</p>
-        </div>
-        """, unsafe_allow_html=True)
-
-    # Generate summary (this happens while chat logs remain visible)
-    conclusion = None
-    try:
-        import time
-        start_time = time.time()
-        conclusion = facilitate(facilitator, clients, topic, full_log, selected_models, expertise=expertise_level, synthesis_format=synthesis_format)
-        elapsed = time.time() - start_time
-        
-        # Check if conclusion is actually an error message
-        if conclusion and conclusion.startswith("❌"):
-            raise Exception(f"Facilitator returned error: {conclusion}")
-            
-    except Exception as e:
-        elapsed = time.time() - start_time if 'start_time' in locals() else 0
-        error_msg = str(e)
-        
-        # Provide detailed error information
-        conclusion = f"""❌ **Synthesis Error** (after {elapsed:.1f}s)
-
-**Error:** {error_msg}
-
-**Troubleshooting:**
-- Try using a different facilitator model
-- Reduce the number of rounds
-- Check API key status
-
-**Discussion Summary Available:**
-The discussion log is preserved above. You can manually review the {len(history_log)} messages exchanged.
-"""
-        
-        with synthesis_container:
-            synthesis_progress.empty()
-            st.error(f"Failed to generate synthesis after {elapsed:.1f}s: {error_msg}")
-            st.info("💡 Tip: Try GPT-4o or Claude Sonnet 4 as facilitator for better reliability")
-
-    # Clear the progress indicator
-    if conclusion and not conclusion.startswith("❌"):
-        synthesis_progress.empty()
-
-    # Save to session state
-    st.session_state.conclusion = conclusion
-    st.session_state.facilitator_name = facilitator
-    st.session_state.full_report = f"Topic: {topic}\n\n{full_log}\n\n--- Summary ---\n{conclusion}"
-    st.session_state.generating = False
-
-    show_star_celebration()
-    # Don't rerun - let the synthesis display below handle it
+    # The discussion runs on a background worker; this session only polls it
+    job = get_job_registry().submit({
+        **st.session_state.loop_config,
+        "personality_assignments": st.session_state.personality_assignments,
+        "url_content": url_content_data,
+        "file_content": list(st.session_state.uploaded_files_list),
+    }, init_clients())
+    st.session_state.job_id = job.id
+    st.query_params["job"] = job.id
+    st.rerun()
 
 # --- Synthesis Display ---
 with synthesis_container:
@@ -2100,116 +1612,21 @@ with synthesis_container:
         summary = st.session_state.conclusion or ""
         facilitator = st.session_state.facilitator_name or "Unknown"
         
-        # Generate filenames
-        import re
-        safe_topic = re.sub(r'[^\w\s-]', '', topic[:30]).strip().replace(' ', '_') or 'report'
-        
-        # TXT format (original)
-        txt_content = st.session_state.full_report
-        
-        # Markdown format
-        md_content = f"""# X-Think Idea Synthesis Report
-
-## Topic
-{topic}
-
-## Discussion Summary
-**Facilitator:** {facilitator}
-
-{summary}
-
-## Discussion History
-"""
-        for i, msg in enumerate(discussion, 1):
-            md_content += f"\n### Round {i}: {msg.get('model', 'Unknown')}\n"
-            if msg.get('personality'):
-                md_content += f"*Personality: {msg['personality']}*\n\n"
-            md_content += f"{msg.get('content', '')}\n"
-        
-        # JSON format
-        import json
-        json_data = {
-            "topic": topic,
-            "facilitator": facilitator,
-            "summary": summary,
-            "discussion_history": [
-                {
-                    "round": i,
-                    "model": msg.get("model", "Unknown"),
-                    "personality": msg.get("personality", ""),
-                    "content": msg.get("content", "")
-                }
-                for i, msg in enumerate(discussion, 1)
-            ],
-            "metadata": {
-                "generated_by": "X-Think",
-                "timestamp": __import__('datetime').datetime.now().isoformat()
-            }
-        }
-        json_content = json.dumps(json_data, ensure_ascii=False, indent=2)
-        
-        # HTML format
-        html_content = f"""<!DOCTYPE html>
-<html lang="ja">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>X-Think Report: {topic[:50]}</title>
-    <style>
-        body {{ font-family: 'Inter', sans-serif; max-width: 800px; margin: 0 auto; padding: 2rem; background: #1a1a1a; color: #f0f0f0; }}
-        h1 {{ color: #D4AF37; border-bottom: 2px solid #D4AF37; padding-bottom: 0.5rem; }}
-        h2 {{ color: #D4AF37; }}
-        .summary {{ background: #2a2a2a; padding: 1.5rem; border-radius: 8px; border-left: 4px solid #D4AF37; }}
-        .message {{ background: #252525; padding: 1rem; border-radius: 8px; margin: 1rem 0; }}
-        .model {{ color: #D4AF37; font-weight: bold; }}
-        .personality {{ color: #888; font-size: 0.9rem; }}
-    </style>
-</head>
-<body>
-    <h1>✦ X-Think Idea Synthesis Report</h1>
-    <h2>Topic</h2>
-    <p>{topic}</p>
-    <h2>Summary</h2>
-    <div class="summary">
-        <p><strong>Facilitator:</strong> {facilitator}</p>
-        <div>{summary.replace(chr(10), '<br>')}</div>
-    </div>
-    <h2>Discussion History</h2>
-"""
-        for i, msg in enumerate(discussion, 1):
-            html_content += f"""    <div class="message">
-        <p class="model">Round {i}: {msg.get('model', 'Unknown')}</p>
-        {"<p class='personality'>Personality: " + msg.get('personality', '') + "</p>" if msg.get('personality') else ""}
-        <p>{msg.get('content', '').replace(chr(10), '<br>')}</p>
-    </div>
-"""
-        html_content += """</body>
-</html>"""
-        
-        # CSV format
-        import csv
-        import io
-        csv_buffer = io.StringIO()
-        writer = csv.writer(csv_buffer)
-        writer.writerow(["Round", "Model", "Personality", "Content"])
-        for i, msg in enumerate(discussion, 1):
-            writer.writerow([i, msg.get("model", ""), msg.get("personality", ""), msg.get("content", "")])
-        writer.writerow([])
-        writer.writerow(["Summary", facilitator, "", summary])
-        csv_content = csv_buffer.getvalue()
+        safe_topic = safe_filename(topic)
+        # Built once per report version, not on every rerun; each format renders on first use
+        report_version = (st.session_state.job_id, topic, facilitator, len(discussion),
+                          hash(summary), hash(st.session_state.full_report))
+        cached_version, reports = st.session_state.report_exports or (None, None)
+        if cached_version != report_version:
+            reports = render_reports(topic, facilitator, summary, discussion, st.session_state.full_report)
+            st.session_state.report_exports = (report_version, reports)
         
         # Download buttons in columns (5 formats)
-        col1, col2, col3, col4, col5 = st.columns(5)
-        with col1:
-            st.download_button("TXT", txt_content, f"{safe_topic}.txt", use_container_width=True)
-        with col2:
-            st.download_button("MD", md_content, f"{safe_topic}.md", use_container_width=True)
-        with col3:
-            st.download_button("JSON", json_content, f"{safe_topic}.json", mime="application/json", use_container_width=True)
-        with col4:
-            st.download_button("HTML", html_content, f"{safe_topic}.html", mime="text/html", use_container_width=True)
-        with col5:
-            st.download_button("CSV", csv_content, f"{safe_topic}.csv", mime="text/csv", use_container_width=True)
+        for column, (fmt, (label, extension, mime)) in zip(st.columns(len(REPORT_FORMATS)), REPORT_FORMATS.items()):
+            with column:
+                # on_click="ignore": downloading doesn't rerun (and re-render) the page
+                st.download_button(label, reports[fmt], f"{safe_topic}.{extension}", mime=mime,
+                                   on_click="ignore", use_container_width=True)
 
         if st.button("✦ Reset", use_container_width=True):
             # Full reset - clear everything
@@ -2224,13 +1641,27 @@ with synthesis_container:
             st.session_state.detected_url = None
             st.session_state.uploaded_files_list = []
             st.session_state.uploaded_file_names = set()
+            st.session_state.ingestion_tasks = []
+            st.session_state.ingestion_errors = []
             st.session_state.dynamic_expertise = None
+            st.session_state.job_id = None
+            if "job" in st.query_params:
+                del st.query_params["job"]
             # Increment form key to reset text area
             st.session_state.form_key += 1
             st.rerun()
 
 
+    elif job_snapshot and job_snapshot["phase"] == "synthesis" and job_snapshot["partial_conclusion"]:
+        st.markdown('<h3 class="report-title">✦ Idea Synthesis Report</h3>', unsafe_allow_html=True)
+        for note in job_snapshot["synthesis_notes"]:
+            st.caption(note)
+        with st.chat_message("assistant", avatar=get_avatar(job_snapshot["facilitator"])):
+            st.markdown(f'<span class="model-badge">{job_snapshot["facilitator"]}</span>', unsafe_allow_html=True)
+            st.markdown(job_snapshot["partial_conclusion"])
     elif st.session_state.generating:
+        for note in (job_snapshot or {}).get("synthesis_notes", []):
+            st.caption(note)
         st.markdown("""
         <div class="canvas-card">
             <h2 class="report-title">✦ Idea Synthesis Report</h2>
@@ -2245,3 +1676,13 @@ with synthesis_container:
             <p>Start a session to see the AI-generated summary here</p>
         </div>
         """, unsafe_allow_html=True)
+
+# --- Background Job Polling ---
+if active_job and active_job.finished and st.session_state.celebrated_job != active_job.id:
+    st.session_state.celebrated_job = active_job.id
+    if active_job.status == "done":
+        show_star_celebration()
+elif active_job and not active_job.finished and job_snapshot["phase"] != "discussion":
+    # The rounds poll inside live_discussion; the synthesis streams into the other column
+    time.sleep(JOB_CONFIG.get("poll_interval", 1.0))
+    st.rerun()
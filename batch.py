@@ -0,0 +1,231 @@
+"""
+AI Idea Lab - Batch Mode
+Runs many offline discussions through the provider batch APIs (OpenAI Batch,
+Anthropic Message Batches): every turn of a round, across all topics, is submitted
+as one batch per provider and model, and the facilitator syntheses as a final batch.
+Batched requests cost about half as much but can take hours, so this is for the
+CLI (`python cli.py topics.jsonl --batch`), never for the interactive UI.
+
+Each round is answered against the discussion as it stood at the end of the previous
+round (like parallel rounds). Providers without a batch API are called directly.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ALL_MODELS, BATCH_CONFIG
+from providers import get_clients, resolve_model, ProviderError
+from retry import call_with_retry
+from routing import call_with_fallback
+from discussion import (
+    DiscussionState, FACILITATOR_SYSTEM_PROMPT, build_config, build_turn_prompt,
+    build_synthesis_prompt, complete_ai, discussion_result
+)
+from expertise import build_expertise_source, prefetch_dynamic_expertise
+from context_builder import ContextBuilder
+
+
+def _complete_directly(model_name: str, clients: dict, system_prompt, prompt: str,
+                       temperature: float, max_tokens: int, exclude: list = ()) -> tuple:
+    """(model_used, text) from a direct call, with retries and fallback routing"""
+    _, result = call_with_fallback(
+        model_name,
+        lambda candidate: (candidate, call_with_retry(
+            lambda: complete_ai(candidate, clients, system_prompt, prompt,
+                                temperature=temperature, max_tokens=max_tokens),
+            model=candidate)),
+        exclude=exclude
+    )
+    return result
+
+
+def run_batch(requests: dict, clients: dict, poll_interval: float = None, on_status=None) -> dict:
+    """
+    Answer requests through the provider batch APIs.
+    requests: {custom_id: (model_name, system_prompt, prompt, temperature, max_tokens, exclude)}
+    custom_ids must match ^[a-zA-Z0-9_-]{1,64}$.
+    Items that fail retryably inside a batch (or never ran) are retried with direct calls.
+    Returns: {custom_id: (model_used, text) | ProviderError}
+    """
+    poll_interval = BATCH_CONFIG.get("poll_interval", 30) if poll_interval is None else poll_interval
+    on_status = on_status or (lambda message: None)
+
+    # One batch per (provider, model): an OpenAI batch input file may only use one model.
+    # Adapters without a batch API (or a key) are called directly
+    groups, direct = {}, []
+    for custom_id, (model_name, system_prompt, prompt, temperature, max_tokens, _) in requests.items():
+        adapter, model_id = resolve_model(model_name, clients)
+        if adapter.supports_batch and adapter.available:
+            groups.setdefault((adapter.provider, model_id), (adapter, []))[1].append(
+                (custom_id, model_id, system_prompt, prompt, temperature, max_tokens)
+            )
+        else:
+            direct.append(custom_id)
+
+    pending = {}  # batch_id -> (adapter, custom_ids)
+    for (provider, model_id), (adapter, batch_requests) in groups.items():
+        try:
+            batch_id = adapter.submit_batch(batch_requests)
+        except Exception as e:
+            on_status(f"{adapter.label} batch submission for {model_id} failed ({e}); calling directly")
+            direct.extend(request[0] for request in batch_requests)
+            continue
+        pending[batch_id] = (adapter, [request[0] for request in batch_requests])
+        on_status(f"Submitted {adapter.label} batch {batch_id} ({model_id}, {len(batch_requests)} requests)")
+
+    results = {}
+
+    def call_directly(custom_id):
+        model_name, system_prompt, prompt, temperature, max_tokens, exclude = requests[custom_id]
+        try:
+            results[custom_id] = _complete_directly(model_name, clients, system_prompt, prompt,
+                                                    temperature, max_tokens, exclude)
+        except ProviderError as e:
+            results[custom_id] = e
+
+    # Direct calls run while the batches are processed
+    executor = ThreadPoolExecutor(max_workers=BATCH_CONFIG.get("max_sync_workers", 8))
+    try:
+        direct_futures = [executor.submit(call_directly, custom_id) for custom_id in direct]
+
+        deadline = time.time() + BATCH_CONFIG.get("max_wait_seconds", 26 * 3600)
+        while pending:
+            for batch_id, (adapter, custom_ids) in list(pending.items()):
+                try:
+                    if not adapter.batch_done(batch_id):
+                        continue
+                    batch_results = adapter.batch_results(batch_id)
+                except Exception as e:
+                    on_status(f"{adapter.label} batch {batch_id} status check failed: {e}")
+                    continue
+                del pending[batch_id]
+                for custom_id in custom_ids:
+                    result = batch_results.get(custom_id)
+                    if isinstance(result, str):
+                        results[custom_id] = (requests[custom_id][0], result)
+                    elif isinstance(result, ProviderError) and not result.retryable:
+                        result.model = requests[custom_id][0]
+                        results[custom_id] = result
+                on_status(f"{adapter.label} batch {batch_id} finished")
+            if pending and time.time() > deadline:
+                # Cancel before falling back, so the same requests aren't paid for twice
+                on_status(f"Gave up waiting for {len(pending)} batch(es); cancelling and calling directly")
+                for batch_id, (adapter, _) in pending.items():
+                    try:
+                        adapter.cancel_batch(batch_id)
+                    except Exception as e:
+                        on_status(f"Cancelling {adapter.label} batch {batch_id} failed: {e}")
+                break
+            if pending:
+                time.sleep(poll_interval)
+
+        retry_ids = [custom_id for custom_id in requests if custom_id not in direct and custom_id not in results]
+        if retry_ids:
+            on_status(f"Retrying {len(retry_ids)} batch request(s) directly")
+        for future in direct_futures + [executor.submit(call_directly, custom_id) for custom_id in retry_ids]:
+            future.result()
+    finally:
+        executor.shutdown(wait=False)
+    return results
+
+
+def run_discussions_batch(entries: list, clients: dict = None, poll_interval: float = None,
+                          on_status=None) -> dict:
+    """
+    Run several discussions in batch mode.
+    entries: [{"id": str, "topic": str, **run_discussion options}]
+    Returns: {entry_id: run_discussion result | Exception}
+    """
+    clients = clients or get_clients()
+    on_status = on_status or print
+    outcomes, sessions = {}, []
+    for entry in entries:
+        options = {key: value for key, value in entry.items() if key not in ("id", "topic")}
+        try:
+            config = build_config(entry["topic"], **options)
+        except ValueError as e:
+            outcomes[entry["id"]] = e
+            continue
+        state = DiscussionState(config)
+        rounds = config["rounds"]
+        builder = ContextBuilder(state.history_log, max_recent_turns=max(3, min(6, 20 // rounds)))
+        sessions.append((entry["id"], state, builder))
+
+    # Every round is submitted at once, so the expertise extraction has to finish first
+    expertise = {
+        entry_id: prefetch_dynamic_expertise(
+            build_expertise_source(state.config["file_content"], state.config["url_content"],
+                                   state.config["topic"]),
+            clients)
+        for entry_id, state, _ in sessions
+    }
+    for entry_id, state, _ in sessions:
+        try:
+            state.dynamic_expertise = expertise[entry_id].result() or ""
+        except Exception as e:
+            print(f"Expertise extraction failed: {e}")
+            state.dynamic_expertise = ""
+
+    for i in range(max((state.config["rounds"] for _, state, _ in sessions), default=0)):
+        active = [(t, state, builder) for t, (_, state, builder) in enumerate(sessions)
+                  if i < state.config["rounds"]]
+        requests = {}
+        for t, state, builder in active:
+            config = state.config
+            state.round_starts.append(len(state.history_log))
+            state.current_round = i
+            for j, model in enumerate(config["selected_models"]):
+                system_prompt, prompt = build_turn_prompt(
+                    model, builder.build(ALL_MODELS[model][1]), is_first=(i == 0),
+                    topic=config["topic"], expertise=config["expertise_level"],
+                    personality=config["personality_assignments"].get(model),
+                    url_content=config["url_content"], file_content=config["file_content"],
+                    dynamic_expertise=state.dynamic_expertise or None
+                )
+                requests[f"t{t}-r{i}-m{j}"] = (model, system_prompt, prompt, config["creativity"], 1500,
+                                               config["selected_models"])
+
+        on_status(f"Round {i + 1}: {len(requests)} requests across {len(active)} discussion(s)")
+        results = run_batch(requests, clients, poll_interval, on_status)
+        for t, state, _ in active:
+            for j, model in enumerate(state.config["selected_models"]):
+                result = results.get(f"t{t}-r{i}-m{j}")
+                if isinstance(result, tuple) and result[1]:
+                    model_used, msg = result
+                    state.record_turn(i, j, model, model_used, msg, [])
+                else:
+                    state.record_failure(i, model, result if isinstance(result, ProviderError) else None)
+
+    # Facilitator syntheses (long discussions are reduced to round summaries first)
+    requests = {}
+    for t, (_, state, _) in enumerate(sessions):
+        config = state.config
+        state.phase = "synthesis"
+        round_logs = [
+            "\n\n".join(state.history_log[start:end])
+            for start, end in zip(state.round_starts, state.round_starts[1:] + [len(state.history_log)])
+        ]
+        full_prompt = build_synthesis_prompt(
+            clients, config["topic"], "\n\n".join(state.history_log), config["selected_models"],
+            expertise=config["expertise_level"], synthesis_format=config["synthesis_format"],
+            round_logs=round_logs
+        )
+        requests[f"t{t}-syn"] = (config["facilitator"], FACILITATOR_SYSTEM_PROMPT, full_prompt, 0.5, 4000, ())
+
+    if requests:
+        on_status(f"Synthesis: {len(requests)} request(s)")
+    results = run_batch(requests, clients, poll_interval, on_status)
+    for t, (entry_id, state, _) in enumerate(sessions):
+        result = results.get(f"t{t}-syn")
+        if isinstance(result, tuple) and result[1]:
+            state.finish(*result)
+        else:
+            error = result if isinstance(result, ProviderError) else "Facilitator returned an empty response"
+            state.finish(state.config["facilitator"], f"""❌ **Synthesis Error**
+
+**Error:** {error}
+
+**Discussion Summary Available:**
+The discussion log is preserved above. You can manually review the {len(state.history_log)} messages exchanged.
+""")
+        outcomes[entry_id] = discussion_result(state)
+    return outcomes
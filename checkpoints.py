@@ -0,0 +1,239 @@
+"""
+AI Idea Lab - Session Checkpoints
+Every completed turn is written to durable storage as it happens, so an interrupted
+discussion (failed call, recycled container) can resume without calling the models that
+already answered. The session's loop_config and uploaded documents are written once at the
+start and the synthesis once at the end; per turn only the small progress record (status,
+cursor) is rewritten.
+Backends: SQLite on local disk, or Firestore (survives Cloud Run instance recycling).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import CHECKPOINT_CONFIG
+
+try:
+    from google.cloud import firestore
+    FIRESTORE_AVAILABLE = True
+except ImportError:
+    FIRESTORE_AVAILABLE = False
+
+
+class SQLiteCheckpointStore:
+    """Sessions and turns in a SQLite file."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_parts ("
+                "session_id TEXT NOT NULL, name TEXT NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, name))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "session_id TEXT NOT NULL, round INTEGER NOT NULL, position INTEGER NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, round, position))"
+            )
+
+    def save_session(self, session_id: str, data: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data, ensure_ascii=False, default=str), time.time())
+            )
+
+    def save_part(self, session_id: str, name: str, data: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_parts (session_id, name, data) VALUES (?, ?, ?)",
+                (session_id, name, json.dumps(data, ensure_ascii=False, default=str))
+            )
+
+    def save_turn(self, session_id: str, round_index: int, position: int, turn: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO turns (session_id, round, position, data) VALUES (?, ?, ?, ?)",
+                (session_id, round_index, position, json.dumps(turn, ensure_ascii=False, default=str))
+            )
+
+    def load(self, session_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            parts = self._conn.execute(
+                "SELECT name, data FROM session_parts WHERE session_id = ?", (session_id,)
+            ).fetchall()
+            turns = self._conn.execute(
+                "SELECT data FROM turns WHERE session_id = ? ORDER BY round, position", (session_id,)
+            ).fetchall()
+        return _assemble(json.loads(row[0]), {name: json.loads(data) for name, data in parts},
+                         [json.loads(data) for (data,) in turns])
+
+    def prune(self, older_than: float):
+        with self._lock, self._conn:
+            for table in ("turns", "session_parts"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE session_id IN (SELECT session_id FROM sessions WHERE updated_at < ?)",
+                    (older_than,)
+                )
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (older_than,))
+
+
+class FirestoreCheckpointStore:
+    """
+    One small progress document per session, with subcollections for the turns and the
+    parts written once (config, one document per upload, result), so no single Firestore
+    document grows toward the 1 MiB limit.
+    """
+
+    def __init__(self, collection: str = "discussion_sessions"):
+        if not FIRESTORE_AVAILABLE:
+            raise RuntimeError("google-cloud-firestore library not installed.")
+        self._collection = firestore.Client().collection(collection)
+
+    def save_session(self, session_id: str, data: dict):
+        self._collection.document(session_id).set({
+            "data": json.dumps(data, ensure_ascii=False, default=str),
+            "updated_at": time.time(),
+        })
+
+    def save_part(self, session_id: str, name: str, data: dict):
+        self._collection.document(session_id).collection("parts").document(name).set({
+            "data": json.dumps(data, ensure_ascii=False, default=str),
+        })
+
+    def save_turn(self, session_id: str, round_index: int, position: int, turn: dict):
+        self._collection.document(session_id).collection("turns").document(f"{round_index:03d}-{position:03d}").set({
+            "round": round_index,
+            "position": position,
+            "data": json.dumps(turn, ensure_ascii=False, default=str),
+        })
+
+    def load(self, session_id: str) -> dict | None:
+        snapshot = self._collection.document(session_id).get()
+        if not snapshot.exists:
+            return None
+        reference = self._collection.document(session_id)
+        parts = {doc.id: json.loads(doc.to_dict()["data"]) for doc in reference.collection("parts").stream()}
+        turns = sorted((doc.to_dict() for doc in reference.collection("turns").stream()),
+                       key=lambda t: (t["round"], t["position"]))
+        return _assemble(json.loads(snapshot.to_dict()["data"]), parts, [json.loads(t["data"]) for t in turns])
+
+    def prune(self, older_than: float):
+        for snapshot in self._collection.where("updated_at", "<", older_than).stream():
+            for subcollection in ("turns", "parts"):
+                for doc in snapshot.reference.collection(subcollection).list_documents():
+                    doc.delete()
+            snapshot.reference.delete()
+
+
+def _assemble(progress: dict, parts: dict, turns: list) -> dict:
+    """Session dict from the progress record, the write-once parts and the turns"""
+    session = {"conclusion": None, "full_report": None, **progress}
+    if "config" in parts:
+        config = dict(parts["config"])
+        document_count = config.pop("document_count", 0)
+        config["file_content"] = [parts[f"document-{i:03d}"] for i in range(document_count)
+                                  if f"document-{i:03d}" in parts]
+        session["config"] = config
+    session.update(parts.get("result", {}))
+    session["turns"] = turns
+    return session
+
+
+class CheckpointWriter:
+    """
+    Writes one session's checkpoints. Storage errors are never raised into the discussion;
+    the last one is kept in `error` (shown with the job) so a stale checkpoint isn't silent.
+    """
+
+    def __init__(self, store, session_id: str):
+        self.store = store
+        self.session_id = session_id
+        self.error = None
+        self.failed_writes = 0
+
+    def _write(self, write, *args) -> bool:
+        try:
+            write(self.session_id, *args)
+            return True
+        except Exception as e:
+            print(f"Checkpoint write failed ({self.session_id}): {e}")
+            self.error = str(e)
+            self.failed_writes += 1
+            return False
+
+    def save_config(self, config: dict) -> bool:
+        """Once per session: loop_config, with each uploaded document stored separately"""
+        documents = config.get("file_content") or []
+        base = {key: value for key, value in config.items() if key != "file_content"}
+        ok = self._write(self.store.save_part, "config", dict(base, document_count=len(documents)))
+        for i, document in enumerate(documents):
+            ok = self._write(self.store.save_part, f"document-{i:03d}", document) and ok
+        return ok
+
+    def save_result(self, result: dict) -> bool:
+        """Once per session: the synthesis and full report"""
+        return self._write(self.store.save_part, "result", result)
+
+    def save_session(self, data: dict) -> bool:
+        """The small progress record (status, cursor), rewritten as the discussion advances"""
+        return self._write(self.store.save_session, data)
+
+    def save_turn(self, round_index: int, position: int, turn: dict) -> bool:
+        return self._write(self.store.save_turn, round_index, position, turn)
+
+
+def _build_store(config: dict):
+    backend = config.get("backend", "sqlite")
+    if backend == "firestore":
+        try:
+            return FirestoreCheckpointStore(config.get("firestore_collection", "discussion_sessions"))
+        except Exception as e:
+            print(f"Firestore checkpoints unavailable, using SQLite: {e}")
+    return SQLiteCheckpointStore(config.get("sqlite_path", ".cache/sessions.sqlite3"))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store():
+    """Get the process-wide checkpoint store configured by CHECKPOINT_CONFIG (None if disabled)"""
+    global _store
+    if _store is None and CHECKPOINT_CONFIG.get("enabled", True):
+        with _store_lock:
+            if _store is None:
+                _store = _build_store(CHECKPOINT_CONFIG)
+                _store.prune(time.time() - CHECKPOINT_CONFIG.get("retention_days", 7) * 86400)
+    return _store
+
+
+def load_checkpoint(session_id: str) -> dict | None:
+    """
+    Saved session {"config", "status", "current_round", "current_model", ..., "conclusion",
+    "full_report", "turns"} or None
+    """
+    store = get_checkpoint_store()
+    if store is None:
+        return None
+    try:
+        session = store.load(session_id)
+    except Exception as e:
+        print(f"Checkpoint read failed ({session_id}): {e}")
+        return None
+    # Without its loop_config (that write failed) the session can't be shown or resumed
+    return session if session is not None and "config" in session else None
@@ -0,0 +1,157 @@
+"""
+AI Idea Lab - Batch CLI
+Run discussions without Streamlit from a JSONL file of topics and write the reports.
+
+    python cli.py topics.jsonl --out reports --models "GPT-4o,Claude Sonnet 4" --rounds 2
+
+Each line is {"topic": "..."} plus optional per-topic overrides: "id", "models",
+"facilitator", "rounds", "creativity", "expertise_level", "synthesis_format",
+"personality_mode", "parallel_rounds". Topics whose JSON report already exists are
+skipped, so an interrupted batch can simply be re-run.
+
+With --batch the turns are sent through the OpenAI / Anthropic batch APIs instead
+(about half the price, results within hours); see batch.py.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import DEFAULT_FACILITATOR, SYNTHESIS_FORMATS
+from discussion import run_discussion
+from batch import run_discussions_batch
+from reports import REPORT_FORMATS, render_reports, safe_filename
+
+OVERRIDE_KEYS = ("models", "facilitator", "rounds", "creativity", "expertise_level",
+                 "synthesis_format", "personality_mode", "parallel_rounds")
+
+
+def load_topics(path: str) -> list:
+    """Topic entries from a JSONL file (blank lines and # comments are ignored)"""
+    topics = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            if not entry.get("topic"):
+                raise ValueError(f"{path}:{line_number}: missing \"topic\"")
+            entry.setdefault("id", f"{line_number:04d}_{safe_filename(entry['topic'])}")
+            topics.append(entry)
+    return topics
+
+
+def write_reports(result: dict, out_dir: str, stem: str, formats: list) -> list:
+    reports = render_reports(result["topic"], result["facilitator"], result["conclusion"] or "",
+                             result["discussion_history"], result["full_report"])
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f"{stem}.{REPORT_FORMATS[fmt][1]}")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(reports[fmt])
+        paths.append(path)
+    return paths
+
+
+def run_entry(entry: dict, defaults: dict, out_dir: str, formats: list) -> tuple:
+    options = {**defaults, **{key: entry[key] for key in OVERRIDE_KEYS if key in entry}}
+    start = time.time()
+    result = run_discussion(entry["topic"], **options)
+    paths = write_reports(result, out_dir, entry["id"], formats)
+    return result, paths, time.time() - start
+
+
+def report_status(entry: dict, result: dict, paths: list, elapsed: float):
+    status = "⚠" if result["failures"] or (result["conclusion"] or "").startswith("❌") else "✓"
+    print(f"{status} {entry['id']} ({elapsed:.0f}s, {len(result['discussion_history'])} turns) -> {paths[0]}")
+
+
+def run_batch_mode(pending: list, defaults: dict, out_dir: str, formats: list, poll_interval: float) -> int:
+    """Run every pending topic through the provider batch APIs; returns the number of failures"""
+    start = time.time()
+    entries = [{**defaults, **{key: entry[key] for key in OVERRIDE_KEYS if key in entry},
+                "id": entry["id"], "topic": entry["topic"]} for entry in pending]
+    outcomes = run_discussions_batch(entries, poll_interval=poll_interval)
+    failed = 0
+    for entry in pending:
+        result = outcomes.get(entry["id"])
+        if not isinstance(result, dict):
+            failed += 1
+            print(f"✗ {entry['id']}: {result}", file=sys.stderr)
+            continue
+        report_status(entry, result, write_reports(result, out_dir, entry["id"], formats), time.time() - start)
+    return failed
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Run AI Idea Lab discussions in batch from a JSONL file of topics.")
+    parser.add_argument("topics", help="JSONL file, one {\"topic\": ...} object per line")
+    parser.add_argument("--out", default="reports", help="Output directory (default: reports)")
+    parser.add_argument("--models", default="GPT-4o,Claude Sonnet 4,Gemini 2.5 Flash",
+                        help="Comma-separated collaborator display names")
+    parser.add_argument("--facilitator", default=DEFAULT_FACILITATOR)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--creativity", type=float, default=0.7)
+    parser.add_argument("--expertise", default="General", dest="expertise_level")
+    parser.add_argument("--synthesis-format", default="default", choices=list(SYNTHESIS_FORMATS.keys()))
+    parser.add_argument("--personality-mode", default="auto", choices=["auto", "random"])
+    parser.add_argument("--parallel-rounds", action="store_true")
+    parser.add_argument("--formats", default=",".join(REPORT_FORMATS),
+                        help=f"Comma-separated report formats ({', '.join(REPORT_FORMATS)})")
+    parser.add_argument("--workers", type=int, default=1, help="Discussions to run at the same time")
+    parser.add_argument("--force", action="store_true", help="Re-run topics that already have reports")
+    parser.add_argument("--batch", action="store_true",
+                        help="Use the provider batch APIs (cheaper, but may take hours)")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="Seconds between batch status checks (--batch only)")
+    args = parser.parse_args(argv)
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown_formats = [fmt for fmt in formats if fmt not in REPORT_FORMATS]
+    if unknown_formats:
+        parser.error(f"unknown format(s): {', '.join(unknown_formats)}")
+    # The JSON report marks a topic as done
+    if "json" not in formats:
+        formats.append("json")
+
+    defaults = {
+        "models": [m.strip() for m in args.models.split(",") if m.strip()],
+        "facilitator": args.facilitator,
+        "rounds": args.rounds,
+        "creativity": args.creativity,
+        "expertise_level": args.expertise_level,
+        "synthesis_format": args.synthesis_format,
+        "personality_mode": args.personality_mode,
+        "parallel_rounds": args.parallel_rounds,
+    }
+
+    os.makedirs(args.out, exist_ok=True)
+    topics = load_topics(args.topics)
+    pending = [entry for entry in topics
+               if args.force or not os.path.exists(os.path.join(args.out, f"{entry['id']}.json"))]
+    print(f"{len(topics)} topics, {len(topics) - len(pending)} already done, {len(pending)} to run")
+
+    if args.batch:
+        return 1 if pending and run_batch_mode(pending, defaults, args.out, formats, args.poll_interval) else 0
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {executor.submit(run_entry, entry, defaults, args.out, formats): entry for entry in pending}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                result, paths, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"✗ {entry['id']}: {e}", file=sys.stderr)
+                continue
+            report_status(entry, result, paths, elapsed)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
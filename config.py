@@ -68,9 +68,214 @@ ALL_MODELS.update({k: ("openai", v) for k, v in OPENAI_MODELS.items()})
 ALL_MODELS.update({k: ("anthropic", v) for k, v in ANTHROPIC_MODELS.items()})
 ALL_MODELS.update({k: ("google", v) for k, v in GOOGLE_MODELS.items()})
 
+# Model tiers (used to pick fallbacks of comparable quality at another provider)
+MODEL_TIERS = {
+    "GPT-5": "flagship",
+    "o3": "flagship",
+    "Claude Opus 4.5": "flagship",
+    "Claude Opus 4": "flagship",
+    "Gemini 3 Pro (Preview)": "flagship",
+    "Gemini 2.5 Pro": "flagship",
+    "GPT-4o": "standard",
+    "GPT-4.1": "standard",
+    "Claude Sonnet 4": "standard",
+    "o4-mini": "fast",
+    "Claude Haiku 4.5": "fast",
+    "Gemini 2.5 Flash": "fast",
+    "Gemini 2.0 Flash": "fast",
+    "Gemini 3 Flash (Preview)": "fast",
+}
+
+# Explicit fallbacks (display name -> display names); models not listed use MODEL_TIERS
+FALLBACK_MODELS = {
+    "Gemini 3 Pro (Preview)": ["Claude Opus 4.5", "GPT-5", "Gemini 2.5 Pro"],
+    "Gemini 3 Flash (Preview)": ["Gemini 2.5 Flash", "Claude Haiku 4.5"],
+}
+
 # Default Facilitator Model
 DEFAULT_FACILITATOR = "Claude Sonnet 4"
 
+# --- LLM Response Cache ---
+RESPONSE_CACHE_CONFIG = {
+    "enabled": os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+    "backend": os.getenv("RESPONSE_CACHE_BACKEND", "memory"),  # memory, sqlite, or firestore
+    "max_entries": 512,                 # LRU cap (memory / sqlite)
+    "ttl_seconds": 7 * 24 * 3600,
+    "sqlite_path": os.getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite3"),
+    "firestore_collection": "response_cache",
+    # Calls above this temperature are creative runs and always go to the provider
+    "max_cacheable_temperature": 0.3,
+}
+
+# Per-model limits (tokens). "thinking" models count hidden reasoning tokens
+# against the output cap, so collaborator/facilitator caps are not applied to them.
+MODEL_LIMITS = {
+    # OpenAI
+    "gpt-5": {"context_window": 400000, "max_output_tokens": 128000, "thinking": True},
+    "gpt-4o": {"context_window": 128000, "max_output_tokens": 16384},
+    "gpt-4o-mini": {"context_window": 128000, "max_output_tokens": 16384},
+    "o3": {"context_window": 200000, "max_output_tokens": 100000, "thinking": True},
+    "o4-mini": {"context_window": 200000, "max_output_tokens": 100000, "thinking": True},
+    "gpt-4.1": {"context_window": 1047576, "max_output_tokens": 32768},
+    # Anthropic
+    "claude-opus-4-5-20251101": {"context_window": 200000, "max_output_tokens": 64000},
+    "claude-opus-4-20250514": {"context_window": 200000, "max_output_tokens": 32000},
+    "claude-sonnet-4-20250514": {"context_window": 200000, "max_output_tokens": 64000},
+    "claude-haiku-4-5-20251001": {"context_window": 200000, "max_output_tokens": 64000},
+    "claude-3-5-haiku-20241022": {"context_window": 200000, "max_output_tokens": 8192},
+    # Google
+    "gemini-2.5-pro": {"context_window": 1048576, "max_output_tokens": 65536, "thinking": True},
+    "gemini-2.5-flash": {"context_window": 1048576, "max_output_tokens": 65536, "thinking": True},
+    "gemini-2.0-flash": {"context_window": 1048576, "max_output_tokens": 8192},
+    "gemini-2.0-flash-exp": {"context_window": 1048576, "max_output_tokens": 8192},
+    "gemini-3-pro-preview": {"context_window": 1048576, "max_output_tokens": 65536, "thinking": True},
+    "gemini-3-flash-preview": {"context_window": 1048576, "max_output_tokens": 65536, "thinking": True},
+}
+DEFAULT_MODEL_LIMITS = {"context_window": 128000, "max_output_tokens": 4096}
+
+# --- Retry Policy (provider calls) ---
+RETRY_CONFIG = {
+    "max_retries": 2,
+    "base_delay": 1.0,        # Backoff: random(0, base_delay * 2^attempt), capped at max_delay
+    "max_delay": 20.0,
+    "max_retry_after": 60.0,  # Longest provider Retry-After we are willing to wait
+}
+
+# --- Fallback Routing (circuit breaker + latency SLO per model) ---
+ROUTING_CONFIG = {
+    "enabled": True,
+    "window_seconds": 300,         # Rolling window for latency / error rate
+    "min_samples": 4,              # Samples needed before judging error rate or latency
+    "error_rate_threshold": 0.5,   # Open the circuit at this error rate...
+    "consecutive_failures": 3,     # ...or after this many failures in a row
+    "cooldown_seconds": 60,        # Open circuit duration before a trial call
+    # Reroute while a model's p95 latency is above this, judged per kind: time to first token
+    # of streamed turns, and whole-call latency of non-streamed ones (parallel rounds, synthesis),
+    # which for reasoning models is routinely well past a TTFT budget
+    "latency_slo_seconds": {"ttft": 30, "complete": 180},
+    "max_fallbacks": 2,
+}
+
+# --- Hedged Requests (tail latency) ---
+# When a request has no first token after the model's observed TTFT percentile, a duplicate
+# is sent and the first to answer wins; the loser is cancelled. Non-streaming calls use the
+# percentile of whole-call latency instead. Costs up to max_hedge_ratio extra requests.
+HEDGE_CONFIG = {
+    "percentile": 95,              # Hedge after this percentile of time-to-first-token (or call latency)
+    "min_samples": 5,              # Below this, wait default_delay_seconds
+    "window_size": 50,             # Recent samples kept per model
+    "default_delay_seconds": 10.0,
+    "min_delay_seconds": 2.0,
+    "max_hedge_ratio": 0.1,        # Budget: share of requests that may be duplicated
+    "hedge_model": "same",         # "same" model or "alternate" (first fallback of the model)
+}
+
+# --- Rate Limiting (shared by every session in the process) ---
+# Set rpm/tpm to your account's quotas (either may be left out). Use the sqlite (one host) or redis backend when
+# several instances share the same API keys.
+RATE_LIMIT_CONFIG = {
+    "enabled": os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+    "backend": os.getenv("RATE_LIMIT_BACKEND", "memory"),  # memory, sqlite, or redis
+    "sqlite_path": os.getenv("RATE_LIMIT_PATH", ".cache/rate_limits.sqlite3"),
+    "redis_url": os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    "max_wait_seconds": 90,         # Give up (rate_limit error) after queueing this long
+    "default_output_tokens": 1500,  # Output estimate when max_tokens isn't set
+    "image_tokens": 1000,           # Input estimate per image for vision calls
+    # Per-model buckets use the provider defaults; concurrency is per provider
+    "providers": {
+        "openai": {"rpm": 500, "tpm": 200000, "concurrency": 16},
+        "anthropic": {"rpm": 50, "tpm": 40000, "concurrency": 8},
+        "google": {"rpm": 150, "tpm": 1000000, "concurrency": 16},
+    },
+    # Per-model overrides, e.g. "gpt-5": {"rpm": 500, "tpm": 500000}
+    "models": {},
+}
+
+# --- Background Jobs ---
+JOB_CONFIG = {
+    "max_workers": int(os.getenv("JOB_WORKERS", "4")),  # Discussions running at once per process
+    "retention_seconds": 3600,   # Finished jobs stay available (for reattaching) this long
+    "poll_interval": 1.0,        # Seconds between UI refreshes while a job runs
+}
+
+# --- Session Checkpoints (resume interrupted discussions) ---
+CHECKPOINT_CONFIG = {
+    "enabled": os.getenv("CHECKPOINTS_ENABLED", "true").lower() == "true",
+    "backend": os.getenv("CHECKPOINT_BACKEND", "sqlite"),  # sqlite or firestore
+    "sqlite_path": os.getenv("CHECKPOINT_PATH", ".cache/sessions.sqlite3"),
+    "firestore_collection": "discussion_sessions",
+    "retention_days": 7,
+}
+
+# --- Batch Mode (offline discussions via provider batch APIs) ---
+# OpenAI Batch / Anthropic Message Batches are ~50% cheaper but finish within hours.
+# Point OPENAI_BASE_URL / ANTHROPIC_BASE_URL at fake_batch_server.py to test locally.
+BATCH_CONFIG = {
+    "completion_window": "24h",     # OpenAI batch completion window
+    "poll_interval": 30,            # Seconds between batch status checks
+    "max_wait_seconds": 26 * 3600,  # Give up on a batch after this long
+    "max_sync_workers": 8,          # Concurrent direct calls for providers without a batch API
+}
+
+# --- Provider Prompt Caching ---
+# The stable system prompt prefix (base prompt + file/URL context) is sent first so
+# providers can reuse it: Anthropic via cache_control, OpenAI automatically,
+# Gemini implicitly or via explicit cached content for large prefixes.
+PROMPT_CACHE_CONFIG = {
+    "enabled": True,
+    "gemini_explicit_cache": True,
+    # Explicit cache minimum per model (the API rejects smaller prefixes); smaller prefixes
+    # rely on Gemini's implicit caching. The Flash minimum fits a prefix with file context (~3k).
+    "gemini_min_tokens": {
+        "default": 4096,
+        "gemini-2.5-flash": 1024,
+        "gemini-3-flash-preview": 1024,
+    },
+    "gemini_ttl_seconds": 900,
+}
+
+# Token budgets for collaborator turn context (capped per model by its context window)
+CONTEXT_BUDGET_CONFIG = {
+    # Sized so the context is never smaller than the fixed caps it replaced: six recent turns
+    # of up to 1500 output tokens each, and 8000 characters of documents (about 1 token per
+    # character for Japanese, with headroom for tokenizers that split kanji further)
+    "history_tokens": 10500,    # Recent turns + summary of older rounds
+    "summary_tokens": 1500,     # Summary share of history_tokens (a few ~200-word round summaries)
+    "digest_tokens": 150,       # Per-turn digest for older turns whose round isn't summarized yet
+    "document_tokens": 10000,   # File / URL content embedded in the system prompt
+    "max_context_share": 0.5,   # Never use more than this share of a model's context window
+}
+
+# Lightweight helper models for auxiliary tasks, in priority order (provider, model_id)
+AUXILIARY_MODELS = {
+    "expertise": [
+        ("google", "gemini-2.0-flash-exp"),
+        ("openai", "gpt-4o-mini"),
+        ("anthropic", "claude-3-5-haiku-20241022"),
+    ],
+    "summary": [
+        ("google", "gemini-2.0-flash"),
+        ("openai", "gpt-4o-mini"),
+        ("anthropic", "claude-haiku-4-5-20251001"),
+    ],
+    "vision": [
+        ("openai", "gpt-4o"),
+        ("google", "gemini-2.0-flash-exp"),
+        ("anthropic", "claude-sonnet-4-20250514"),
+    ],
+}
+
+# --- Provider Connection Pools ---
+# Shared by every Streamlit session in the same process
+PROVIDER_POOL_CONFIG = {
+    "max_connections": 20,            # Per provider
+    "max_keepalive_connections": 10,  # Idle connections kept open (avoids new TLS handshakes)
+    "keepalive_expiry": 60,           # Seconds an idle connection is kept
+    "connect_timeout": 10,
+    "read_timeout": 120,
+    "gemini_model_cache_size": 64,    # Cached GenerativeModel handles
+}
+
 # --- Prompts ---
 SYSTEM_PROMPT = """
 You are participating in a focused discussion to help solve a specific problem.
@@ -417,26 +622,38 @@ def get_facilitator_prompt_by_format(format_key: str, expertise_level: str = "Ge
     return base_prompt + expertise_instruction
 
 
-def get_system_prompt(expertise_level: str = "General", personality: str = None, 
-                      dynamic_expertise: str = None) -> str:
-    """Get system prompt with expertise level, personality, and dynamic expertise"""
+def get_system_prompt_parts(expertise_level: str = "General", personality: str = None,
+                            dynamic_expertise: str = None) -> tuple:
+    """
+    Get the system prompt as (shared, per_model) parts.
+    The shared part is byte-identical for every collaborator and turn in a session,
+    so it can be placed first and cached by the provider.
+    """
     expertise_instruction = EXPERTISE_LEVELS.get(expertise_level, EXPERTISE_LEVELS["General"])
     
-    prompt = SYSTEM_PROMPT + expertise_instruction
+    shared = SYSTEM_PROMPT + expertise_instruction
+    per_model = ""
     
     # Add personality
     if personality and personality in AI_PERSONALITIES:
         personality_instruction = AI_PERSONALITIES[personality]["system_prompt_addition"]
-        prompt += "\n" + personality_instruction
+        per_model += "\n" + personality_instruction
     
     # Add dynamic expertise
     if dynamic_expertise:
         dynamic_section = DYNAMIC_EXPERTISE_PROMPT_TEMPLATE.format(
             expertise_context=dynamic_expertise
         )
-        prompt += "\n" + dynamic_section
+        per_model += "\n" + dynamic_section
     
-    return prompt
+    return shared, per_model
+
+
+def get_system_prompt(expertise_level: str = "General", personality: str = None, 
+                      dynamic_expertise: str = None) -> str:
+    """Get system prompt with expertise level, personality, and dynamic expertise"""
+    shared, per_model = get_system_prompt_parts(expertise_level, personality, dynamic_expertise)
+    return shared + per_model
 
 
 def get_facilitator_prompt(expertise_level: str = "General") -> str:
@@ -680,6 +897,12 @@ EXPERTISE_EXTRACTION_PROMPT = """
 {content}
 """
 
+EXPERTISE_CONFIG = {
+    "max_content_chars": 3000,  # Content sent to the extraction prompt
+    "memo_size": 256,           # Memoized results (by content fingerprint)
+    "max_workers": 4,           # Background extraction threads
+}
+
 DYNAMIC_EXPERTISE_PROMPT_TEMPLATE = """
 **Additional Expertise Context (動的専門性):**
 {expertise_context}
@@ -692,8 +915,11 @@ Apply this specialized knowledge while maintaining your core personality traits.
 FILE_UPLOAD_CONFIG = {
     "enabled": True,
     "max_file_size_mb": 10,
+    # Each file is uploaded in its own HTTP request, and Cloud Run rejects requests over
+    # 32 MiB (HTTP/1), so no single file may exceed ~30 MB when deployed there.
+    "max_data_file_size_mb": 30,   # CSV/Excel (profiled in chunks with constant memory)
     "max_files": 5,              # Maximum number of files
-    "max_total_size_mb": 30,     # Maximum total size of all files
+    "max_total_size_mb": 60,     # Maximum total size of all files
     "allowed_extensions": {
         "pdf": {"mime": "application/pdf", "icon": "📄"},
         "csv": {"mime": "text/csv", "icon": "📊"},
@@ -707,6 +933,86 @@ FILE_UPLOAD_CONFIG = {
     }
 }
 
+# Uploads are processed concurrently on a shared worker pool (see ingestion.py)
+INGESTION_CONFIG = {
+    "max_workers": 5,
+    "poll_interval": 0.5,         # Seconds between per-file status refreshes in the uploader
+}
+
+# PDF text extraction (pages split across a process pool, see pdf_extract.py)
+PDF_EXTRACT_CONFIG = {
+    "max_workers": 4,
+    "pages_per_chunk": 8,       # Pages per worker task
+    "max_chars": 40000,         # Stop early past this (well beyond any prompt's document budget)
+    "start_method": "spawn",
+}
+
+# Streaming CSV/Excel profiling (see data_profile.py)
+DATA_PROFILE_CONFIG = {
+    "chunk_rows": 50000,
+    "max_columns": 100,           # Detailed statistics for the first N columns of wide sheets
+    "preview_rows": 5,
+    "sample_rows": 10,            # Reservoir sample of rows shown to the models
+    "quantile_sample_size": 2048, # Per-column reservoir for approximate quantiles
+    "hll_precision": 12,          # HyperLogLog registers = 2^p (~1.6% error on distinct counts)
+    "top_k": 5,
+    "top_k_slack": 20,            # Categories tracked per column = top_k * slack
+    "seed": None,
+}
+
+# Image preprocessing before vision calls (see image_prep.py). Limits match the size each
+# provider downsamples to anyway: OpenAI high detail fits 2048px then 768px on the short side,
+# Anthropic recommends <= 1568px / ~1.15MP, Gemini tiles at 768px.
+IMAGE_PREP_CONFIG = {
+    "providers": {
+        "openai": {"max_side": 2048, "max_short_side": 768},
+        "anthropic": {"max_side": 1568, "max_pixels": 1_150_000},
+        "google": {"max_side": 1536},
+    },
+    "jpeg_quality": 85,
+    "cache_max_mb": 64,           # In-process cache of prepared images
+}
+
+# Processed uploads cached by SHA-256 of the file bytes (see upload_cache.py).
+# Bump an extractor's version when its output changes to invalidate old entries.
+UPLOAD_CACHE_CONFIG = {
+    "enabled": os.getenv("UPLOAD_CACHE_ENABLED", "true").lower() == "true",
+    "backend": os.getenv("UPLOAD_CACHE_BACKEND", "disk"),  # disk or firestore
+    "disk_path": os.getenv("UPLOAD_CACHE_PATH", ".cache/uploads"),
+    "max_size_mb": 200,                 # LRU size cap (disk)
+    "firestore_collection": "upload_cache",
+    "ttl_seconds": 30 * 24 * 3600,      # Firestore entries older than this are ignored
+    "extractor_versions": {"pdf": 2, "data": 2, "image": 2},
+}
+
+# --- Hierarchical Synthesis (map-reduce for long discussions) ---
+SYNTHESIS_CONFIG = {
+    "mode": "auto",                        # auto (long logs only), always, or never
+    "map_reduce_threshold_chars": 32000,   # Logs longer than this are summarized per round
+    "chunk_chars": 8000,                   # Chunk size when per-round logs aren't available
+    "round_summary_max_tokens": 600,
+    "fallback_round_chars": 4000,          # Raw round text used if a summary call fails
+    "max_workers": 5,
+}
+
+ROUND_SUMMARY_PROMPT = """
+Summarize round {round_number} of a multi-AI discussion for the facilitator who will write the final synthesis.
+
+**Write the summary in the same language as the discussion.**
+
+Keep, attributed to each participant by model name:
+- Their key proposals and concrete ideas (with any numbers, names, or steps they gave)
+- Points of agreement and disagreement with others
+- Open questions or risks they raised
+
+Be faithful and specific. No introduction, no conclusion. At most 200 words.
+
+Topic: {topic}
+
+--- Round {round_number} ---
+{round_log}
+"""
+
 VISION_ANALYSIS_PROMPT = """
 この画像を詳細に分析してください。以下の内容を含めて記述してください：
 
@@ -0,0 +1,170 @@
+"""
+AI Idea Lab - Context Builder
+Token-budgeted prompt context for collaborator turns: recent turns verbatim, older
+rounds by their round summaries (synthesis.RoundSummarizer), and only as much
+file/URL content as fits.
+"""
+import re
+
+from config import ALL_MODELS, MODEL_LIMITS, DEFAULT_MODEL_LIMITS, CONTEXT_BUDGET_CONFIG
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+# Calibrated chars-per-token for ASCII text by provider (non-ASCII, e.g. Japanese,
+# is counted at ~1 token per character for every provider)
+CHARS_PER_TOKEN = {"openai": 4.0, "anthropic": 3.5, "google": 4.0}
+_PROVIDER_BY_MODEL_ID = {model_id: provider for provider, model_id in ALL_MODELS.values()}
+_encodings = {}
+
+
+def _encoding_for(model_id: str):
+    if model_id not in _encodings:
+        try:
+            _encodings[model_id] = tiktoken.encoding_for_model(model_id)
+        except Exception:
+            _encodings[model_id] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model_id]
+
+
+def estimate_tokens(text: str, model_id: str = None) -> int:
+    """Token count: exact via tiktoken for OpenAI models when installed, calibrated estimate otherwise"""
+    if not text:
+        return 0
+    provider = _PROVIDER_BY_MODEL_ID.get(model_id, "openai")
+    if TIKTOKEN_AVAILABLE and provider == "openai":
+        return len(_encoding_for(model_id).encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return int(ascii_chars / CHARS_PER_TOKEN[provider] + (len(text) - ascii_chars)) + 1
+
+
+def truncate_to_tokens(text: str, budget: int, model_id: str = None, marker: str = "\n[... truncated ...]") -> str:
+    """Cut text down to roughly `budget` tokens (binary search on the character length)"""
+    if budget <= 0 or not text:
+        return ""
+    if estimate_tokens(text, model_id) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid], model_id) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + marker
+
+
+def token_budget(model_id: str, key: str) -> int:
+    """Configured budget for `key`, capped at a share of the model's context window"""
+    limits = {**DEFAULT_MODEL_LIMITS, **MODEL_LIMITS.get(model_id, {})}
+    share = CONTEXT_BUDGET_CONFIG.get("max_context_share", 0.5)
+    return min(CONTEXT_BUDGET_CONFIG[key], int(limits["context_window"] * share))
+
+
+def fit_documents(documents: list, budget: int, model_id: str = None) -> list:
+    """
+    Fit (name, content) documents into a shared token budget.
+    Each document gets an equal share; budget left over by short documents goes to the longer ones.
+    Returns [(name, fitted_content), ...] in the original order.
+    """
+    fitted = {}
+    remaining = list(enumerate(documents))
+    # Shortest first, so their unused share is redistributed
+    remaining.sort(key=lambda item: estimate_tokens(item[1][1], model_id))
+    while remaining:
+        share = budget // len(remaining)
+        index, (name, content) = remaining.pop(0)
+        fitted_content = truncate_to_tokens(content, share, model_id)
+        budget -= estimate_tokens(fitted_content, model_id)
+        fitted[index] = (name, fitted_content)
+    return [fitted[i] for i in range(len(documents))]
+
+
+class ContextBuilder:
+    """
+    Builds the "Discussion so far" text for a collaborator turn within a token budget.
+    Reads the live history_log and round_starts lists. Older turns are replaced by the
+    summary of their round once `round_summaries()` ({round_index: summary}) has it;
+    until then (or without summaries) each older turn is shortened to a digest.
+    """
+
+    def __init__(self, history_log: list, max_recent_turns: int = 6, round_starts: list = None,
+                 round_summaries=None):
+        self.history_log = history_log
+        self.max_recent_turns = max_recent_turns
+        self.round_starts = round_starts if round_starts is not None else []
+        self.round_summaries = round_summaries or dict
+        self._digests = {}  # history index -> digest
+
+    def _digest(self, index: int) -> str:
+        if index not in self._digests:
+            entry = self.history_log[index]
+            speaker, _, content = entry.partition("]: ")
+            # Leading text of the turn, whole lines joined
+            text = re.sub(r"\s*\n\s*", " ", content.strip())
+            digest = truncate_to_tokens(text, CONTEXT_BUDGET_CONFIG.get("digest_tokens", 150), marker="…")
+            self._digests[index] = f"- {speaker}]: {digest}" if content else f"- {entry}"
+        return self._digests[index]
+
+    def _older_blocks(self, end: int) -> list:
+        """
+        Summary blocks for history_log[:end], newest first: a round summary for each round
+        that lies entirely before `end` and has been summarized, turn digests otherwise.
+        """
+        summaries = self.round_summaries()
+        bounds = list(zip(self.round_starts, self.round_starts[1:] + [len(self.history_log)]))
+        blocks = []
+        index = end - 1
+        while index >= 0:
+            round_index = next((r for r, (start, stop) in enumerate(bounds) if start <= index < stop), None)
+            if round_index is not None and bounds[round_index][1] <= end and round_index in summaries:
+                blocks.append(f"Round {round_index + 1}:\n{summaries[round_index]}")
+                index = bounds[round_index][0] - 1
+            else:
+                blocks.append(self._digest(index))
+                index -= 1
+        return blocks
+
+    def build(self, model_id: str = None) -> str:
+        history_budget = token_budget(model_id, "history_tokens")
+        summary_budget = min(CONTEXT_BUDGET_CONFIG.get("summary_tokens", 600), history_budget // 3)
+
+        # Recent turns verbatim, newest first, while they fit
+        recent = []
+        used = 0
+        index = len(self.history_log) - 1
+        while index >= 0 and len(recent) < self.max_recent_turns:
+            cost = estimate_tokens(self.history_log[index], model_id)
+            if recent and used + cost > history_budget - summary_budget:
+                break
+            if not recent and cost > history_budget - summary_budget:
+                # A single very long turn is truncated rather than dropped
+                recent.append(truncate_to_tokens(self.history_log[index], history_budget - summary_budget, model_id))
+                used = history_budget - summary_budget
+                index -= 1
+                break
+            recent.append(self.history_log[index])
+            used += cost
+            index -= 1
+
+        # Everything older goes into the summary (newest rounds kept first)
+        summary_lines = []
+        summary_used = 0
+        for line in self._older_blocks(index + 1):
+            cost = estimate_tokens(line, model_id)
+            if summary_used + cost > summary_budget:
+                if not summary_lines:
+                    summary_lines.append(truncate_to_tokens(line, summary_budget, model_id, marker="…"))
+                break
+            summary_lines.append(line)
+            summary_used += cost
+
+        parts = []
+        if summary_lines:
+            parts.append("[Summary of earlier discussion]\n" + "\n".join(reversed(summary_lines)))
+        parts.extend(reversed(recent))
+        return "\n\n".join(parts)
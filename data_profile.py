@@ -0,0 +1,268 @@
+"""
+AI Idea Lab - Data Profiling
+Profiles CSV/Excel files chunk by chunk with constant memory: counts, null rates,
+min/max, mean/std (Welford, merged per chunk), approximate quantiles from a
+reservoir sample, approximate distinct counts (HyperLogLog) and top-k categories,
+plus a reservoir sample of whole rows. The profile is rendered as the markdown
+summary that goes into the prompt.
+"""
+import io
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+from config import DATA_PROFILE_CONFIG
+
+
+class HyperLogLog:
+    """Approximate distinct count over 64-bit hashes (standard error ~1.04 / sqrt(2^p))."""
+
+    def __init__(self, precision: int = 12):
+        self.p = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        hashes = hashes.astype(np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Position of the leftmost 1-bit in the remaining 64-p bits (bit length via the float exponent)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class Reservoir:
+    """Uniform sample of k items from a stream of unknown length (Algorithm R, vectorized per chunk)."""
+
+    def __init__(self, size: int, rng: np.random.Generator):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+
+    def offer(self, values: list):
+        if not values or not self.size:
+            return
+        start = self.seen
+        self.seen += len(values)
+        fill = max(0, min(self.size - len(self.items), len(values)))
+        self.items.extend(values[:fill])
+        if fill == len(values):
+            return
+        # Item number n (1-based) replaces a random slot with probability size / n
+        positions = np.arange(start + fill + 1, self.seen + 1)
+        slots = (self.rng.random(len(positions)) * positions).astype(np.int64)
+        for offset in np.nonzero(slots < self.size)[0]:
+            self.items[slots[offset]] = values[fill + offset]
+
+
+class ColumnProfile:
+    """Streaming statistics for one column."""
+
+    def __init__(self, name: str, config: dict, rng: np.random.Generator):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.numeric_count = 0
+        self.non_numeric = 0  # Values in a numeric column that didn't convert to numbers
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.dtypes = Counter()
+        self.distinct = HyperLogLog(config.get("hll_precision", 12))
+        self.quantile_sample = Reservoir(config.get("quantile_sample_size", 2048), rng)
+        self.top_capacity = config.get("top_k", 5) * config.get("top_k_slack", 20)
+        self.top = Counter()
+
+    def update(self, series: pd.Series):
+        self.count += len(series)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        self.dtypes[str(series.dtype)] += 1
+        if values.empty:
+            return
+        self.distinct.add_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+        numeric = pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+        if self.is_numeric and not numeric:
+            # A later chunk was read with another dtype (e.g. a stray "N/A" string): keep the
+            # column numeric and count what didn't convert, so the stats are marked partial
+            coerced = pd.to_numeric(values, errors="coerce")
+            self.non_numeric += int(coerced.isna().sum())
+            values, numeric = coerced.dropna(), True
+        if numeric:
+            if values.empty:
+                return
+            numbers = values.to_numpy(dtype=np.float64)
+            self._merge_moments(len(numbers), float(numbers.mean()), float(((numbers - numbers.mean()) ** 2).sum()))
+            low, high = float(numbers.min()), float(numbers.max())
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+            self.quantile_sample.offer(numbers.tolist())
+        else:
+            # Heavy hitters with a bounded counter: keep the largest counts after each chunk
+            self.top.update(values.astype(str).value_counts().to_dict())
+            if len(self.top) > self.top_capacity:
+                self.top = Counter(dict(self.top.most_common(self.top_capacity)))
+
+    def _merge_moments(self, n: int, mean: float, m2: float):
+        """Welford / Chan et al. merge of a chunk's count, mean and sum of squared deviations"""
+        total = self.numeric_count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.numeric_count * n / total
+        self.numeric_count = total
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.numeric_count > 0
+
+    def summary(self, top_k: int) -> dict:
+        row = {
+            "column": self.name,
+            "type": self.dtypes.most_common(1)[0][0] if self.dtypes else "",
+            "non_null": self.count - self.nulls,
+            "null_rate": self.nulls / self.count if self.count else 0.0,
+            "distinct≈": self.distinct.count(),
+        }
+        if self.is_numeric:
+            std = math.sqrt(self.m2 / (self.numeric_count - 1)) if self.numeric_count > 1 else 0.0
+            quantiles = np.quantile(self.quantile_sample.items, [0.25, 0.5, 0.75]) if self.quantile_sample.items else [None] * 3
+            row.update({"min": self.minimum, "p25≈": quantiles[0], "median≈": quantiles[1],
+                        "p75≈": quantiles[2], "max": self.maximum, "mean": self.mean, "std": std})
+            if self.non_numeric:
+                row["non_numeric"] = self.non_numeric
+        else:
+            row["top"] = ", ".join(f"{value} ({count})" for value, count in self.top.most_common(top_k))
+        return row
+
+
+def iter_chunks(file_bytes: bytes, file_ext: str, chunk_rows: int):
+    """DataFrame chunks of at most chunk_rows rows"""
+    if file_ext == "csv":
+        yield from pd.read_csv(io.BytesIO(file_bytes), chunksize=chunk_rows, low_memory=True)
+    elif file_ext == "xlsx" and openpyxl:
+        # Read-only mode streams rows instead of loading the whole sheet
+        workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+            batch = []
+            for row in rows:
+                batch.append(row[:len(columns)])
+                if len(batch) >= chunk_rows:
+                    yield pd.DataFrame(batch, columns=columns).infer_objects()
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns).infer_objects()
+        finally:
+            workbook.close()
+    else:
+        yield pd.read_excel(io.BytesIO(file_bytes))
+
+
+def profile_data(file_bytes: bytes, file_ext: str, config: dict = None) -> dict:
+    """
+    Streaming profile of a CSV/Excel file.
+    Returns: {"rows": int, "columns": list, "profiled_columns": int, "preview": DataFrame,
+              "sample": DataFrame, "column_stats": [dict]}
+    """
+    config = {**DATA_PROFILE_CONFIG, **(config or {})}
+    rng = np.random.default_rng(config.get("seed"))
+    max_columns = config.get("max_columns", 100)
+    rows = 0
+    columns, profiles, preview = None, None, None
+    row_sample = Reservoir(config.get("sample_rows", 10), rng)
+
+    for chunk in iter_chunks(file_bytes, file_ext, config.get("chunk_rows", 50000)):
+        if columns is None:
+            columns = [str(column) for column in chunk.columns]
+            # Wide sheets: detailed stats for the first max_columns columns only
+            profiles = [ColumnProfile(column, config, rng) for column in columns[:max_columns]]
+            preview = chunk.head(config.get("preview_rows", 5))
+        for profile, column in zip(profiles, chunk.columns[:max_columns]):
+            profile.update(chunk[column])
+        row_sample.offer(list(chunk.itertuples(index=False, name=None)))
+        rows += len(chunk)
+
+    columns = columns or []
+    return {
+        "rows": rows,
+        "columns": columns,
+        "profiled_columns": len(profiles or []),
+        "preview": preview if preview is not None else pd.DataFrame(),
+        "sample": pd.DataFrame(row_sample.items, columns=columns) if row_sample.items else pd.DataFrame(),
+        "column_stats": [profile.summary(config.get("top_k", 5)) for profile in profiles or []],
+    }
+
+
+def _format_value(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def render_profile(profile: dict) -> str:
+    """Markdown summary of a profile for the prompt"""
+    stats = profile["column_stats"]
+    numeric = [row for row in stats if "mean" in row]
+    categorical = [row for row in stats if "top" in row]
+    numeric_keys = ["column", "type", "non_null", "null_rate", "distinct≈", "min", "p25≈", "median≈", "p75≈", "max", "mean", "std"]
+    categorical_keys = ["column", "type", "non_null", "null_rate", "distinct≈", "top"]
+
+    def table(rows: list, keys: list) -> str:
+        lines = ["| " + " | ".join(keys) + " |", "|" + "---|" * len(keys)]
+        for row in rows:
+            cells = [f"{row[key]:.1%}" if key == "null_rate" else _format_value(row.get(key)) for key in keys]
+            lines.append("| " + " | ".join(cell.replace("|", "/") for cell in cells) + " |")
+        return "\n".join(lines)
+
+    columns = profile["columns"]
+    skipped = len(columns) - profile["profiled_columns"]
+    parts = [f"""
+# Data File Analysis Summary
+
+## Basic Info
+- Rows: {profile['rows']}
+- Columns: {len(columns)}{f" (statistics for the first {profile['profiled_columns']})" if skipped else ""}
+
+## Column List
+{', '.join(columns)}
+
+## Data Preview (First {len(profile['preview'])} rows)
+{profile['preview'].to_string()}
+"""]
+    if numeric:
+        partial = [f"- {row['column']}: {row['non_numeric']} non-numeric values left out of the statistics"
+                   for row in numeric if row.get("non_numeric")]
+        notes = "\n**Partial statistics:**\n" + "\n".join(partial) + "\n" if partial else ""
+        parts.append(f"## Numeric Columns (≈: approximate)\n{table(numeric, numeric_keys)}\n{notes}")
+    if categorical:
+        parts.append(f"## Categorical Columns (top values)\n{table(categorical, categorical_keys)}\n")
+    if not profile["sample"].empty:
+        parts.append(f"## Random Sample ({len(profile['sample'])} rows)\n{profile['sample'].to_string(index=False)}\n")
+    return "\n".join(parts)
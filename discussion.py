@@ -0,0 +1,781 @@
+"""
+AI Idea Lab - Discussion Engine
+Everything a discussion needs that isn't UI: model calls, personality assignment and
+the round loop itself. run_session() writes its progress into a DiscussionState so it
+can run on a background worker while the UI polls a snapshot.
+"""
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bs4 import BeautifulSoup
+
+from config import (
+    ALL_MODELS, URL_ANALYSIS_PROMPT_ADDITION, URL_READING_CONFIG, URL_PATTERN, DEFAULT_FACILITATOR,
+    get_system_prompt_parts, get_facilitator_prompt_by_format,
+    get_personality_info, get_personality_avatar, get_all_personality_ids
+)
+from providers import get_clients, client_errors, resolve_model, ProviderError, classify_error
+from retry import RetryPolicy, call_with_retry
+from routing import call_with_fallback
+from hedging import HedgedStream, hedged_call
+from rate_limit import get_rate_limiter
+from expertise import build_expertise_source, prefetch_dynamic_expertise
+from context_builder import ContextBuilder, fit_documents, truncate_to_tokens, token_budget, estimate_tokens
+from synthesis import prepare_discussion_log, use_map_reduce, RoundSummarizer
+
+
+# --- URL Detection and Content Fetching ---
+def detect_url(text: str) -> str | None:
+    """Detect first URL in text"""
+    match = re.search(URL_PATTERN, text)
+    return match.group(0) if match else None
+
+
+def fetch_url_content(url: str) -> dict:
+    """
+    Fetch and extract content from URL
+    Returns: {"success": bool, "title": str, "content": str, "error": str}
+    """
+    if not URL_READING_CONFIG.get("enabled", True):
+        return {"success": False, "title": "", "content": "", "error": "URL reading disabled"}
+    
+    try:
+        headers = {"User-Agent": URL_READING_CONFIG.get("user_agent", "")}
+        response = requests.get(
+            url, 
+            headers=headers, 
+            timeout=URL_READING_CONFIG.get("timeout", 10)
+        )
+        response.raise_for_status()
+        response.encoding = response.apparent_encoding
+        
+        soup = BeautifulSoup(response.text, 'html.parser')
+        
+        # Remove script, style, nav, footer elements
+        for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
+            element.decompose()
+        
+        # Extract title
+        title = ""
+        if soup.title:
+            title = soup.title.string.strip() if soup.title.string else ""
+        elif soup.find('h1'):
+            title = soup.find('h1').get_text(strip=True)
+        
+        # Extract main content (try common article selectors)
+        content = ""
+        article_selectors = ['article', 'main', '.article-body', '.post-content', '#content', '.entry-content']
+        
+        for selector in article_selectors:
+            article = soup.select_one(selector)
+            if article:
+                content = article.get_text(separator='\n', strip=True)
+                break
+        
+        # Fallback: get body text
+        if not content:
+            body = soup.find('body')
+            if body:
+                content = body.get_text(separator='\n', strip=True)
+        
+        # Truncate if too long
+        max_length = URL_READING_CONFIG.get("max_content_length", 8000)
+        if len(content) > max_length:
+            content = content[:max_length] + "\n\n[... Article content truncated ...]"
+        
+        return {
+            "success": True,
+            "title": title,
+            "content": content,
+            "url": url,
+            "error": ""
+        }
+        
+    except requests.Timeout:
+        return {"success": False, "title": "", "content": "", "error": "Timeout: No response from server"}
+    except requests.RequestException as e:
+        return {"success": False, "title": "", "content": "", "error": f"Fetch error: {str(e)}"}
+    except Exception as e:
+        return {"success": False, "title": "", "content": "", "error": f"Parse error: {str(e)}"}
+
+
+# --- Completion Functions ---
+def complete_ai(model_name: str, clients: dict, system_prompt, prompt: str,
+                temperature: float = 0.7, max_tokens: int = 1500) -> str:
+    """
+    Run a completion through the model's provider adapter.
+    system_prompt may be [stable_prefix, remainder] to enable provider prompt caching.
+    Raises ProviderError (classified: rate limit, timeout, auth, ...) on failure.
+    """
+    adapter, model_id = resolve_model(model_name, clients)
+    if not adapter.available:
+        raise ProviderError("not_configured", client_errors().get(adapter.provider)
+                            or f"{adapter.label} API key not configured",
+                            provider=adapter.provider, model=model_name)
+    try:
+        return adapter.complete(model_id, system_prompt, prompt,
+                                temperature=temperature, max_tokens=max_tokens)
+    except Exception as e:
+        raise classify_error(e, adapter.provider, model_name) from e
+
+
+def stream_ai(model_name: str, clients: dict, system_prompt, prompt: str,
+              temperature: float = 0.7, max_tokens: int = 1500):
+    """
+    Stream a completion as text chunks (generator).
+    Raises ProviderError from the generator on failure.
+    """
+    adapter, model_id = resolve_model(model_name, clients)
+    if not adapter.available:
+        raise ProviderError("not_configured", client_errors().get(adapter.provider)
+                            or f"{adapter.label} API key not configured",
+                            provider=adapter.provider, model=model_name)
+    try:
+        yield from adapter.stream(model_id, system_prompt, prompt,
+                                  temperature=temperature, max_tokens=max_tokens)
+    except Exception as e:
+        raise classify_error(e, adapter.provider, model_name) from e
+
+
+# --- AI Call Function ---
+def build_turn_prompt(model_name: str, history_text: str, is_first: bool = False,
+                      topic: str = "", expertise: str = "General", personality: str = None,
+                      url_content: dict = None, file_content: list = None,
+                      dynamic_expertise: str = None) -> tuple:
+    """
+    System and user prompt for a collaborator's next contribution.
+    Returns: ([stable_prefix, per_model_prompt], prompt)
+    """
+    # Stable prefix first (identical on every turn, so providers can cache it),
+    # then the per-model personality and dynamic expertise
+    shared_prompt, per_model_prompt = get_system_prompt_parts(expertise, personality, dynamic_expertise)
+    
+    model_id = ALL_MODELS[model_name][1]
+    document_budget = token_budget(model_id, "document_tokens")
+    
+    # File content integration (highest priority) - now handles list
+    if file_content and len(file_content) > 0:
+        # Build combined file context
+        file_summaries = []
+        documents = []
+        
+        for f in file_content:
+            if f.get("success"):
+                file_info = f.get("file_info", {})
+                file_summaries.append(f"- {file_info.get('icon', '')} {file_info.get('name', 'unknown')} ({file_info.get('extension', '').upper()})")
+                documents.append((file_info.get('name', 'unknown'), f['content']))
+        
+        if documents:
+            # Only as much of each file as fits the model's document budget
+            combined_content = [f"[{name}]\n{content}" for name, content in fit_documents(documents, document_budget, model_id)]
+            file_context = f"""
+**Context: Analyzing Uploaded Files**
+You are analyzing content from {len(combined_content)} uploaded file(s).
+The user's question/instruction is: "{topic}"
+
+**Files:**
+{chr(10).join(file_summaries)}
+
+**File Contents:**
+{chr(10).join(combined_content)}
+
+Focus your discussion on the file contents while addressing the user's question.
+"""
+            shared_prompt = shared_prompt + "\n" + file_context
+    
+    # URL content integration (if no file)
+    elif url_content and url_content.get("success"):
+        url_context = URL_ANALYSIS_PROMPT_ADDITION.format(
+            article_content=truncate_to_tokens(url_content["content"], document_budget, model_id),
+            url=url_content.get("url", "")
+        )
+        shared_prompt = shared_prompt + "\n" + url_context
+
+    system_prompt = [shared_prompt, per_model_prompt]
+
+    if is_first:
+        prompt = f"Topic: {topic}\n\nPlease propose your initial idea on this topic."
+    else:
+        prompt = f"Discussion so far:\n{history_text}\n\nBuild upon the previous ideas and add your unique perspective."
+    return system_prompt, prompt
+
+
+def ask_ai(model_name: str, clients: dict, history_text: str, is_first: bool = False, 
+           topic: str = "", temperature: float = 0.7, expertise: str = "General",
+           personality: str = None, url_content: dict = None, 
+           file_content: list = None,  # Now accepts list of file results
+           dynamic_expertise: str = None, stream: bool = False):
+    """
+    Ask a collaborator model for its next contribution.
+    Returns the full text, or a generator of text chunks when stream=True.
+    """
+    system_prompt, prompt = build_turn_prompt(
+        model_name, history_text, is_first=is_first, topic=topic, expertise=expertise,
+        personality=personality, url_content=url_content, file_content=file_content,
+        dynamic_expertise=dynamic_expertise
+    )
+    if stream:
+        return stream_ai(model_name, clients, system_prompt, prompt,
+                         temperature=temperature, max_tokens=1500)
+    return complete_ai(model_name, clients, system_prompt, prompt,
+                       temperature=temperature, max_tokens=1500)
+
+
+# --- Facilitator Function ---
+FACILITATOR_SYSTEM_PROMPT = "You are a discussion facilitator."
+
+
+def build_synthesis_prompt(clients: dict, topic: str, full_log: str, collaborators: list,
+                           expertise: str = "General", synthesis_format: str = "default",
+                           round_logs: list = None, round_summaries: list = None) -> str:
+    """Facilitator prompt for the synthesis report"""
+    collab_list = "\n".join([f"- **{c}**" for c in collaborators])
+    facilitator_prompt = get_facilitator_prompt_by_format(synthesis_format, expertise).format(topic=topic, collaborator_list=collab_list)
+    
+    # Long discussions: summarize each round concurrently (map), then synthesize from
+    # the round summaries (reduce) instead of dropping the middle of the log
+    log_text, log_title = prepare_discussion_log(full_log, topic, clients, round_logs, round_summaries)
+    return f"{facilitator_prompt}\n\n--- {log_title} ---\n{log_text}"
+
+
+def facilitate(facilitator_name: str, clients: dict, topic: str, full_log: str, collaborators: list, expertise: str = "General", synthesis_format: str = "default", stream: bool = False,
+               round_logs: list = None, round_summaries: list = None):
+    full_prompt = build_synthesis_prompt(clients, topic, full_log, collaborators, expertise,
+                                         synthesis_format, round_logs, round_summaries)
+
+    if stream:
+        return stream_ai(facilitator_name, clients, FACILITATOR_SYSTEM_PROMPT, full_prompt,
+                         temperature=0.5, max_tokens=4000)
+    return complete_ai(facilitator_name, clients, FACILITATOR_SYSTEM_PROMPT, full_prompt,
+                       temperature=0.5, max_tokens=4000)
+
+
+# --- Parallel Round Function ---
+def ask_round_parallel(models: list, clients: dict, history_texts: dict, is_first: bool,
+                       assignments: dict, hedge: bool = False, **ask_kwargs):
+    """
+    Dispatch every model of a round concurrently against the same history snapshot
+    (history_texts: model -> context built from that snapshot within the model's budget).
+    Yields (model, model_used, msg, retries, error, waited) in the order of `models` as soon as
+    each result (and all results before it) has landed, so rendering stays deterministic.
+    model_used differs from model when the turn was rerouted to a fallback; waited is the time
+    spent in the shared provider rate-limit queue.
+    msg is None and error is the ProviderError when a model (and its fallbacks) failed.
+    With hedge=True a slow request is duplicated and the first answer wins.
+    """
+    def call_model(model):
+        retries = []
+        get_rate_limiter().consume_wait()
+
+        def ask(candidate):
+            return ask_ai(candidate, clients, history_texts.get(model, ""), is_first=is_first,
+                          personality=assignments.get(model), **ask_kwargs)
+
+        def attempt(candidate):
+            return call_with_retry(
+                lambda: hedged_call(candidate, ask) if hedge else (candidate, ask(candidate)),
+                on_retry=lambda attempt, error, delay: retries.append(error),
+                model=candidate
+            )
+
+        try:
+            _, (model_used, msg) = call_with_fallback(model, attempt, exclude=models)
+            return model_used, msg, len(retries), None, get_rate_limiter().consume_wait()
+        except ProviderError as e:
+            return model, None, len(retries), e, get_rate_limiter().consume_wait()
+
+    with ThreadPoolExecutor(max_workers=max(1, len(models))) as executor:
+        for model, (model_used, msg, retries, error, waited) in zip(models, executor.map(call_model, models)):
+            yield model, model_used, msg, retries, error, waited
+
+
+# --- Personality Assignment ---
+def assign_personalities(models: list, mode: str, manual: dict = None) -> dict:
+    """Assign personalities to models based on mode (manual: assignments chosen by the user)"""
+    assignments = {}
+    personality_ids = get_all_personality_ids()
+    
+    if mode == "auto":
+        # Cycle through personalities for balanced discussion
+        for i, model in enumerate(models):
+            assignments[model] = personality_ids[i % len(personality_ids)]
+    elif mode == "random":
+        for model in models:
+            assignments[model] = random.choice(personality_ids)
+    elif mode == "manual":
+        assignments = dict(manual or {})
+        # Fill in any missing assignments
+        for model in models:
+            if model not in assignments:
+                assignments[model] = personality_ids[0]
+    
+    return assignments
+
+
+# --- Discussion State ---
+class DiscussionState:
+    """
+    Progress of one discussion. Written by run_session, read by the UI via snapshot().
+    With a checkpoint writer every completed turn is persisted; `completed` holds turns
+    restored from a checkpoint ({(round_index, position): turn}) that won't be asked again.
+    The loop_config goes to the checkpoint once; later writes carry only the cursor.
+    """
+
+    def __init__(self, config: dict, checkpoint=None, completed: dict = None):
+        self.config = config
+        self.checkpoint = checkpoint
+        self.config_saved = False  # loop_config and documents written to the checkpoint
+        self.completed = completed or {}
+        self.lock = threading.Lock()
+        self.turns = []            # Completed turns (discussion_history entries), in order
+        self.history_log = []      # "[model (personality)]: text" lines fed back to the models
+        self.round_starts = []     # history_log index where each round begins
+        self.failures = []         # {"round", "model", "error"} for turns that got no answer
+        self.current_round = 0
+        self.current_model = 0
+        self.phase = "discussion"  # discussion, synthesis, done, cancelled
+        self.partial = None        # Turn being generated: {"model", "personality", "text", "notes"}
+        self.partial_conclusion = ""
+        self.synthesis_notes = []
+        self.dynamic_expertise = None
+        self.facilitator = config["facilitator"]
+        self.conclusion = None
+        self.full_report = None
+
+    def snapshot(self) -> dict:
+        """Consistent copy of the progress for rendering"""
+        with self.lock:
+            return {
+                "turns": list(self.turns),
+                "failures": list(self.failures),
+                "current_round": self.current_round,
+                "current_model": self.current_model,
+                "phase": self.phase,
+                "partial": dict(self.partial, notes=list(self.partial["notes"])) if self.partial else None,
+                "partial_conclusion": self.partial_conclusion,
+                "synthesis_notes": list(self.synthesis_notes),
+                "dynamic_expertise": self.dynamic_expertise,
+                "facilitator": self.facilitator,
+                "conclusion": self.conclusion,
+                "full_report": self.full_report,
+                "checkpoint_error": self.checkpoint.error if self.checkpoint is not None else None,
+            }
+
+    @classmethod
+    def from_checkpoint(cls, session: dict, checkpoint=None) -> "DiscussionState":
+        """State for resuming a saved session (see checkpoints.load_checkpoint)"""
+        completed = {(turn["round"] - 1, turn["position"]): turn for turn in session["turns"]}
+        state = cls(session["config"], checkpoint=checkpoint, completed=completed)
+        state.config_saved = True
+        state.dynamic_expertise = session.get("dynamic_expertise")
+        return state
+
+    def save_progress(self, status: str = None):
+        """Checkpoint the progress record (status, cursor); the loop_config only on the first call"""
+        if self.checkpoint is None:
+            return
+        if not self.config_saved:
+            self.config_saved = self.checkpoint.save_config(self.config)
+        with self.lock:
+            data = {
+                "status": status or self.phase,
+                "current_round": self.current_round,
+                "current_model": self.current_model,
+                "dynamic_expertise": self.dynamic_expertise,
+                "facilitator": self.facilitator,
+            }
+        self.checkpoint.save_session(data)
+
+    def add_note(self, note: str):
+        with self.lock:
+            if self.partial is not None:
+                self.partial["notes"].append(note)
+
+    def record_turn(self, round_index: int, position: int, model: str, model_used: str, msg: str,
+                    notes: list, started_at: float = None):
+        personality = self.config["personality_assignments"].get(model)
+        personality_info = get_personality_info(personality)
+        turn = {
+            "model": model_used,
+            "fallback_for": model if model_used != model else None,
+            "content": msg,
+            "avatar": get_personality_avatar(personality, model),
+            "personality": personality,
+            "personality_info": personality_info,
+            "round": round_index + 1,
+            "position": position,
+            "notes": notes,
+            "output_tokens": estimate_tokens(msg, ALL_MODELS[model_used][1]),  # Estimated
+            "started_at": started_at,
+            "finished_at": time.time(),
+        }
+        self.replay_turn(turn)
+        if self.checkpoint is not None:
+            self.checkpoint.save_turn(round_index, position, turn)
+            self.save_progress()
+
+    def finish(self, facilitator: str, conclusion: str):
+        """Store the synthesis and the full report, and mark the discussion done"""
+        with self.lock:
+            self.facilitator = facilitator
+            self.conclusion = conclusion
+            self.full_report = f"Topic: {self.config['topic']}\n\n" + "\n\n".join(self.history_log) + f"\n\n--- Summary ---\n{conclusion}"
+            self.partial_conclusion = ""
+            self.phase = "done"
+        if self.checkpoint is not None:
+            self.checkpoint.save_result({"conclusion": conclusion, "full_report": self.full_report})
+        self.save_progress()
+
+    def replay_turn(self, turn: dict):
+        """Add a completed turn to the discussion (also used for turns restored from a checkpoint)"""
+        with self.lock:
+            self.history_log.append(f"[{turn['model']} ({turn['personality_info']['name_ja']})]: {turn['content']}")
+            self.turns.append(turn)
+            self.partial = None
+
+    def record_failure(self, round_index: int, model: str, error: ProviderError = None):
+        error_msg = f"❌ {model} failed to respond"
+        with self.lock:
+            self.history_log.append(f"[{model}]: {error_msg}")
+            self.failures.append({
+                "round": round_index + 1,
+                "model": model,
+                "error": f"{error_msg}: {error}" if error else error_msg,
+            })
+            self.partial = None
+
+
+def _retry_note(retries: int) -> str:
+    return f"⚠️ Succeeded after {retries} retr{'y' if retries == 1 else 'ies'}"
+
+
+def run_session(state: DiscussionState, clients: dict, cancel_event: threading.Event = None):
+    """
+    Run the collaboration rounds and the synthesis described by state.config:
+    topic, rounds, selected_models, facilitator, creativity, expertise_level,
+    synthesis_format, parallel_rounds, hedge_requests, personality_assignments,
+    url_content, file_content.
+    """
+    config = state.config
+    topic = config["topic"]
+    rounds = config["rounds"]
+    selected_models = config["selected_models"]
+    assignments = config["personality_assignments"]
+    hedge_requests = config.get("hedge_requests", False)
+    url_content = config.get("url_content")
+    file_content = config.get("file_content") or []
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    with state.lock:
+        state.phase = "discussion"
+    state.save_progress()
+
+    # Runs alongside the first round; memoized if it was prefetched at upload time
+    expertise_future = prefetch_dynamic_expertise(
+        build_expertise_source(file_content, url_content, topic), clients
+    )
+
+    def resolve_expertise():
+        """Pick up the background expertise extraction once it has finished (never blocks)"""
+        if state.dynamic_expertise is None and expertise_future.done():
+            try:
+                value = expertise_future.result() or ""
+            except Exception as e:
+                print(f"Expertise extraction failed: {e}")
+                value = ""
+            with state.lock:
+                state.dynamic_expertise = value
+        return state.dynamic_expertise or None
+
+    # Fewer verbatim turns for longer discussions; older rounds are given by their summaries
+    round_summarizer = RoundSummarizer(topic, clients)
+    context_builder = ContextBuilder(state.history_log, max_recent_turns=max(3, min(6, 20 // rounds)),
+                                     round_starts=state.round_starts,
+                                     round_summaries=round_summarizer.summaries)
+    retry_policy = RetryPolicy.from_config()
+    ask_kwargs = dict(
+        topic=topic, temperature=config["creativity"], expertise=config["expertise_level"],
+        url_content=url_content, file_content=file_content
+    )
+
+    for i in range(rounds):
+        if cancelled():
+            break
+        with state.lock:
+            if state.round_starts:
+                # The previous round is complete: summarize it in the background while this one runs
+                round_summarizer.add_round("\n\n".join(state.history_log[state.round_starts[-1]:]))
+            state.round_starts.append(len(state.history_log))
+            state.current_round = i
+            state.current_model = 0
+
+        if config.get("parallel_rounds"):
+            # Every model in this round sees the same snapshot of the discussion;
+            # models that already answered before a resume are replayed, not asked again
+            pending = [model for j, model in enumerate(selected_models) if (i, j) not in state.completed]
+            context_texts = {model: context_builder.build(ALL_MODELS[model][1]) for model in pending}
+            started_at = time.time()
+            round_results = ask_round_parallel(
+                pending, clients, context_texts, is_first=(i == 0),
+                assignments=assignments, hedge=hedge_requests,
+                dynamic_expertise=resolve_expertise(), **ask_kwargs
+            ) if pending else iter(())
+            for j, model in enumerate(selected_models):
+                with state.lock:
+                    state.current_model = j
+                if (i, j) in state.completed:
+                    state.replay_turn(state.completed[(i, j)])
+                    continue
+                _, model_used, msg, retries, error, waited = next(round_results)
+                if not msg:
+                    state.record_failure(i, model, error)
+                    continue
+                notes = []
+                if model_used != model:
+                    notes.append(f"↪ Answered by {model_used} ({model} unavailable or slow)")
+                if retries:
+                    notes.append(_retry_note(retries))
+                if waited >= 1:
+                    notes.append(f"⏳ Waited {waited:.1f}s in the provider queue")
+                state.record_turn(i, j, model, model_used, msg, notes, started_at)
+            continue
+
+        for j, model in enumerate(selected_models):
+            if cancelled():
+                break
+            with state.lock:
+                state.current_model = j
+            if (i, j) in state.completed:
+                state.replay_turn(state.completed[(i, j)])
+                continue
+            personality = assignments.get(model)
+            with state.lock:
+                state.partial = {"model": model, "personality": personality, "text": "", "notes": []}
+            turn_expertise = resolve_expertise()
+            started_at = time.time()
+
+            def open_stream(candidate):
+                if i == 0 and j == 0:
+                    return ask_ai(candidate, clients, "", is_first=True, personality=personality,
+                                  dynamic_expertise=turn_expertise, stream=True, **ask_kwargs)
+                # Token-budgeted context: recent turns + rolling summary of older ones
+                with state.lock:
+                    context_text = context_builder.build(ALL_MODELS[candidate][1])
+                return ask_ai(candidate, clients, context_text, personality=personality,
+                              dynamic_expertise=turn_expertise, stream=True, **ask_kwargs)
+
+            def stream_turn(candidate):
+                source = HedgedStream(candidate, open_stream) if hedge_requests else open_stream(candidate)
+                chunks = []
+                for chunk in source:
+                    chunks.append(chunk)
+                    with state.lock:
+                        state.partial["text"] += chunk
+                model_used = source.model_used if hedge_requests else candidate
+                if model_used != candidate:
+                    state.add_note(f"↪ Hedged request answered first by {model_used}")
+                return model_used, "".join(chunks)
+
+            def show_retry(attempt, error, delay):
+                with state.lock:
+                    state.partial["text"] = ""
+                state.add_note(f"⚠️ {error} — retry {attempt + 1}/{retry_policy.max_retries} in {delay:.1f}s...")
+
+            def show_reroute(from_model, to_model, error):
+                with state.lock:
+                    state.partial["text"] = ""
+                reason = str(error) if error else f"{from_model} is unhealthy"
+                state.add_note(f"↪ {reason} — answering with {to_model}")
+
+            # Backoff with jitter for retryable errors only (rate limit, overload, timeout...);
+            # a model that still fails (or is circuit-broken / too slow) is rerouted to a fallback
+            get_rate_limiter().consume_wait()
+            try:
+                _, (model_used, msg) = call_with_fallback(
+                    model,
+                    lambda candidate: call_with_retry(
+                        lambda: stream_turn(candidate), retry_policy,
+                        on_retry=show_retry, model=candidate),
+                    exclude=selected_models, on_reroute=show_reroute
+                )
+            except ProviderError as e:
+                state.record_failure(i, model, e)
+                continue
+
+            waited = get_rate_limiter().consume_wait()
+            if waited >= 1:
+                state.add_note(f"⏳ Waited {waited:.1f}s in the provider queue")
+            if msg:
+                with state.lock:
+                    notes = list(state.partial["notes"])
+                state.record_turn(i, j, model, model_used, msg, notes, started_at)
+            else:
+                state.record_failure(i, model)
+
+    if cancelled():
+        round_summarizer.close()
+        with state.lock:
+            state.phase = "cancelled"
+            state.partial = None
+        state.save_progress()
+        return
+
+    _synthesize(state, clients, round_summarizer)
+
+
+def _synthesize(state: DiscussionState, clients: dict, round_summarizer: RoundSummarizer):
+    """Facilitator synthesis over the finished discussion (streamed into state.partial_conclusion)"""
+    config = state.config
+    topic = config["topic"]
+    with state.lock:
+        state.phase = "synthesis"
+        state.partial = None
+        history_log = list(state.history_log)
+        round_starts = list(state.round_starts)
+    state.save_progress()
+
+    full_log = "\n\n".join(history_log)
+    round_logs = [
+        "\n\n".join(history_log[start:end])
+        for start, end in zip(round_starts, round_starts[1:] + [len(history_log)])
+    ]
+
+    # Per-round summaries for map-reduce synthesis (mostly computed during the discussion)
+    if use_map_reduce(len(full_log)):
+        round_summaries = round_summarizer.finish(round_logs)
+    else:
+        round_summaries = None
+        round_summarizer.close()
+
+    facilitator = config["facilitator"]
+    start_time = time.time()
+    try:
+        def stream_conclusion(candidate):
+            with state.lock:
+                state.partial_conclusion = ""
+            chunks = []
+            for chunk in facilitate(candidate, clients, topic, full_log, config["selected_models"],
+                                    expertise=config["expertise_level"],
+                                    synthesis_format=config["synthesis_format"], stream=True,
+                                    round_logs=round_logs, round_summaries=round_summaries):
+                chunks.append(chunk)
+                with state.lock:
+                    state.partial_conclusion += chunk
+            return "".join(chunks)
+
+        def note_synthesis(note):
+            with state.lock:
+                state.partial_conclusion = ""
+                state.synthesis_notes.append(note)
+
+        facilitator, conclusion = call_with_fallback(
+            facilitator,
+            lambda candidate: call_with_retry(
+                lambda: stream_conclusion(candidate),
+                on_retry=lambda attempt, error, delay: note_synthesis(f"⚠️ {error} — retrying in {delay:.1f}s..."),
+                model=candidate),
+            on_reroute=lambda from_model, to_model, error: note_synthesis(
+                f"↪ {error or f'{from_model} is unhealthy'} — synthesizing with {to_model}")
+        )
+
+        if not conclusion:
+            raise Exception("Facilitator returned an empty response")
+
+    except Exception as e:
+        elapsed = time.time() - start_time
+        conclusion = f"""❌ **Synthesis Error** (after {elapsed:.1f}s)
+
+**Error:** {str(e)}
+
+**Troubleshooting:**
+- Try using a different facilitator model
+- Reduce the number of rounds
+- Check API key status
+
+**Discussion Summary Available:**
+The discussion log is preserved above. You can manually review the {len(history_log)} messages exchanged.
+"""
+
+    state.finish(facilitator, conclusion)
+
+
+# --- Headless API ---
+def run_discussion(topic: str, models: list, facilitator: str = DEFAULT_FACILITATOR, rounds: int = 2,
+                   creativity: float = 0.7, expertise_level: str = "General",
+                   synthesis_format: str = "default", personality_mode: str = "auto",
+                   personalities: dict = None, parallel_rounds: bool = False,
+                   hedge_requests: bool = False, fetch_url: bool = True,
+                   file_content: list = None, clients: dict = None) -> dict:
+    """
+    Run a whole discussion synchronously, without Streamlit.
+    personalities: manual {model: personality_id} assignments (personality_mode="manual").
+    file_content: already processed file results ({"success", "content", "file_info"}).
+    Returns: {"topic": str, "facilitator": str, "conclusion": str, "discussion_history": list,
+              "failures": list, "full_report": str, "config": dict}
+    """
+    config = build_config(
+        topic, models, facilitator=facilitator, rounds=rounds, creativity=creativity,
+        expertise_level=expertise_level, synthesis_format=synthesis_format,
+        personality_mode=personality_mode, personalities=personalities,
+        parallel_rounds=parallel_rounds, hedge_requests=hedge_requests,
+        fetch_url=fetch_url, file_content=file_content
+    )
+    state = DiscussionState(config)
+    run_session(state, clients or get_clients())
+    return discussion_result(state)
+
+
+def build_config(topic: str, models: list, facilitator: str = DEFAULT_FACILITATOR, rounds: int = 2,
+                 creativity: float = 0.7, expertise_level: str = "General",
+                 synthesis_format: str = "default", personality_mode: str = "auto",
+                 personalities: dict = None, parallel_rounds: bool = False,
+                 hedge_requests: bool = False, fetch_url: bool = True,
+                 file_content: list = None) -> dict:
+    """Validated session config (state.config) for a headless run; fetches a URL in the topic"""
+    unknown = [m for m in list(models) + [facilitator] if m not in ALL_MODELS]
+    if unknown:
+        raise ValueError(f"Unknown model(s): {', '.join(unknown)}")
+    if len(models) < 2:
+        raise ValueError("At least 2 collaborator models are required")
+
+    url_content = None
+    detected_url = detect_url(topic) if fetch_url else None
+    if detected_url:
+        url_content = fetch_url_content(detected_url)
+        if not url_content["success"]:
+            print(f"URL fetch failed ({detected_url}): {url_content['error']}")
+
+    return {
+        "topic": topic,
+        "rounds": rounds,
+        "selected_models": list(models),
+        "facilitator": facilitator,
+        "creativity": creativity,
+        "expertise_level": expertise_level,
+        "synthesis_format": synthesis_format,
+        "parallel_rounds": parallel_rounds,
+        "hedge_requests": hedge_requests,
+        "personality_assignments": assign_personalities(models, personality_mode, manual=personalities),
+        "url_content": url_content,
+        "file_content": file_content or [],
+    }
+
+
+def discussion_result(state: DiscussionState) -> dict:
+    """run_discussion's return value for a finished state"""
+    snapshot = state.snapshot()
+    return {
+        "topic": state.config["topic"],
+        "facilitator": snapshot["facilitator"],
+        "conclusion": snapshot["conclusion"],
+        "discussion_history": snapshot["turns"],
+        "failures": snapshot["failures"],
+        "full_report": snapshot["full_report"],
+        "config": state.config,
+    }
@@ -0,0 +1,98 @@
+"""
+AI Idea Lab - Dynamic Expertise Extraction
+Extracts the expertise a discussion needs, memoized per content fingerprint and
+run in the background so the first collaborator turn doesn't wait for it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import EXPERTISE_EXTRACTION_PROMPT, EXPERTISE_CONFIG
+from providers import first_available
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=EXPERTISE_CONFIG.get("max_workers", 4),
+    thread_name_prefix="expertise"
+)
+_futures = OrderedDict()  # fingerprint -> Future (in flight or done)
+_futures_lock = threading.Lock()
+
+
+def build_expertise_source(files: list = None, url_content: dict = None, topic: str = "") -> str:
+    """
+    Content to analyze for expertise.
+    Content Source Priority: File > URL > Topic
+    """
+    if files:
+        max_chars = EXPERTISE_CONFIG.get("max_content_chars", 3000)
+        return "\n\n---\n\n".join([
+            f"[{f['file_info']['name']}]\n{f['content'][:max_chars]}"
+            for f in files
+        ])
+    if url_content and url_content.get("success"):
+        return url_content["content"]
+    return topic
+
+
+def content_fingerprint(content: str) -> str:
+    """Fingerprint of the (truncated) content the extraction prompt actually sees"""
+    truncated = (content or "")[:EXPERTISE_CONFIG.get("max_content_chars", 3000)]
+    return hashlib.sha256(truncated.strip().encode("utf-8")).hexdigest()
+
+
+def extract_dynamic_expertise(content: str, clients: dict) -> str:
+    """
+    トピックまたは記事内容から動的に専門性コンテキストを生成
+    軽量モデルを使用してコスト節約
+    """
+    if not content or len(content.strip()) < 10:
+        return ""
+    
+    # 入力を適切な長さに制限
+    truncated_content = content[:EXPERTISE_CONFIG.get("max_content_chars", 3000)]
+    
+    extraction_prompt = EXPERTISE_EXTRACTION_PROMPT.format(content=truncated_content)
+    
+    # 軽量・高速モデルを優先使用 (AUXILIARY_MODELS["expertise"] の順)
+    selected = first_available("expertise", clients)
+    if not selected:
+        return ""
+    adapter, model_id = selected
+    
+    try:
+        return adapter.complete(model_id, "", extraction_prompt, temperature=0.3, max_tokens=300).strip()
+    except Exception as e:
+        print(f"Expertise extraction failed: {e}")
+        return ""
+
+
+def prefetch_dynamic_expertise(content: str, clients: dict) -> Future:
+    """
+    Start (or join) the extraction for this content in the background.
+    Calls with the same fingerprint share one Future, so a speculative prefetch at
+    upload time is picked up by the session start, and repeated discussions on the
+    same documents don't call the model again.
+    """
+    fingerprint = content_fingerprint(content)
+    with _futures_lock:
+        future = _futures.get(fingerprint)
+        if future is not None:
+            _futures.move_to_end(fingerprint)
+            return future
+        future = _executor.submit(extract_dynamic_expertise, content, clients)
+        _futures[fingerprint] = future
+        # Keep only the most recent fingerprints
+        while len(_futures) > EXPERTISE_CONFIG.get("memo_size", 256):
+            _futures.popitem(last=False)
+    # Empty results (e.g. a failed call) are not memoized, so the next session retries
+    future.add_done_callback(lambda f: _forget_if_empty(fingerprint, f))
+    return future
+
+
+def _forget_if_empty(fingerprint: str, future: Future):
+    if future.exception() is not None or not future.result():
+        with _futures_lock:
+            if _futures.get(fingerprint) is future:
+                del _futures[fingerprint]
@@ -0,0 +1,218 @@
+"""
+AI Idea Lab - Fake Batch Server
+A local stand-in for the OpenAI Batch and Anthropic Message Batches APIs, for trying
+batch mode without spending anything. Every request is answered with canned text.
+
+    python fake_batch_server.py --port 8765 --delay 5
+    OPENAI_BASE_URL=http://localhost:8765/v1 ANTHROPIC_BASE_URL=http://localhost:8765 \\
+        python cli.py topics.jsonl --batch --poll-interval 2
+
+--fail-rate makes a share of the items fail (rate limited), to exercise the direct retries.
+Like the real API, an OpenAI batch whose input file mixes models fails validation.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ids = itertools.count(1)
+_files = {}    # file_id -> bytes
+_batches = {}  # batch_id -> {"kind", "created", "requests", "output", "status"}
+_lock = threading.Lock()
+DELAY = 5.0
+FAIL_RATE = 0.0
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _fake_answer(model: str, prompt) -> str:
+    if isinstance(prompt, list):
+        prompt = " ".join(block.get("text", "") for block in prompt if isinstance(block, dict))
+    last_line = (prompt or "").strip().splitlines()[-1:] or [""]
+    return f"[{model} (fake batch)] {last_line[0][:120]}"
+
+
+def _answer_openai(request: dict) -> dict:
+    body = request["body"]
+    if random.random() < FAIL_RATE:
+        return {"id": f"batch_req_{next(_ids)}", "custom_id": request["custom_id"],
+                "response": {"status_code": 429, "request_id": "",
+                             "body": {"error": {"message": "Rate limit reached (fake)", "type": "requests"}}},
+                "error": None}
+    text = _fake_answer(body["model"], body["messages"][-1]["content"])
+    return {"id": f"batch_req_{next(_ids)}", "custom_id": request["custom_id"], "error": None,
+            "response": {"status_code": 200, "request_id": "", "body": {
+                "id": f"chatcmpl-{next(_ids)}", "object": "chat.completion", "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }}}
+
+
+def _answer_anthropic(request: dict) -> dict:
+    params = request["params"]
+    if random.random() < FAIL_RATE:
+        return {"custom_id": request["custom_id"], "result": {
+            "type": "errored",
+            "error": {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded (fake)"}},
+        }}
+    text = _fake_answer(params["model"], params["messages"][-1]["content"])
+    return {"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": {
+        "id": f"msg_{next(_ids)}", "type": "message", "role": "assistant", "model": params["model"],
+        "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": 0, "output_tokens": 0},
+    }}}
+
+
+def _ready(batch: dict) -> bool:
+    """Finish a batch once its delay has passed (answers are generated on first look)"""
+    if batch["status"] in ("failed", "cancelled"):
+        return True
+    if time.time() - batch["created"] < DELAY:
+        return False
+    if batch["output"] is None:
+        answer = _answer_openai if batch["kind"] == "openai" else _answer_anthropic
+        batch["output"] = [answer(request) for request in batch["requests"]]
+    return True
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, status: int, payload=None, text: str = None):
+        data = text.encode("utf-8") if text is not None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if text is None else "application/x-jsonlines")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _openai_batch(self, batch_id: str) -> dict:
+        batch = _batches[batch_id]
+        done = _ready(batch)
+        output_id = f"file-out-{batch_id}" if done and batch["output"] else None
+        if output_id:
+            _files[output_id] = "\n".join(json.dumps(line) for line in batch["output"]).encode("utf-8")
+        return {
+            "id": batch_id, "object": "batch", "endpoint": "/v1/chat/completions", "errors": batch.get("errors"),
+            "input_file_id": batch["input_file_id"], "completion_window": "24h",
+            "status": batch["status"] or ("completed" if done else "in_progress"),
+            "output_file_id": output_id, "error_file_id": None, "created_at": int(batch["created"]),
+            "request_counts": {"total": len(batch["requests"]),
+                               "completed": len(batch["requests"]) if done else 0, "failed": 0},
+        }
+
+    def _anthropic_batch(self, batch_id: str) -> dict:
+        batch = _batches[batch_id]
+        done = _ready(batch)
+        counts = {"processing": 0 if done else len(batch["requests"]), "succeeded": 0,
+                  "errored": 0, "canceled": 0, "expired": 0}
+        for line in batch["output"] or []:
+            counts[line["result"]["type"]] += 1
+        if batch["status"] == "cancelled":
+            counts["canceled"] = len(batch["requests"])
+        host = self.headers.get("Host", f"localhost:{self.server.server_port}")
+        return {
+            "id": batch_id, "type": "message_batch",
+            "processing_status": "ended" if done else "in_progress", "request_counts": counts,
+            "created_at": _iso(batch["created"]), "expires_at": _iso(batch["created"] + 86400),
+            "ended_at": _iso(time.time()) if done else None,
+            "cancel_initiated_at": _iso(batch["cancelled_at"]) if batch["status"] == "cancelled" else None,
+            "archived_at": None,
+            "results_url": f"http://{host}/v1/messages/batches/{batch_id}/results" if done else None,
+        }
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        with _lock:
+            if path == "/v1/files":
+                message = BytesParser().parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + self._body()
+                )
+                content = next(part.get_payload(decode=True) for part in message.get_payload()
+                               if part.get_param("name", header="content-disposition") == "file")
+                file_id = f"file-{next(_ids)}"
+                _files[file_id] = content
+                return self._send(200, {"id": file_id, "object": "file", "bytes": len(content),
+                                        "created_at": int(time.time()), "filename": "batch.jsonl",
+                                        "purpose": "batch", "status": "processed"})
+            if path == "/v1/batches":
+                body = json.loads(self._body())
+                lines = _files[body["input_file_id"]].decode("utf-8").splitlines()
+                batch_id = f"batch_{next(_ids)}"
+                requests = [json.loads(line) for line in lines if line.strip()]
+                batch = {"kind": "openai", "created": time.time(), "output": None, "status": None,
+                         "input_file_id": body["input_file_id"], "requests": requests}
+                models = {request["body"]["model"] for request in requests}
+                if len(models) > 1:
+                    batch["status"] = "failed"
+                    batch["errors"] = {"object": "list", "data": [{
+                        "code": "mismatched_model",
+                        "message": f"A batch input file may only use one model, got {', '.join(sorted(models))}",
+                    }]}
+                _batches[batch_id] = batch
+                return self._send(200, self._openai_batch(batch_id))
+            if path == "/v1/messages/batches":
+                body = json.loads(self._body())
+                batch_id = f"msgbatch_{next(_ids)}"
+                _batches[batch_id] = {"kind": "anthropic", "created": time.time(), "output": None,
+                                      "status": None, "requests": body["requests"]}
+                return self._send(200, self._anthropic_batch(batch_id))
+            parts = path.strip("/").split("/")
+            if parts[-1] == "cancel" and parts[-2] in _batches:
+                batch_id = parts[-2]
+                batch = _batches[batch_id]
+                if batch["output"] is None:
+                    batch["status"] = "cancelled"
+                    batch["cancelled_at"] = time.time()
+                    batch["output"] = [] if batch["kind"] == "openai" else [
+                        {"custom_id": request["custom_id"], "result": {"type": "canceled"}}
+                        for request in batch["requests"]
+                    ]
+                    print(f"Cancelled {batch_id}")
+                return self._send(200, self._openai_batch(batch_id) if batch["kind"] == "openai"
+                                  else self._anthropic_batch(batch_id))
+        self._send(404, {"error": {"type": "not_found_error", "message": f"Unknown path {path}"}})
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        with _lock:
+            if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in _batches:
+                return self._send(200, self._openai_batch(parts[2]))
+            if parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in _files:
+                return self._send(200, text=_files[parts[2]].decode("utf-8"))
+            if parts[:3] == ["v1", "messages", "batches"] and len(parts) >= 4 and parts[3] in _batches:
+                batch_id = parts[3]
+                if len(parts) == 4:
+                    return self._send(200, self._anthropic_batch(batch_id))
+                if parts[4] == "results" and _ready(_batches[batch_id]):
+                    return self._send(200, text="\n".join(json.dumps(line) for line in _batches[batch_id]["output"]))
+        self._send(404, {"error": {"type": "not_found_error", "message": f"Unknown path {self.path}"}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    global DELAY, FAIL_RATE
+    parser = argparse.ArgumentParser(description="Fake OpenAI / Anthropic batch API server for testing batch mode.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=5.0, help="Seconds until a batch is complete")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of items that fail (0-1)")
+    args = parser.parse_args()
+    DELAY, FAIL_RATE = args.delay, args.fail_rate
+    print(f"Fake batch server on http://localhost:{args.port} (delay {DELAY}s, fail rate {FAIL_RATE})")
+    ThreadingHTTPServer(("", args.port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
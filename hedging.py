@@ -0,0 +1,186 @@
+"""
+AI Idea Lab - Hedged Requests
+If a request hasn't produced its first token after a percentile of the model's observed
+time-to-first-token, a duplicate request is issued (same or alternate model) and whichever
+answers first wins; the other is cancelled. Hedges are capped to a share of all requests.
+Non-streaming calls are timed separately (complete latency), never against TTFT.
+"""
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+
+from config import HEDGE_CONFIG
+from providers import CancelScope, cancel_scope
+from routing import get_router, percentile
+
+
+class Hedger:
+    """
+    Per-model latency samples (kind "ttft" for streams, "complete" for whole non-streaming
+    calls), the hedge budget and fired/won stats.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "fired": 0, "won": 0}
+
+    def observe(self, model_name: str, seconds: float, kind: str = "ttft"):
+        with self._lock:
+            samples = self._samples.setdefault((model_name, kind),
+                                               deque(maxlen=HEDGE_CONFIG.get("window_size", 50)))
+            samples.append(seconds)
+
+    def delay(self, model_name: str, kind: str = "ttft") -> float:
+        """Seconds to wait for the first token (or the whole answer, kind "complete") before hedging"""
+        with self._lock:
+            samples = list(self._samples.get((model_name, kind), ()))
+        if len(samples) < HEDGE_CONFIG.get("min_samples", 5):
+            return HEDGE_CONFIG.get("default_delay_seconds", 10.0)
+        return max(HEDGE_CONFIG.get("min_delay_seconds", 2.0),
+                   percentile(samples, HEDGE_CONFIG.get("percentile", 95)))
+
+    def start_request(self):
+        with self._lock:
+            self.stats["requests"] += 1
+
+    def try_fire(self) -> bool:
+        """Spend hedge budget: at most max_hedge_ratio of all requests are duplicated"""
+        with self._lock:
+            if self.stats["fired"] + 1 > HEDGE_CONFIG.get("max_hedge_ratio", 0.1) * self.stats["requests"] + 1:
+                return False
+            self.stats["fired"] += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.stats["won"] += 1
+
+    def hedge_model(self, model_name: str) -> str:
+        if HEDGE_CONFIG.get("hedge_model", "same") == "alternate":
+            fallbacks = get_router().fallbacks(model_name)
+            if fallbacks:
+                return fallbacks[0]
+        return model_name
+
+
+_hedger = Hedger()
+
+
+def get_hedger() -> Hedger:
+    return _hedger
+
+
+def _run_attempt(tag: str, model_name: str, make_stream, events: queue.Queue, scope: CancelScope,
+                 kind: str):
+    """
+    Pull chunks from make_stream(model_name) into the shared queue until done or cancelled.
+    SDK responses opened here are registered with scope, so cancelling closes them mid-read.
+    """
+    start = time.time()
+    iterator = None
+    try:
+        with cancel_scope(scope):
+            iterator = iter(make_stream(model_name))
+            for n, chunk in enumerate(iterator):
+                if scope.cancelled:
+                    break
+                if n == 0:
+                    get_hedger().observe(model_name, time.time() - start, kind)
+                events.put((tag, "chunk", chunk))
+            else:
+                events.put((tag, "done", None))
+    except Exception as e:
+        events.put((tag, "error", e))
+    finally:
+        close = getattr(iterator, "close", None)
+        if scope.cancelled and close:
+            close()
+
+
+class HedgedStream:
+    """
+    Iterate the chunks of make_stream(model_name), hedging a slow first token.
+    After iteration, model_used is the model whose answer was delivered.
+    kind selects the latency window the hedge delay is taken from (see Hedger).
+    """
+
+    def __init__(self, model_name: str, make_stream, kind: str = "ttft"):
+        self.model_name = model_name
+        self.model_used = model_name
+        self.make_stream = make_stream
+        self.kind = kind
+
+    def __iter__(self):
+        hedger = get_hedger()
+        hedger.start_request()
+        events = queue.Queue()
+        scopes = {}
+        models = {}
+
+        def launch(tag, model_name):
+            scopes[tag] = CancelScope()
+            models[tag] = model_name
+            # In a copy of the caller's context, so the winner's timing reaches routing
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run,
+                             args=(_run_attempt, tag, model_name, self.make_stream, events, scopes[tag], self.kind),
+                             daemon=True).start()
+
+        launch("primary", self.model_name)
+        deadline = time.time() + hedger.delay(self.model_name, self.kind)
+        running = {"primary"}
+        winner = None
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+                try:
+                    tag, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    deadline = None
+                    if hedger.try_fire():
+                        launch("hedge", hedger.hedge_model(self.model_name))
+                        running.add("hedge")
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        running.discard(tag)
+                        if not running:
+                            raise payload
+                        continue
+                    # First attempt to produce output wins; the other is cancelled
+                    winner = tag
+                    deadline = None
+                    self.model_used = models[tag]
+                    for other, scope in scopes.items():
+                        if other != tag:
+                            scope.cancel()
+                    if tag == "hedge":
+                        hedger.record_win()
+                elif tag != winner:
+                    continue
+
+                if kind == "chunk":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload
+        finally:
+            # Also reached when the consumer stops early: nothing keeps generating
+            for scope in scopes.values():
+                scope.cancel()
+
+
+def hedged_call(model_name: str, fn):
+    """
+    Hedged fn(model_name) for non-streaming calls. Returns (model_used, result).
+    The hedge delay comes from whole-call latencies, and provider calls made by fn stream
+    underneath so the losing attempt can be cancelled (see providers.CancelScope).
+    """
+    stream = HedgedStream(model_name, lambda model: [fn(model)], kind="complete")
+    results = list(stream)
+    return stream.model_used, results[0] if results else None
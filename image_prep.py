@@ -0,0 +1,84 @@
+"""
+AI Idea Lab - Image Preprocessing
+Prepares uploads for the vision endpoints: detects the real format, applies the EXIF
+orientation, downscales to the resolution the provider would use anyway, strips
+metadata and recompresses. Smaller payloads upload faster and cost fewer image tokens.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from config import IMAGE_PREP_CONFIG
+
+
+def target_size(width: int, height: int, limits: dict) -> tuple:
+    """Largest size within the provider's limits (never upscales)"""
+    scale = 1.0
+    if limits.get("max_side"):
+        scale = min(scale, limits["max_side"] / max(width, height))
+    if limits.get("max_short_side"):
+        scale = min(scale, limits["max_short_side"] / min(width, height))
+    if limits.get("max_pixels"):
+        scale = min(scale, (limits["max_pixels"] / (width * height)) ** 0.5)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def preprocess_image(image_bytes: bytes, provider: str) -> tuple:
+    """
+    Returns: (image_bytes, mime_type) ready for the provider's vision endpoint.
+    Images with transparency stay PNG; everything else becomes JPEG.
+    Raises ValueError when the bytes are not a readable image.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Unreadable image: {e}") from e
+
+    image = ImageOps.exif_transpose(image)  # Rotation would be lost with the metadata
+    size = target_size(image.width, image.height, IMAGE_PREP_CONFIG["providers"].get(provider, {}))
+    if size != image.size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+
+    # Re-encoding without passing exif/info drops EXIF, GPS, ICC and text chunks
+    output = io.BytesIO()
+    if _has_alpha(image):
+        image.convert("RGBA").save(output, format="PNG", optimize=True)
+        return output.getvalue(), "image/png"
+    image.convert("RGB").save(output, format="JPEG", quality=IMAGE_PREP_CONFIG.get("jpeg_quality", 85),
+                              optimize=True)
+    return output.getvalue(), "image/jpeg"
+
+
+_prepared = OrderedDict()  # (sha256, provider) -> (bytes, mime_type)
+_prepared_bytes = 0
+_prepared_lock = threading.Lock()
+
+
+def prepare_image(image_bytes: bytes, provider: str) -> tuple:
+    """preprocess_image, memoized by content hash (LRU capped by total bytes)"""
+    global _prepared_bytes
+    key = (hashlib.sha256(image_bytes).hexdigest(), provider)
+    with _prepared_lock:
+        if key in _prepared:
+            _prepared.move_to_end(key)
+            return _prepared[key]
+
+    prepared = preprocess_image(image_bytes, provider)
+
+    with _prepared_lock:
+        if key not in _prepared:
+            _prepared[key] = prepared
+            _prepared_bytes += len(prepared[0])
+            max_bytes = IMAGE_PREP_CONFIG.get("cache_max_mb", 64) * 1024 * 1024
+            while _prepared_bytes > max_bytes and len(_prepared) > 1:
+                _, (evicted, _) = _prepared.popitem(last=False)
+                _prepared_bytes -= len(evicted)
+    return prepared
@@ -0,0 +1,207 @@
+"""
+AI Idea Lab - File Ingestion
+Turns uploads into text for the prompt (PDF text, data profiles, vision descriptions)
+and runs them through a shared worker pool, so several files are processed at once
+while the UI polls each file's status.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import FILE_UPLOAD_CONFIG, VISION_ANALYSIS_PROMPT, INGESTION_CONFIG
+from providers import first_available
+from pdf_extract import extract_pdf_text
+from upload_cache import get_upload_cache, make_upload_key
+from data_profile import profile_data, render_profile
+from image_prep import prepare_image
+
+
+def get_file_extension(filename: str) -> str:
+    """Get file extension from filename"""
+    return filename.split('.')[-1].lower() if '.' in filename else ""
+
+
+def analyze_csv_excel(file_bytes: bytes, filename: str) -> dict:
+    """
+    Analyze CSV/Excel file and generate summary
+    Returns: {"success": bool, "content": str, "error": str}
+    """
+    file_ext = get_file_extension(filename)
+    if file_ext not in ["csv", "xlsx", "xls"]:
+        return {"success": False, "content": "", "error": "Unsupported file format"}
+    try:
+        # Streamed in chunks with constant memory (see data_profile.py)
+        summary = render_profile(profile_data(file_bytes, file_ext))
+        return {"success": True, "content": summary, "error": ""}
+        
+    except Exception as e:
+        return {"success": False, "content": "", "error": f"Data analysis error: {str(e)}"}
+
+
+def analyze_image_with_vision(image_bytes: bytes, clients: dict) -> dict:
+    """
+    Analyze image using Vision API
+    Returns: {"success": bool, "content": str, "error": str}
+    """
+    # Priority: OpenAI GPT-4o > Google Gemini > Anthropic Claude (AUXILIARY_MODELS["vision"])
+    selected = first_available("vision", clients, capability="vision")
+    if not selected:
+        return {"success": False, "content": "", "error": "Vision API not available (OpenAI/Google/Anthropic API key required)"}
+    adapter, model_id = selected
+    
+    try:
+        # Downscaled, metadata-free and with the real MIME type (PNG screenshots were sent as JPEG)
+        prepared_bytes, mime_type = prepare_image(image_bytes, adapter.provider)
+        content = adapter.vision(model_id, VISION_ANALYSIS_PROMPT, prepared_bytes,
+                                 mime_type=mime_type, max_tokens=1000)
+        return {"success": True, "content": content, "error": ""}
+    except Exception as e:
+        return {"success": False, "content": "", "error": f"Image analysis error: {str(e)}"}
+
+
+def process_file(file_bytes: bytes, filename: str, clients: dict, on_progress=None) -> dict:
+    """
+    Process uploaded file and extract content
+    on_progress(done, total) reports PDF pages as they are extracted.
+    Returns: {"success": bool, "content": str, "error": str, "file_info": dict}
+    """
+    file_ext = get_file_extension(filename)
+    file_size_mb = len(file_bytes) / (1024 * 1024)
+    
+    # Check file size
+    max_size = FILE_UPLOAD_CONFIG.get("max_file_size_mb", 10)
+    if file_ext in ["csv", "xlsx", "xls"]:
+        # Data files are profiled in chunks, so they may be larger
+        max_size = FILE_UPLOAD_CONFIG.get("max_data_file_size_mb", max_size)
+    if file_size_mb > max_size:
+        return {
+            "success": False,
+            "content": "",
+            "error": f"File size too large ({file_size_mb:.1f}MB > {max_size}MB)",
+            "file_info": {}
+        }
+    
+    # Check extension
+    allowed_exts = FILE_UPLOAD_CONFIG.get("allowed_extensions", {})
+    if file_ext not in allowed_exts:
+        return {
+            "success": False,
+            "content": "",
+            "error": f"Unsupported file format: .{file_ext}",
+            "file_info": {}
+        }
+    
+    file_info = {
+        "name": filename,
+        "extension": file_ext,
+        "size_mb": file_size_mb,
+        "icon": allowed_exts[file_ext]["icon"]
+    }
+    
+    # Process based on file type (PDFs, data files and images are cached by content hash)
+    if file_ext == "pdf":
+        result = get_upload_cache().get_or_process(
+            make_upload_key(file_bytes, "pdf"),
+            lambda: extract_pdf_text(file_bytes, on_progress=on_progress)
+        )
+        result["file_info"] = file_info
+        return result
+    
+    elif file_ext in ["csv", "xlsx", "xls"]:
+        result = get_upload_cache().get_or_process(
+            make_upload_key(file_bytes, "data"),
+            lambda: analyze_csv_excel(file_bytes, filename)
+        )
+        result["file_info"] = file_info
+        return result
+    
+    elif file_ext in ["png", "jpg", "jpeg"]:
+        result = get_upload_cache().get_or_process(
+            make_upload_key(file_bytes, "image"),
+            lambda: analyze_image_with_vision(file_bytes, clients)
+        )
+        result["file_info"] = file_info
+        return result
+    
+    elif file_ext in ["txt", "md"]:
+        try:
+            content = file_bytes.decode('utf-8')
+            return {
+                "success": True,
+                "content": content,
+                "error": "",
+                "file_info": file_info
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "content": "",
+                "error": f"Text reading error: {str(e)}",
+                "file_info": file_info
+            }
+    
+    return {
+        "success": False,
+        "content": "",
+        "error": "Unsupported file format",
+        "file_info": file_info
+    }
+
+
+# --- Ingestion Queue ---
+class IngestionTask:
+    """One file going through the queue. status: queued, processing, done, failed."""
+
+    def __init__(self, file_bytes: bytes, filename: str):
+        self.filename = filename
+        self.size_mb = len(file_bytes) / (1024 * 1024)
+        self.status = "queued"
+        self.progress = None   # (pages_done, total_pages) while a PDF is extracted
+        self.result = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+
+class IngestionQueue:
+    """Process-wide worker pool for uploads (PDF parsing, data profiling and vision calls in parallel)."""
+
+    def __init__(self, max_workers: int = 5):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+    def submit(self, file_bytes: bytes, filename: str, clients: dict) -> IngestionTask:
+        """Queue a file; file_bytes is the upload's only read and is shared with the worker"""
+        task = IngestionTask(file_bytes, filename)
+        task.future = self._executor.submit(self._run, task, file_bytes, clients)
+        return task
+
+    @staticmethod
+    def _run(task: IngestionTask, file_bytes: bytes, clients: dict):
+        task.status = "processing"
+        try:
+            def on_progress(done, total):
+                task.progress = (done, total)
+            result = process_file(file_bytes, task.filename, clients, on_progress=on_progress)
+        except Exception as e:
+            result = {"success": False, "content": "", "error": f"Processing error: {str(e)}", "file_info": {}}
+        task.result = result
+        task.finished_at = time.time()
+        task.status = "done" if result["success"] else "failed"
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Get the process-wide ingestion queue configured by INGESTION_CONFIG"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestionQueue(INGESTION_CONFIG.get("max_workers", 5))
+    return _queue
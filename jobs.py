@@ -0,0 +1,131 @@
+"""
+AI Idea Lab - Background Jobs
+Discussions run on a process-wide worker pool instead of inside the Streamlit script,
+so they survive reruns, browser refreshes and dropped websockets. The UI keeps only
+the job id and polls the job's DiscussionState. The job id doubles as the checkpoint
+session id, so a job lost with its container can be resumed from its checkpoint.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOB_CONFIG
+from discussion import DiscussionState, run_session
+from checkpoints import get_checkpoint_store, load_checkpoint, CheckpointWriter
+
+
+def _checkpoint_writer(job_id: str):
+    store = get_checkpoint_store()
+    return CheckpointWriter(store, job_id) if store is not None else None
+
+
+class Job:
+    """One discussion submitted to the worker pool."""
+
+    def __init__(self, job_id: str, state: DiscussionState):
+        self.id = job_id
+        self.state = state
+        self.status = "queued"  # queued, running, done, cancelled, failed
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "failed")
+
+    def cancel(self):
+        """Stop after the turn in progress (the synthesis is skipped)"""
+        self.cancel_event.set()
+
+
+class JobRegistry:
+    """Worker pool plus the jobs it has run, looked up by id."""
+
+    def __init__(self, max_workers: int = 4, retention_seconds: float = 3600):
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="discussion")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, config: dict, clients: dict) -> Job:
+        job_id = uuid.uuid4().hex[:12]
+        return self._start(Job(job_id, DiscussionState(config, checkpoint=_checkpoint_writer(job_id))), clients)
+
+    def resume(self, job_id: str, clients: dict) -> Job | None:
+        """
+        Continue a discussion from its checkpoint: turns that completed are replayed,
+        only the missing ones are asked. Returns the running job if it is still active,
+        or None when there is no checkpoint.
+        """
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            return job
+        session = load_checkpoint(job_id)
+        if session is None:
+            return None
+        return self._start(Job(job_id, DiscussionState.from_checkpoint(session, _checkpoint_writer(job_id))), clients)
+
+    def _start(self, job: Job, clients: dict) -> Job:
+        self.prune()
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, clients)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished and job.finished_at is not None and job.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+    def _run(self, job: Job, clients: dict):
+        if job.cancel_event.is_set():
+            self._finish(job, "cancelled")
+            return
+        job.status = "running"
+        status = "failed"
+        try:
+            run_session(job.state, clients, job.cancel_event)
+            status = "cancelled" if job.state.phase == "cancelled" else "done"
+        except Exception as e:
+            print(f"Discussion job {job.id} failed: {e}")
+            job.error = str(e)
+            job.state.save_progress("failed")
+        finally:
+            self._finish(job, status)
+
+    @staticmethod
+    def _finish(job: Job, status: str):
+        # finished_at first: once the status is terminal, prune() may compare it from another thread
+        job.finished_at = time.time()
+        job.status = status
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_job_registry() -> JobRegistry:
+    """Get the process-wide job registry configured by JOB_CONFIG"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = JobRegistry(
+                    max_workers=JOB_CONFIG.get("max_workers", 4),
+                    retention_seconds=JOB_CONFIG.get("retention_seconds", 3600),
+                )
+    return _registry
@@ -0,0 +1,160 @@
+"""
+AI Idea Lab - PDF Extraction
+Page-level text extraction spread over a process pool (pdfplumber is pure Python and
+CPU-bound, so threads wouldn't help). The PDF is written to a temp file once; each worker
+opens it once and extracts chunks of pages from it, in page order. Extraction stops early
+once there is more text than any prompt can use.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+from config import PDF_EXTRACT_CONFIG
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all sessions (created on first use)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_CONFIG.get("max_workers", 4),
+                # spawn: never fork the server process with its threads and sockets
+                mp_context=multiprocessing.get_context(PDF_EXTRACT_CONFIG.get("start_method", "spawn"))
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+# --- Worker side ---
+# Each worker opens a document once and keeps it for the following chunks of the same file
+_worker_document = None  # (path, pdfplumber.PDF | PyPDF2.PdfReader)
+
+
+def _open_document(path: str):
+    global _worker_document
+    if _worker_document is None or _worker_document[0] != path:
+        if _worker_document is not None:
+            close = getattr(_worker_document[1], "close", None)
+            if close:
+                close()
+        _worker_document = None
+        _worker_document = (path, pdfplumber.open(path) if pdfplumber else PyPDF2.PdfReader(path))
+    return _worker_document[1]
+
+
+def page_count(path: str) -> int:
+    """Number of pages (runs in a worker process, which keeps the document open)"""
+    return len(_open_document(path).pages)
+
+
+def extract_pages(path: str, start: int, end: int) -> list:
+    """Text of pages [start, end) (runs in a worker process)"""
+    texts = []
+    for page in _open_document(path).pages[start:end]:
+        texts.append(page.extract_text() or "")
+        if hasattr(page, "flush_cache"):
+            page.flush_cache()  # pdfplumber keeps parsed layout objects per page otherwise
+    return texts
+
+
+# --- Caller side ---
+def _chunk_texts(path: str, total_pages: int, pages_per_chunk: int):
+    """Yield (end_page, texts) per chunk in page order, extracted in the process pool"""
+    ranges = [(start, min(start + pages_per_chunk, total_pages))
+              for start in range(0, total_pages, pages_per_chunk)]
+    pool = get_pdf_pool()
+    # Only a pool's worth of chunks in flight, so an early stop doesn't waste the rest
+    window = PDF_EXTRACT_CONFIG.get("max_workers", 4) * 2
+    in_flight = deque()
+    next_range = 0
+    try:
+        while in_flight or next_range < len(ranges):
+            while next_range < len(ranges) and len(in_flight) < window:
+                start, end = ranges[next_range]
+                in_flight.append((end, pool.submit(extract_pages, path, start, end)))
+                next_range += 1
+            end, future = in_flight.popleft()
+            yield end, future.result()
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+
+def extract_pdf_text(file_bytes: bytes, max_chars: int = None, on_progress=None) -> dict:
+    """
+    Extract text from PDF
+    max_chars: stop once this much text is extracted (default PDF_EXTRACT_CONFIG["max_chars"]).
+    on_progress(pages_done, total_pages) is called after each chunk of pages.
+    Returns: {"success": bool, "content": str, "error": str, "pages": int, "pages_extracted": int}
+    """
+    if not pdfplumber and not PyPDF2:
+        return {"success": False, "content": "", "error": "PDF processing library not installed",
+                "pages": 0, "pages_extracted": 0}
+    max_chars = max_chars or PDF_EXTRACT_CONFIG.get("max_chars", 40000)
+    pages_per_chunk = max(1, PDF_EXTRACT_CONFIG.get("pages_per_chunk", 8))
+
+    # The PDF goes to the workers once, as a temp file path, instead of pickled with every chunk
+    # (unique name: workers key their open document by path)
+    fd, path = tempfile.mkstemp(prefix=f"pdf-{uuid.uuid4().hex}-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_bytes)
+        total_pages = get_pdf_pool().submit(page_count, path).result()
+        parts = []
+        extracted_chars = 0
+        pages_extracted = 0
+        chunks = _chunk_texts(path, total_pages, pages_per_chunk)
+        for end, texts in chunks:
+            parts.extend(text for text in texts if text)
+            extracted_chars += sum(len(text) for text in texts)
+            pages_extracted = end
+            if on_progress:
+                on_progress(pages_extracted, total_pages)
+            if extracted_chars >= max_chars:
+                chunks.close()
+                break
+
+        return {
+            "success": True,
+            "content": "\n\n".join(parts).strip(),
+            "error": "",
+            "pages": total_pages,
+            "pages_extracted": pages_extracted,
+        }
+    except BrokenProcessPool as e:
+        # A worker died (e.g. out of memory); start a fresh pool next time
+        _reset_pool()
+        return {"success": False, "content": "", "error": f"PDF extraction error: {str(e)}",
+                "pages": 0, "pages_extracted": 0}
+    except Exception as e:
+        return {"success": False, "content": "", "error": f"PDF extraction error: {str(e)}",
+                "pages": 0, "pages_extracted": 0}
+    finally:
+        # Workers still holding the document keep reading the unlinked file until they move on
+        try:
+            os.remove(path)
+        except OSError:
+            pass
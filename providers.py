@@ -0,0 +1,813 @@
+"""
+AI Idea Lab - Provider Clients & Adapters
+Process-wide API clients that share explicitly sized keep-alive connection pools,
+and one adapter per provider so callers never branch on the provider themselves.
+"""
+import base64
+import contextvars
+import datetime
+import email.utils
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import openai
+from openai import OpenAI
+import anthropic
+import google.generativeai as genai
+from google.generativeai import caching
+
+from config import (
+    OPENAI_API_KEY, ANTHROPIC_API_KEY, GOOGLE_API_KEY, PROVIDER_POOL_CONFIG,
+    ALL_MODELS, NO_TEMPERATURE_MODELS, MODEL_LIMITS, DEFAULT_MODEL_LIMITS, AUXILIARY_MODELS,
+    PROMPT_CACHE_CONFIG, RATE_LIMIT_CONFIG, BATCH_CONFIG
+)
+from response_cache import get_response_cache, make_cache_key
+from context_builder import estimate_tokens
+from rate_limit import get_rate_limiter
+
+
+_clients = None
+_clients_lock = threading.Lock()
+
+
+def _build_http_client(sdk):
+    """
+    Build a pooled HTTP client for one SDK (one per provider, reused by every session in the
+    process). The SDK's DefaultHttpxClient keeps its transport defaults and the httpx package
+    it was built against; Limits and Timeout come from that same package.
+    """
+    limits = type(sdk.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=PROVIDER_POOL_CONFIG.get("max_connections", 20),
+        max_keepalive_connections=PROVIDER_POOL_CONFIG.get("max_keepalive_connections", 10),
+        keepalive_expiry=PROVIDER_POOL_CONFIG.get("keepalive_expiry", 60),
+    )
+    timeout = sdk.Timeout(
+        PROVIDER_POOL_CONFIG.get("read_timeout", 120),
+        connect=PROVIDER_POOL_CONFIG.get("connect_timeout", 10),
+    )
+    return sdk.DefaultHttpxClient(limits=limits, timeout=timeout)
+
+
+_client_errors = {}  # provider -> why its client could not be built
+
+
+def _build_clients() -> dict:
+    clients = {"openai": None, "anthropic": None, "google": None}
+    _client_errors.clear()
+
+    def build(provider: str, factory):
+        try:
+            clients[provider] = factory()
+        except Exception as e:
+            _client_errors[provider] = f"{type(e).__name__}: {e}"
+            print(f"Could not create the {provider} client: {_client_errors[provider]}")
+
+    # Retries are handled by retry.py (backoff, jitter, Retry-After), not the SDK
+    if OPENAI_API_KEY:
+        build("openai", lambda: OpenAI(api_key=OPENAI_API_KEY, http_client=_build_http_client(openai),
+                                       max_retries=0))
+    if ANTHROPIC_API_KEY:
+        build("anthropic", lambda: anthropic.Anthropic(api_key=ANTHROPIC_API_KEY,
+                                                       http_client=_build_http_client(anthropic), max_retries=0))
+    if GOOGLE_API_KEY:
+        build("google", lambda: genai.configure(api_key=GOOGLE_API_KEY) or True)
+    return clients
+
+
+def client_errors() -> dict:
+    """{provider: error} for providers whose key is set but whose client failed to build"""
+    get_clients()
+    return dict(_client_errors)
+
+
+def get_clients() -> dict:
+    """
+    Get the shared provider clients, building them on first use.
+    Returns: {"openai": OpenAI | None, "anthropic": Anthropic | None, "google": bool | None}
+    """
+    global _clients
+    if _clients is None:
+        with _clients_lock:
+            if _clients is None:
+                _clients = _build_clients()
+    return _clients
+
+
+@lru_cache(maxsize=PROVIDER_POOL_CONFIG.get("gemini_model_cache_size", 64))
+def _cached_gemini_model(model_id: str, config_items: tuple):
+    return genai.GenerativeModel(model_id, generation_config=dict(config_items) or None)
+
+
+def get_gemini_model(model_id: str, generation_config: dict = None):
+    """Get a cached GenerativeModel handle keyed by (model_id, generation_config)"""
+    config_items = tuple(sorted((generation_config or {}).items()))
+    return _cached_gemini_model(model_id, config_items)
+
+
+# --- Provider Errors ---
+ERROR_LABELS = {
+    "rate_limit": "Rate limited",
+    "overloaded": "Provider overloaded",
+    "timeout": "Timed out",
+    "connection": "Connection error",
+    "server": "Provider server error",
+    "auth": "Authentication failed",
+    "not_configured": "API key not configured",
+    "content_filter": "Blocked by content filter",
+    "bad_request": "Invalid request",
+    "cancelled": "Cancelled",
+    "unknown": "Error",
+}
+# Only known transient failures; an unrecognized exception is more likely a bug than a blip
+RETRYABLE_ERRORS = {"rate_limit", "overloaded", "timeout", "connection", "server"}
+
+
+class ProviderError(Exception):
+    """A provider call failure, classified so callers can decide whether to retry."""
+
+    def __init__(self, kind: str, message: str, provider: str = "", model: str = "",
+                 retry_after: float = None, status_code: int = None):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+        self.provider = provider
+        self.model = model
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in RETRYABLE_ERRORS
+
+    def __str__(self):
+        label = ERROR_LABELS.get(self.kind, "Error")
+        return f"{label} ({self.model}): {self.message}" if self.model else f"{label}: {self.message}"
+
+
+def _retry_after_seconds(exc) -> float | None:
+    """Retry-After / retry-after-ms response header, in seconds"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def classify_error(exc: Exception, provider: str = "", model: str = "") -> ProviderError:
+    """Map an SDK exception (OpenAI, Anthropic, Google) to a ProviderError"""
+    if isinstance(exc, ProviderError):
+        return exc
+    name = type(exc).__name__
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None and isinstance(getattr(exc, "code", None), int):
+        status = exc.code  # google.api_core exceptions carry the HTTP status in .code
+    lowered = str(exc).lower()
+
+    if name in ("APITimeoutError", "TimeoutException", "ReadTimeout", "ConnectTimeout",
+                "DeadlineExceeded", "TimeoutError") or status in (408, 504):
+        kind = "timeout"
+    elif status == 429 or name in ("RateLimitError", "ResourceExhausted"):
+        kind = "rate_limit"
+    elif status in (503, 529) or name in ("OverloadedError", "ServiceUnavailable") or "overloaded" in lowered:
+        kind = "overloaded"
+    elif status in (401, 403) or name in ("AuthenticationError", "PermissionDeniedError",
+                                          "PermissionDenied", "Unauthenticated"):
+        kind = "auth"
+    elif name in ("BlockedPromptException", "StopCandidateException") or "content_filter" in lowered \
+            or "content_policy" in lowered or (status in (None, 400) and ("safety" in lowered or "blocked" in lowered)):
+        kind = "content_filter"
+    elif name in ("APIConnectionError", "ConnectError", "RemoteProtocolError"):
+        kind = "connection"
+    elif status and status >= 500:
+        kind = "server"
+    elif status and 400 <= status < 500:
+        kind = "bad_request"
+    else:
+        kind = "unknown"
+
+    return ProviderError(kind, str(exc), provider=provider, model=model,
+                         retry_after=_retry_after_seconds(exc), status_code=status)
+
+
+class BatchItemError(Exception):
+    """A failed request inside a provider batch (classified like a direct call's exception)."""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# --- Cancellation ---
+class CancelScope:
+    """
+    The open SDK responses of one request (e.g. a hedged attempt), so another thread can
+    abort it: cancel() closes them, which unblocks the read in the requesting thread.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._responses = []
+        self._lock = threading.Lock()
+
+    def register(self, response):
+        with self._lock:
+            if not self.cancelled:
+                self._responses.append(response)
+                return response
+        _close_response(response)
+        return response
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            responses, self._responses = self._responses, []
+        for response in responses:
+            _close_response(response)
+
+
+def _close_response(response):
+    close = getattr(response, "close", None)  # Gemini's streaming response can't be closed
+    if close:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+_cancel_scopes = threading.local()
+
+
+@contextmanager
+def cancel_scope(scope: CancelScope):
+    """Register the SDK responses opened by this thread with scope"""
+    previous = getattr(_cancel_scopes, "current", None)
+    _cancel_scopes.current = scope
+    try:
+        yield scope
+    finally:
+        _cancel_scopes.current = previous
+
+
+def current_cancel_scope() -> CancelScope | None:
+    return getattr(_cancel_scopes, "current", None)
+
+
+def _track(response):
+    scope = current_cancel_scope()
+    return scope.register(response) if scope is not None else response
+
+
+# --- Request Timing ---
+class RequestTiming:
+    """Latency of the last provider request made under it (see request_timing)."""
+
+    def __init__(self):
+        self.latency = None
+        self.kind = "ttft"  # "ttft" for streams, "complete" for whole non-streamed calls
+
+
+_request_timing = contextvars.ContextVar("request_timing", default=None)
+
+
+@contextmanager
+def request_timing():
+    """
+    Measure the provider requests made in this context: time to first token for streams,
+    the whole call otherwise. Queueing for a rate-limit slot and retry sleeps aren't included,
+    and a cache hit leaves latency None.
+    """
+    timing = RequestTiming()
+    token = _request_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _request_timing.reset(token)
+
+
+def _record_latency(started: float, kind: str):
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.latency = time.time() - started
+        timing.kind = kind
+
+
+_gemini_caches = {}  # (model_id, prefix hash) -> (CachedContent | None, expires_at)
+_gemini_cache_key_locks = {}  # (model_id, prefix hash) -> Lock held while its cache is created
+_gemini_caches_lock = threading.Lock()
+
+
+def _gemini_min_tokens(model_id: str) -> int:
+    """Smallest prefix worth an explicit cache for this model (the API's minimum)"""
+    minimums = PROMPT_CACHE_CONFIG.get("gemini_min_tokens", {})
+    if not isinstance(minimums, dict):
+        return minimums
+    return minimums.get(model_id, minimums.get("default", 4096))
+
+
+def _gemini_cached_content(model_id: str, system_instruction: str):
+    """
+    Explicit Gemini context cache for a large, stable system prefix (reused until it expires).
+    Returns None when caching isn't possible, so the caller falls back to implicit caching.
+    """
+    ttl = PROMPT_CACHE_CONFIG.get("gemini_ttl_seconds", 900)
+    key = (model_id, hashlib.sha256(system_instruction.encode("utf-8")).hexdigest())
+
+    def fresh(entry):
+        # Refresh a little before expiry so an in-flight call never hits a deleted cache
+        return entry is not None and entry[1] >= time.time() + 60
+
+    with _gemini_caches_lock:
+        entry = _gemini_caches.get(key)
+        if fresh(entry):
+            return entry[0]
+        key_lock = _gemini_cache_key_locks.setdefault(key, threading.Lock())
+
+    # The API call runs under this prefix's lock only: other prefixes and cache hits don't wait
+    with key_lock:
+        with _gemini_caches_lock:
+            entry = _gemini_caches.get(key)
+        if fresh(entry):
+            return entry[0]
+        try:
+            cached_content = caching.CachedContent.create(
+                model=f"models/{model_id}",
+                system_instruction=system_instruction,
+                ttl=datetime.timedelta(seconds=ttl),
+            )
+        except Exception as e:
+            # Unsupported model or prefix below the minimum size; don't retry until expiry
+            print(f"Gemini context cache unavailable for {model_id}: {e}")
+            cached_content = None
+        now = time.time()
+        with _gemini_caches_lock:
+            for stale in [k for k, (_, expires_at) in _gemini_caches.items() if expires_at < now]:
+                del _gemini_caches[stale]
+                if stale != key:
+                    _gemini_cache_key_locks.pop(stale, None)
+            _gemini_caches[key] = (cached_content, now + ttl)
+        return cached_content
+
+
+def split_system_prompt(system_prompt) -> tuple:
+    """
+    System prompts are either a plain string or [stable_prefix, remainder] blocks.
+    Returns (cacheable prefix, remainder); a plain string has no cacheable prefix.
+    """
+    if isinstance(system_prompt, (list, tuple)):
+        prefix, remainder = (list(system_prompt) + ["", ""])[:2]
+        return prefix or "", remainder or ""
+    return "", system_prompt or ""
+
+
+def join_system_prompt(system_prompt) -> str:
+    prefix, remainder = split_system_prompt(system_prompt)
+    return prefix + remainder
+
+
+# --- Provider Adapters ---
+class ProviderAdapter:
+    """
+    Common interface over one provider's text, streaming and vision endpoints.
+    system_prompt is a string or [stable_prefix, remainder] (see split_system_prompt).
+    """
+
+    provider = ""
+    label = ""
+    supports_vision = True
+    supports_streaming = True
+    supports_batch = False
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def available(self) -> bool:
+        """True if the provider's API key is configured"""
+        return bool(self.client)
+
+    @staticmethod
+    def limits(model_id: str) -> dict:
+        """Context window / output cap for a model"""
+        return {**DEFAULT_MODEL_LIMITS, **MODEL_LIMITS.get(model_id, {})}
+
+    @staticmethod
+    def supports_temperature(model_id: str) -> bool:
+        return model_id not in NO_TEMPERATURE_MODELS
+
+    def output_cap(self, model_id: str, max_tokens: int = None) -> int | None:
+        """
+        Effective output token cap: the requested cap clamped to the model limit.
+        None for thinking models, whose cap would also cut off hidden reasoning.
+        """
+        limits = self.limits(model_id)
+        if max_tokens is None or limits.get("thinking"):
+            return None
+        return min(max_tokens, limits["max_output_tokens"])
+
+    def _request_cost(self, model_id: str, text: str, max_tokens: int = None, images: int = 0) -> int:
+        """Estimated tokens a call consumes from the TPM budget (input + expected output)"""
+        output = self.output_cap(model_id, max_tokens) or RATE_LIMIT_CONFIG.get("default_output_tokens", 1500)
+        return estimate_tokens(text, model_id) + output + images * RATE_LIMIT_CONFIG.get("image_tokens", 1000)
+
+    @contextmanager
+    def _rate_limited(self, model_id: str, cost: int):
+        """Queue for this provider/model's shared RPM/TPM budget and concurrency slot"""
+        with get_rate_limiter().slot(self.provider, model_id, cost) as waited:
+            if waited is None:
+                raise ProviderError(
+                    "rate_limit", "Timed out waiting in the local request queue (quota exhausted)",
+                    self.provider, model_id
+                )
+            scope = current_cancel_scope()
+            if scope is not None and scope.cancelled:
+                # Abandoned while queued: don't send the request at all
+                raise ProviderError("cancelled", "Request was cancelled", self.provider, model_id)
+            yield
+
+    def _limited_complete(self, model_id, system_prompt, prompt, temperature, max_tokens) -> str:
+        cost = self._request_cost(model_id, join_system_prompt(system_prompt) + prompt, max_tokens)
+        with self._rate_limited(model_id, cost):
+            started = time.time()
+            if current_cancel_scope() is not None:
+                # Cancellable (hedged) call: stream underneath, a blocking call can't be aborted
+                text = "".join(self._stream(model_id, system_prompt, prompt, temperature, max_tokens))
+            else:
+                text = self._complete(model_id, system_prompt, prompt, temperature, max_tokens)
+            _record_latency(started, "complete")
+            return text
+
+    def _limited_stream(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        cost = self._request_cost(model_id, join_system_prompt(system_prompt) + prompt, max_tokens)
+        # The slot is held until the stream is exhausted or closed
+        with self._rate_limited(model_id, cost):
+            started = time.time()
+            for n, chunk in enumerate(self._stream(model_id, system_prompt, prompt, temperature, max_tokens)):
+                if n == 0:
+                    _record_latency(started, "ttft")
+                yield chunk
+
+    def _limited_vision(self, model_id, prompt, image_bytes, mime_type, max_tokens) -> str:
+        with self._rate_limited(model_id, self._request_cost(model_id, prompt, max_tokens, images=1)):
+            return self._vision(model_id, prompt, image_bytes, mime_type, max_tokens)
+
+    def complete(self, model_id: str, system_prompt, prompt: str,
+                 temperature: float = None, max_tokens: int = None, cache: bool = True) -> str:
+        """Text completion, served from the response cache when possible (cache=False bypasses it)"""
+        response_cache = get_response_cache()
+        if not cache or response_cache.should_bypass(temperature):
+            response_cache.bypass()
+            return self._limited_complete(model_id, system_prompt, prompt, temperature, max_tokens)
+        key = make_cache_key(self.provider, model_id, join_system_prompt(system_prompt), prompt, temperature, max_tokens)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        text = self._limited_complete(model_id, system_prompt, prompt, temperature, max_tokens)
+        response_cache.set(key, text)
+        return text
+
+    def stream(self, model_id: str, system_prompt, prompt: str,
+               temperature: float = None, max_tokens: int = None, cache: bool = True):
+        """Streaming completion (generator); a cache hit is yielded as a single chunk"""
+        response_cache = get_response_cache()
+        if not cache or response_cache.should_bypass(temperature):
+            response_cache.bypass()
+            yield from self._limited_stream(model_id, system_prompt, prompt, temperature, max_tokens)
+            return
+        key = make_cache_key(self.provider, model_id, join_system_prompt(system_prompt), prompt, temperature, max_tokens)
+        cached = response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        chunks = []
+        for chunk in self._limited_stream(model_id, system_prompt, prompt, temperature, max_tokens):
+            chunks.append(chunk)
+            yield chunk
+        response_cache.set(key, "".join(chunks))
+
+    def vision(self, model_id: str, prompt: str, image_bytes: bytes,
+               mime_type: str = "image/jpeg", max_tokens: int = 1000, cache: bool = True) -> str:
+        """Image analysis, cached by (model, prompt, image bytes)"""
+        response_cache = get_response_cache()
+        if not cache or not response_cache.enabled:
+            response_cache.bypass()
+            return self._limited_vision(model_id, prompt, image_bytes, mime_type, max_tokens)
+        key = make_cache_key(self.provider, model_id, "", prompt, None, max_tokens, attachment=image_bytes)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        text = self._limited_vision(model_id, prompt, image_bytes, mime_type, max_tokens)
+        response_cache.set(key, text)
+        return text
+
+    # Provider-specific implementations
+    def _complete(self, model_id, system_prompt, prompt, temperature, max_tokens) -> str:
+        raise NotImplementedError
+
+    def _stream(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        raise NotImplementedError
+
+    def _vision(self, model_id, prompt, image_bytes, mime_type, max_tokens) -> str:
+        raise NotImplementedError
+
+    # Batch API (only when supports_batch). A request is a tuple:
+    # (custom_id, model_id, system_prompt, prompt, temperature, max_tokens)
+    def submit_batch(self, requests: list) -> str:
+        """Submit requests for a single model as one batch; returns the batch id"""
+        raise NotImplementedError
+
+    def batch_done(self, batch_id: str) -> bool:
+        raise NotImplementedError
+
+    def cancel_batch(self, batch_id: str):
+        """Stop a batch that is no longer waited for (requests not yet run aren't billed)"""
+        raise NotImplementedError
+
+    def batch_results(self, batch_id: str) -> dict:
+        """{custom_id: text | ProviderError} for a finished batch (missing ids never ran)"""
+        raise NotImplementedError
+
+
+class OpenAIAdapter(ProviderAdapter):
+    provider = "openai"
+    label = "OpenAI"
+    supports_batch = True
+
+    def _params(self, model_id, system_prompt, prompt, temperature, max_tokens) -> dict:
+        # OpenAI caches identical prompt prefixes automatically; the stable part is sent first
+        messages = [{"role": "user", "content": prompt}]
+        if join_system_prompt(system_prompt):
+            messages.insert(0, {"role": "system", "content": join_system_prompt(system_prompt)})
+        params = {"model": model_id, "messages": messages}
+        if temperature is not None and self.supports_temperature(model_id):
+            params["temperature"] = temperature
+        cap = self.output_cap(model_id, max_tokens)
+        if cap:
+            params["max_tokens"] = cap
+        return params
+
+    def _complete(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        params = self._params(model_id, system_prompt, prompt, temperature, max_tokens)
+        response = self.client.chat.completions.create(**params)
+        return response.choices[0].message.content
+
+    def _stream(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        params = self._params(model_id, system_prompt, prompt, temperature, max_tokens)
+        for chunk in _track(self.client.chat.completions.create(**params, stream=True)):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _vision(self, model_id, prompt, image_bytes, mime_type, max_tokens):
+        base64_image = base64.b64encode(image_bytes).decode("utf-8")
+        response = self.client.chat.completions.create(
+            model=model_id,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}"}}
+                    ]
+                }
+            ],
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
+
+    def submit_batch(self, requests: list) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._params(model_id, system_prompt, prompt, temperature, max_tokens),
+            }, ensure_ascii=False)
+            for custom_id, model_id, system_prompt, prompt, temperature, max_tokens in requests
+        ]
+        batch_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id, endpoint="/v1/chat/completions",
+            completion_window=BATCH_CONFIG.get("completion_window", "24h")
+        )
+        return batch.id
+
+    def batch_done(self, batch_id: str) -> bool:
+        return self.client.batches.retrieve(batch_id).status in ("completed", "failed", "expired", "cancelled")
+
+    def cancel_batch(self, batch_id: str):
+        self.client.batches.cancel(batch_id)
+
+    def batch_results(self, batch_id: str) -> dict:
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    error = entry.get("error") or (response.get("body") or {}).get("error") or {}
+                    results[entry["custom_id"]] = classify_error(
+                        BatchItemError(error.get("message", "Batch request failed"), response.get("status_code")),
+                        self.provider
+                    )
+        return results
+
+
+class AnthropicAdapter(ProviderAdapter):
+    provider = "anthropic"
+    label = "Anthropic"
+    supports_batch = True
+
+    # Error types in batch results -> the HTTP status a direct call would have returned
+    BATCH_ERROR_STATUS = {
+        "invalid_request_error": 400, "authentication_error": 401, "permission_error": 403,
+        "not_found_error": 404, "rate_limit_error": 429, "api_error": 500, "overloaded_error": 529,
+    }
+
+    def _params(self, model_id, system_prompt, prompt, temperature, max_tokens) -> dict:
+        # Anthropic requires max_tokens; thinking/uncapped calls get the model limit
+        limits = self.limits(model_id)
+        params = {
+            "model": model_id,
+            "max_tokens": self.output_cap(model_id, max_tokens) or min(limits["max_output_tokens"], 8192),
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        prefix, remainder = split_system_prompt(system_prompt)
+        if prefix and PROMPT_CACHE_CONFIG.get("enabled", True):
+            # Cache breakpoint after the stable prefix
+            params["system"] = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+            if remainder.strip():
+                params["system"].append({"type": "text", "text": remainder})
+        elif prefix + remainder:
+            params["system"] = prefix + remainder
+        if temperature is not None and self.supports_temperature(model_id):
+            params["temperature"] = temperature
+        return params
+
+    def _complete(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        params = self._params(model_id, system_prompt, prompt, temperature, max_tokens)
+        response = self.client.messages.create(**params)
+        return response.content[0].text
+
+    def _stream(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        params = self._params(model_id, system_prompt, prompt, temperature, max_tokens)
+        with self.client.messages.stream(**params) as stream:
+            _track(stream)
+            for text in stream.text_stream:
+                yield text
+
+    def _vision(self, model_id, prompt, image_bytes, mime_type, max_tokens):
+        base64_image = base64.b64encode(image_bytes).decode("utf-8")
+        response = self.client.messages.create(
+            model=model_id,
+            max_tokens=max_tokens,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image", "source": {"type": "base64", "media_type": mime_type, "data": base64_image}},
+                        {"type": "text", "text": prompt}
+                    ]
+                }
+            ]
+        )
+        return response.content[0].text
+
+    def submit_batch(self, requests: list) -> str:
+        batch = self.client.messages.batches.create(requests=[
+            {"custom_id": custom_id, "params": self._params(model_id, system_prompt, prompt, temperature, max_tokens)}
+            for custom_id, model_id, system_prompt, prompt, temperature, max_tokens in requests
+        ])
+        return batch.id
+
+    def batch_done(self, batch_id: str) -> bool:
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def cancel_batch(self, batch_id: str):
+        self.client.messages.batches.cancel(batch_id)
+
+    def batch_results(self, batch_id: str) -> dict:
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = entry.result.message.content[0].text
+            elif entry.result.type == "errored":
+                error = getattr(entry.result.error, "error", entry.result.error)
+                results[entry.custom_id] = classify_error(
+                    BatchItemError(getattr(error, "message", str(error)),
+                                   self.BATCH_ERROR_STATUS.get(getattr(error, "type", ""), 500)),
+                    self.provider
+                )
+            else:  # canceled / expired
+                results[entry.custom_id] = ProviderError("timeout", f"Batch request {entry.result.type}", self.provider)
+        return results
+
+
+class GoogleAdapter(ProviderAdapter):
+    provider = "google"
+    label = "Google"
+
+    def _generation_config(self, model_id, temperature, max_tokens) -> dict:
+        generation_config = {}
+        if temperature is not None and self.supports_temperature(model_id):
+            generation_config["temperature"] = temperature
+        cap = self.output_cap(model_id, max_tokens)
+        if cap:
+            generation_config["max_output_tokens"] = cap
+        return generation_config
+
+    def _model(self, model_id, temperature, max_tokens):
+        return get_gemini_model(model_id, self._generation_config(model_id, temperature, max_tokens))
+
+    def _prepare(self, model_id, system_prompt, prompt, temperature, max_tokens) -> tuple:
+        """(model, contents): large stable prefixes go to an explicit context cache"""
+        prefix, remainder = split_system_prompt(system_prompt)
+        if (prefix and PROMPT_CACHE_CONFIG.get("enabled", True)
+                and PROMPT_CACHE_CONFIG.get("gemini_explicit_cache", True)
+                and estimate_tokens(prefix, model_id) >= _gemini_min_tokens(model_id)):
+            cached_content = _gemini_cached_content(model_id, prefix)
+            if cached_content is not None:
+                model = genai.GenerativeModel.from_cached_content(
+                    cached_content=cached_content,
+                    generation_config=self._generation_config(model_id, temperature, max_tokens) or None
+                )
+                contents = f"{remainder}\n\n{prompt}" if remainder.strip() else prompt
+                return model, contents
+        # Stable prefix first, so Gemini's implicit caching can reuse it
+        system_text = prefix + remainder
+        contents = f"{system_text}\n\n{prompt}" if system_text else prompt
+        return self._model(model_id, temperature, max_tokens), contents
+
+    def _complete(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        model, contents = self._prepare(model_id, system_prompt, prompt, temperature, max_tokens)
+        return model.generate_content(contents).text
+
+    def _stream(self, model_id, system_prompt, prompt, temperature, max_tokens):
+        model, contents = self._prepare(model_id, system_prompt, prompt, temperature, max_tokens)
+        for chunk in _track(model.generate_content(contents, stream=True)):
+            # Chunks without text parts (e.g. safety metadata) raise on .text
+            if chunk.parts:
+                yield chunk.text
+
+    def _vision(self, model_id, prompt, image_bytes, mime_type, max_tokens):
+        model = self._model(model_id, None, max_tokens)
+        response = model.generate_content([prompt, {"mime_type": mime_type, "data": image_bytes}])
+        return response.text
+
+
+ADAPTER_CLASSES = {
+    "openai": OpenAIAdapter,
+    "anthropic": AnthropicAdapter,
+    "google": GoogleAdapter,
+}
+
+_adapters = {}
+
+
+def get_adapter(provider: str, clients: dict = None) -> ProviderAdapter:
+    """Get the adapter for a provider (cached for the shared clients)"""
+    if clients is None or clients is get_clients():
+        if provider not in _adapters:
+            _adapters[provider] = ADAPTER_CLASSES[provider](get_clients().get(provider))
+        return _adapters[provider]
+    return ADAPTER_CLASSES[provider](clients.get(provider))
+
+
+def resolve_model(model_name: str, clients: dict = None) -> tuple:
+    """Map a display name from ALL_MODELS to (adapter, model_id)"""
+    provider, model_id = ALL_MODELS[model_name]
+    return get_adapter(provider, clients), model_id
+
+
+def first_available(task: str, clients: dict = None, capability: str = None) -> tuple | None:
+    """
+    Pick the first configured (adapter, model_id) for an auxiliary task in AUXILIARY_MODELS.
+    Returns None if no provider is available.
+    """
+    for provider, model_id in AUXILIARY_MODELS.get(task, []):
+        adapter = get_adapter(provider, clients)
+        if adapter.available and (capability is None or getattr(adapter, f"supports_{capability}")):
+            return adapter, model_id
+    return None
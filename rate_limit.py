@@ -0,0 +1,280 @@
+"""
+AI Idea Lab - Rate Limiter
+Process-wide requests-per-minute / tokens-per-minute token buckets keyed by provider
+and model, plus a per-provider concurrency cap. Callers queue FIFO per bucket.
+Buckets live in memory, or in SQLite / Redis so several instances share one quota.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import RATE_LIMIT_CONFIG
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+def _take(requests: float, tokens: float, updated: float, rpm: float, tpm: float,
+          cost: float, now: float) -> tuple:
+    """
+    Refill both buckets, then try to take 1 request + cost tokens. Returns (requests, tokens, wait).
+    A limit of 0 (not configured) is unlimited; its bucket is left alone.
+    """
+    elapsed = max(0.0, now - updated)
+    wait = 0.0
+    if rpm:
+        requests = min(rpm, requests + elapsed * rpm / 60)
+        if requests < 1:
+            wait = (1 - requests) * 60 / rpm
+    if tpm:
+        tokens = min(tpm, tokens + elapsed * tpm / 60)
+        cost = min(cost, tpm)  # A request larger than the whole budget waits for a full bucket
+        if tokens < cost:
+            wait = max(wait, (cost - tokens) * 60 / tpm)
+    if wait:
+        return requests, tokens, wait
+    return requests - (1 if rpm else 0), tokens - (cost if tpm else 0), 0.0
+
+
+class MemoryBucketStore:
+    """Buckets for this process only."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rpm: float, tpm: float, cost: float) -> float:
+        """Seconds to wait before retrying; 0.0 means the request was admitted"""
+        now = time.time()
+        with self._lock:
+            requests, tokens, updated = self._buckets.get(key, (rpm, tpm, now))
+            requests, tokens, wait = _take(requests, tokens, updated, rpm, tpm, cost, now)
+            self._buckets[key] = (requests, tokens, now)
+            return wait
+
+
+class SQLiteBucketStore:
+    """Buckets in a SQLite file, shared by every process on the host."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "key TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def take(self, key: str, rpm: float, tpm: float, cost: float) -> float:
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT requests, tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                requests, tokens, updated = row if row else (rpm, tpm, now)
+                requests, tokens, wait = _take(requests, tokens, updated, rpm, tpm, cost, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (key, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                    (key, requests, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return wait
+
+
+class RedisBucketStore:
+    """Buckets in Redis, shared by every instance of the app."""
+
+    # Same arithmetic as _take, run atomically on the server
+    SCRIPT = """
+    local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated')
+    local rpm, tpm, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local requests = tonumber(state[1]) or rpm
+    local tokens = tonumber(state[2]) or tpm
+    local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+    local wait = 0
+    if rpm > 0 then
+        requests = math.min(rpm, requests + elapsed * rpm / 60)
+        if requests < 1 then wait = (1 - requests) * 60 / rpm end
+    end
+    if tpm > 0 then
+        tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+        cost = math.min(cost, tpm)
+        if tokens < cost then wait = math.max(wait, (cost - tokens) * 60 / tpm) end
+    end
+    if wait == 0 then
+        if rpm > 0 then requests = requests - 1 end
+        if tpm > 0 then tokens = tokens - cost end
+    end
+    redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], 120)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis library not installed.")
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key: str, rpm: float, tpm: float, cost: float) -> float:
+        return float(self._script(keys=[f"ratelimit:{key}"], args=[rpm, tpm, cost, time.time()]))
+
+
+class RateLimiter:
+    """Admits provider calls within RPM/TPM budgets and a per-provider concurrency cap."""
+
+    def __init__(self, store, config: dict):
+        self.store = store
+        self.config = config
+        self._cond = threading.Condition()
+        self._queues = {}    # bucket key -> deque of waiting tickets (FIFO)
+        self._active = {}    # provider -> calls in flight
+        self._waiting = {}   # provider -> callers queued
+        self._local = threading.local()
+        self.stats = {"admitted": 0, "queued": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    def limits(self, provider: str, model_id: str) -> dict:
+        """Provider defaults overridden by per-model entries"""
+        return {**self.config.get("providers", {}).get(provider, {}),
+                **self.config.get("models", {}).get(model_id, {})}
+
+    @contextmanager
+    def _unlocked(self):
+        """Drop the condition's lock for the block (store I/O must not stall every other caller)"""
+        self._cond.release()
+        try:
+            yield
+        finally:
+            self._cond.acquire()
+
+    def acquire(self, provider: str, model_id: str, cost: float) -> float | None:
+        """Block until admitted. Returns seconds waited, or None if max_wait_seconds ran out."""
+        limits = self.limits(provider, model_id)
+        rpm, tpm = limits.get("rpm") or 0, limits.get("tpm") or 0  # Each limit applies on its own
+        concurrency = limits.get("concurrency")
+        key = f"{provider}:{model_id}"
+        start = time.time()
+        deadline = start + self.config.get("max_wait_seconds", 90)
+        ticket = object()
+        with self._cond:
+            queue = self._queues.setdefault(key, deque())
+            queue.append(ticket)
+            self._waiting[provider] = self._waiting.get(provider, 0) + 1
+            try:
+                while True:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    # Only the head of the queue may take from the bucket, so callers are served in order
+                    if queue[0] is ticket and (not concurrency or self._active.get(provider, 0) < concurrency):
+                        # Claim the concurrency slot, then take from the bucket outside the lock;
+                        # the rest of this key's queue keeps waiting behind the head meanwhile
+                        self._active[provider] = self._active.get(provider, 0) + 1
+                        try:
+                            with self._unlocked():
+                                wait = self.store.take(key, rpm, tpm, cost) if rpm or tpm else 0.0
+                        except Exception:
+                            self._active[provider] -= 1
+                            raise
+                        if wait == 0.0:
+                            break
+                        self._active[provider] -= 1
+                        self._cond.notify_all()
+                        self._cond.wait(min(wait, remaining))
+                    else:
+                        self._cond.wait(remaining)
+            finally:
+                queue.remove(ticket)
+                self._waiting[provider] -= 1
+                self._cond.notify_all()
+
+            waited = time.time() - start
+            self.stats["admitted"] += 1
+            if waited >= 0.05:
+                self.stats["queued"] += 1
+                self.stats["total_wait"] += waited
+                self.stats["max_wait"] = max(self.stats["max_wait"], waited)
+        self._local.waited = getattr(self._local, "waited", 0.0) + waited
+        return waited
+
+    def release(self, provider: str):
+        with self._cond:
+            self._active[provider] = max(0, self._active.get(provider, 0) - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, provider: str, model_id: str, cost: float):
+        """Hold an admitted call for the duration of the block. Yields seconds waited, or None on timeout."""
+        waited = self.acquire(provider, model_id, cost)
+        try:
+            yield waited
+        finally:
+            if waited is not None:
+                self.release(provider)
+
+    def consume_wait(self) -> float:
+        """Seconds the current thread spent queued since the last call (for per-turn display)"""
+        waited = getattr(self._local, "waited", 0.0)
+        self._local.waited = 0.0
+        return waited
+
+    def waiting(self) -> dict:
+        """{provider: callers queued right now}"""
+        with self._cond:
+            return {provider: count for provider, count in self._waiting.items() if count}
+
+
+class _Unlimited:
+    """Stand-in when rate limiting is disabled."""
+    stats = {"admitted": 0, "queued": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    @contextmanager
+    def slot(self, provider: str, model_id: str, cost: float):
+        yield 0.0
+
+    def consume_wait(self) -> float:
+        return 0.0
+
+    def waiting(self) -> dict:
+        return {}
+
+
+def _build_store(config: dict):
+    backend = config.get("backend", "memory")
+    if backend == "sqlite":
+        return SQLiteBucketStore(config.get("sqlite_path", ".cache/rate_limits.sqlite3"))
+    if backend == "redis":
+        return RedisBucketStore(config.get("redis_url", "redis://localhost:6379/0"))
+    return MemoryBucketStore()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Get the process-wide limiter configured by RATE_LIMIT_CONFIG"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if RATE_LIMIT_CONFIG.get("enabled", True):
+                    _limiter = RateLimiter(_build_store(RATE_LIMIT_CONFIG), RATE_LIMIT_CONFIG)
+                else:
+                    _limiter = _Unlimited()
+    return _limiter
@@ -0,0 +1,181 @@
+"""
+AI Idea Lab - Report Export
+Renders a finished discussion in the downloadable formats (TXT, MD, JSON, HTML, CSV).
+Shared by the Streamlit download buttons and the batch CLI.
+"""
+import csv
+import datetime
+import io
+import json
+import re
+
+# Format -> (label, file extension, MIME type)
+REPORT_FORMATS = {
+    "txt": ("TXT", "txt", "text/plain"),
+    "md": ("MD", "md", "text/plain"),
+    "json": ("JSON", "json", "application/json"),
+    "html": ("HTML", "html", "text/html"),
+    "csv": ("CSV", "csv", "text/csv"),
+}
+
+
+def safe_filename(topic: str) -> str:
+    """Filename stem from the first 30 characters of the topic"""
+    return re.sub(r'[^\w\s-]', '', topic[:30]).strip().replace(' ', '_') or 'report'
+
+
+def build_report(topic: str, facilitator: str, summary: str, discussion: list, full_report: str = None) -> dict:
+    """
+    Format-independent report model that every renderer reads from.
+    Returns: {"topic", "facilitator", "summary", "full_report", "timestamp",
+              "entries": [{"round", "model", "personality", "content"}]}
+    """
+    return {
+        "topic": topic,
+        "facilitator": facilitator,
+        "summary": summary,
+        "full_report": full_report or "",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "entries": [
+            {
+                "round": i,
+                "model": msg.get("model") or "Unknown",
+                "personality": msg.get("personality") or "",
+                "content": msg.get("content") or "",
+            }
+            for i, msg in enumerate(discussion, 1)
+        ],
+    }
+
+
+# Renderers yield the document in pieces; render() joins them once
+def iter_text(report: dict):
+    yield report["full_report"]
+
+
+def iter_markdown(report: dict):
+    yield f"""# X-Think Idea Synthesis Report
+
+## Topic
+{report["topic"]}
+
+## Discussion Summary
+**Facilitator:** {report["facilitator"]}
+
+{report["summary"]}
+
+## Discussion History
+"""
+    for entry in report["entries"]:
+        yield f"\n### Round {entry['round']}: {entry['model']}\n"
+        if entry["personality"]:
+            yield f"*Personality: {entry['personality']}*\n\n"
+        yield f"{entry['content']}\n"
+
+
+def iter_json(report: dict):
+    json_data = {
+        "topic": report["topic"],
+        "facilitator": report["facilitator"],
+        "summary": report["summary"],
+        "discussion_history": report["entries"],
+        "metadata": {
+            "generated_by": "X-Think",
+            "timestamp": report["timestamp"]
+        }
+    }
+    yield from json.JSONEncoder(ensure_ascii=False, indent=2).iterencode(json_data)
+
+
+def iter_html(report: dict):
+    topic = report["topic"]
+    yield f"""<!DOCTYPE html>
+<html lang="ja">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>X-Think Report: {topic[:50]}</title>
+    <style>
+        body {{ font-family: 'Inter', sans-serif; max-width: 800px; margin: 0 auto; padding: 2rem; background: #1a1a1a; color: #f0f0f0; }}
+        h1 {{ color: #D4AF37; border-bottom: 2px solid #D4AF37; padding-bottom: 0.5rem; }}
+        h2 {{ color: #D4AF37; }}
+        .summary {{ background: #2a2a2a; padding: 1.5rem; border-radius: 8px; border-left: 4px solid #D4AF37; }}
+        .message {{ background: #252525; padding: 1rem; border-radius: 8px; margin: 1rem 0; }}
+        .model {{ color: #D4AF37; font-weight: bold; }}
+        .personality {{ color: #888; font-size: 0.9rem; }}
+    </style>
+</head>
+<body>
+    <h1>✦ X-Think Idea Synthesis Report</h1>
+    <h2>Topic</h2>
+    <p>{topic}</p>
+    <h2>Summary</h2>
+    <div class="summary">
+        <p><strong>Facilitator:</strong> {report["facilitator"]}</p>
+        <div>{report["summary"].replace(chr(10), '<br>')}</div>
+    </div>
+    <h2>Discussion History</h2>
+"""
+    for entry in report["entries"]:
+        yield f"""    <div class="message">
+        <p class="model">Round {entry['round']}: {entry['model']}</p>
+        {"<p class='personality'>Personality: " + entry['personality'] + "</p>" if entry['personality'] else ""}
+        <p>{entry['content'].replace(chr(10), '<br>')}</p>
+    </div>
+"""
+    yield """</body>
+</html>"""
+
+
+def iter_csv(report: dict):
+    csv_buffer = io.StringIO()
+    writer = csv.writer(csv_buffer)
+
+    def flush():
+        row = csv_buffer.getvalue()
+        csv_buffer.seek(0)
+        csv_buffer.truncate()
+        return row
+
+    writer.writerow(["Round", "Model", "Personality", "Content"])
+    yield flush()
+    for entry in report["entries"]:
+        writer.writerow([entry["round"], entry["model"], entry["personality"], entry["content"]])
+        yield flush()
+    writer.writerow([])
+    writer.writerow(["Summary", report["facilitator"], "", report["summary"]])
+    yield flush()
+
+
+RENDERERS = {
+    "txt": iter_text,
+    "md": iter_markdown,
+    "json": iter_json,
+    "html": iter_html,
+    "csv": iter_csv,
+}
+
+
+def render(report: dict, fmt: str) -> str:
+    return "".join(RENDERERS[fmt](report))
+
+
+class ReportExports:
+    """Export payloads of one report; each format is rendered on first access and kept"""
+
+    def __init__(self, report: dict):
+        self.report = report
+        self._rendered = {}
+
+    def __getitem__(self, fmt: str) -> str:
+        if fmt not in self._rendered:
+            self._rendered[fmt] = render(self.report, fmt)
+        return self._rendered[fmt]
+
+
+def render_reports(topic: str, facilitator: str, summary: str, discussion: list, full_report: str) -> ReportExports:
+    """
+    Export formats for one discussion, rendered lazily.
+    Returns: ReportExports, indexable by "txt", "md", "json", "html", "csv"
+    """
+    return ReportExports(build_report(topic, facilitator, summary, discussion, full_report))
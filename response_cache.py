@@ -0,0 +1,227 @@
+"""
+AI Idea Lab - Response Cache
+Content-addressed cache for LLM responses, keyed by a hash of the normalized request.
+Backends: in-memory LRU, SQLite on local disk, or Firestore (optional).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import RESPONSE_CACHE_CONFIG
+
+try:
+    from google.cloud import firestore
+    FIRESTORE_AVAILABLE = True
+except ImportError:
+    FIRESTORE_AVAILABLE = False
+
+
+def normalize_text(text: str) -> str:
+    """Normalize whitespace so cosmetic differences don't produce different keys"""
+    if not text:
+        return ""
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+def make_cache_key(provider: str, model_id: str, system_prompt: str, prompt: str,
+                   temperature: float = None, max_tokens: int = None, attachment: bytes = None) -> str:
+    """SHA-256 over (provider, model_id, system prompt, user prompt, temperature, max_tokens[, attachment])"""
+    payload = json.dumps(
+        [provider, model_id, normalize_text(system_prompt), normalize_text(prompt), temperature, max_tokens],
+        ensure_ascii=False
+    )
+    digest = hashlib.sha256(payload.encode("utf-8"))
+    if attachment:
+        digest.update(hashlib.sha256(attachment).digest())
+    return digest.hexdigest()
+
+
+# --- Backends ---
+class MemoryCacheBackend:
+    """In-process LRU with an entry cap."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float = None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """On-disk cache shared by every process on the host; evicts least recently used entries."""
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at and expires_at < now:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str, ttl: float = None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl if ttl else None, now)
+            )
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM response_cache")
+
+
+class FirestoreCacheBackend:
+    """Firestore collection shared by every Cloud Run instance. Expiry is checked on read."""
+
+    def __init__(self, collection: str = "response_cache"):
+        if not FIRESTORE_AVAILABLE:
+            raise RuntimeError("google-cloud-firestore library not installed.")
+        self._collection = firestore.Client().collection(collection)
+
+    def get(self, key: str):
+        snapshot = self._collection.document(key).get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        if data.get("expires_at") and data["expires_at"] < time.time():
+            return None
+        return data.get("value")
+
+    def set(self, key: str, value: str, ttl: float = None):
+        self._collection.document(key).set({
+            "value": value,
+            "expires_at": time.time() + ttl if ttl else None,
+        })
+
+    def clear(self):
+        for doc in self._collection.list_documents():
+            doc.delete()
+
+
+# --- Cache Front ---
+class ResponseCache:
+    """Cache front with a bypass policy and hit/miss counters."""
+
+    def __init__(self, backend, ttl: float = None, max_cacheable_temperature: float = 0.0, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_cacheable_temperature = max_cacheable_temperature
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def should_bypass(self, temperature: float = None) -> bool:
+        """Creative (high temperature) runs are meant to differ every time, so they skip the cache"""
+        return not self.enabled or (temperature is not None and temperature > self.max_cacheable_temperature)
+
+    def get(self, key: str):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Response cache read failed: {e}")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str):
+        if not value:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"Response cache write failed: {e}")
+
+    def bypass(self):
+        self._count("bypassed")
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+def _build_backend(config: dict):
+    backend = config.get("backend", "memory")
+    if backend == "sqlite":
+        return SQLiteCacheBackend(config.get("sqlite_path", ".cache/responses.sqlite3"),
+                                  config.get("max_entries", 512))
+    if backend == "firestore":
+        try:
+            return FirestoreCacheBackend(config.get("firestore_collection", "response_cache"))
+        except Exception as e:
+            print(f"Firestore response cache unavailable, using memory: {e}")
+    return MemoryCacheBackend(config.get("max_entries", 512))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache configured by RESPONSE_CACHE_CONFIG"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    _build_backend(RESPONSE_CACHE_CONFIG),
+                    ttl=RESPONSE_CACHE_CONFIG.get("ttl_seconds"),
+                    max_cacheable_temperature=RESPONSE_CACHE_CONFIG.get("max_cacheable_temperature", 0.0),
+                    enabled=RESPONSE_CACHE_CONFIG.get("enabled", True),
+                )
+    return _cache
@@ -0,0 +1,55 @@
+"""
+AI Idea Lab - Retry Policy
+Exponential backoff with full jitter for retryable provider errors, honoring the
+provider's Retry-After hint. Non-retryable errors (missing key, auth, content
+filter, bad request, unrecognized exceptions) fail immediately.
+"""
+import random
+import time
+
+from config import RETRY_CONFIG
+from providers import classify_error
+
+
+class RetryPolicy:
+    """Backoff schedule for provider calls."""
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 1.0, max_delay: float = 20.0,
+                 max_retry_after: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_config(cls, **overrides) -> "RetryPolicy":
+        return cls(**{**RETRY_CONFIG, **overrides})
+
+    def delay(self, attempt: int, error=None) -> float:
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        if error is not None and error.retry_after is not None:
+            # The provider told us when to come back; a little jitter avoids a synchronized stampede
+            return min(error.retry_after, self.max_retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def call_with_retry(fn, policy: RetryPolicy = None, on_retry=None, provider: str = "", model: str = ""):
+    """
+    Call fn() and retry retryable failures per the policy.
+    on_retry(attempt, error, delay) is called before each wait (e.g. to show a warning).
+    Returns fn()'s result; raises ProviderError when retries are exhausted or the error is fatal.
+    """
+    policy = policy or RetryPolicy.from_config()
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            error = classify_error(e, provider=provider, model=model)
+            if not error.retryable or attempt >= policy.max_retries:
+                raise error from e
+            delay = policy.delay(attempt, error)
+            if on_retry:
+                on_retry(attempt, error, delay)
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,223 @@
+"""
+AI Idea Lab - Model Routing
+Tracks rolling latency and error rates per model, trips a circuit breaker on
+failing models, and reroutes turns to fallback models (same tier, another
+provider first) when a model is failing or too slow.
+"""
+import threading
+import time
+from collections import deque
+
+from config import ALL_MODELS, MODEL_TIERS, FALLBACK_MODELS, ROUTING_CONFIG
+from providers import get_adapter, ProviderError, request_timing
+
+
+def percentile(values: list, q: float) -> float | None:
+    """q-th percentile (0-100) by nearest rank"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class ModelHealth:
+    """Rolling outcomes for one model plus its circuit breaker state."""
+
+    def __init__(self):
+        self.samples = deque()  # (timestamp, latency_seconds | None, latency kind, ok)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def prune(self, now: float):
+        window = ROUTING_CONFIG.get("window_seconds", 300)
+        while self.samples and self.samples[0][0] < now - window:
+            self.samples.popleft()
+
+    def latencies(self, kind: str = "ttft") -> list:
+        """Successful latencies of one kind: "ttft" (streams) or "complete" (whole non-streamed calls)"""
+        return [latency for _, latency, sample_kind, ok in self.samples
+                if ok and latency is not None and sample_kind == kind]
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for *_, ok in self.samples if not ok) / len(self.samples)
+
+    def slow_latency(self) -> tuple | None:
+        """(kind, p95) of the first latency kind whose p95 is over its SLO (needs enough samples)"""
+        slos = ROUTING_CONFIG.get("latency_slo_seconds", {})
+        for kind in ("ttft", "complete"):
+            latencies = self.latencies(kind)
+            if len(latencies) >= ROUTING_CONFIG.get("min_samples", 4) and kind in slos:
+                p95 = percentile(latencies, 95)
+                if p95 > slos[kind]:
+                    return kind, p95
+        return None
+
+
+class ModelRouter:
+    """Process-wide health registry and fallback selection."""
+
+    def __init__(self):
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model_name: str) -> ModelHealth:
+        if model_name not in self._health:
+            self._health[model_name] = ModelHealth()
+        return self._health[model_name]
+
+    # --- Recording ---
+    def record_success(self, model_name: str, latency: float = None, kind: str = "ttft"):
+        """
+        latency: time to first token (kind "ttft") or of the whole call (kind "complete");
+        None when the answer came from the cache. Each kind has its own SLO.
+        """
+        now = time.time()
+        with self._lock:
+            health = self._get(model_name)
+            health.samples.append((now, latency, kind, True))
+            health.prune(now)
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+
+    def record_failure(self, model_name: str, error: ProviderError = None, latency: float = None):
+        # Errors that say nothing about the model's health don't count against it
+        if error is not None and error.kind in ("not_configured", "bad_request", "content_filter"):
+            return
+        now = time.time()
+        with self._lock:
+            health = self._get(model_name)
+            health.samples.append((now, latency, None, False))
+            health.prune(now)
+            health.consecutive_failures += 1
+            too_many_failures = health.consecutive_failures >= ROUTING_CONFIG.get("consecutive_failures", 3)
+            error_rate_high = (len(health.samples) >= ROUTING_CONFIG.get("min_samples", 4)
+                               and health.error_rate() >= ROUTING_CONFIG.get("error_rate_threshold", 0.5))
+            if too_many_failures or error_rate_high:
+                health.open_until = now + ROUTING_CONFIG.get("cooldown_seconds", 60)
+
+    # --- Health queries ---
+    def latency_percentile(self, model_name: str, q: float, kind: str = "ttft") -> float | None:
+        with self._lock:
+            health = self._get(model_name)
+            health.prune(time.time())
+            return percentile(health.latencies(kind), q)
+
+    def is_open(self, model_name: str) -> bool:
+        """Circuit breaker open (model skipped until its cooldown has passed)"""
+        with self._lock:
+            return time.time() < self._get(model_name).open_until
+
+    def start_call(self, model_name: str):
+        """
+        Called before each call to a model. The first call after the cooldown is the half-open
+        trial: the breaker re-arms, so concurrent callers keep skipping the model until the trial
+        succeeds (record_success closes it); a failed trial waits another cooldown.
+        """
+        now = time.time()
+        with self._lock:
+            health = self._get(model_name)
+            if health.open_until and now >= health.open_until:
+                health.open_until = now + ROUTING_CONFIG.get("cooldown_seconds", 60)
+
+    def is_slow(self, model_name: str) -> bool:
+        """Rolling p95 TTFT or whole-call latency above its SLO (needs enough samples to judge)"""
+        with self._lock:
+            health = self._get(model_name)
+            health.prune(time.time())
+            return health.slow_latency() is not None
+
+    def is_healthy(self, model_name: str) -> bool:
+        return not self.is_open(model_name) and not self.is_slow(model_name)
+
+    def snapshot(self) -> dict:
+        """
+        {model: {"p50", "p95", "p95_complete", "error_rate", "open", "slow"}} for display.
+        p50/p95 are time to first token; slow is the (kind, p95) over its SLO, or None.
+        """
+        now = time.time()
+        with self._lock:
+            result = {}
+            for model_name, health in self._health.items():
+                health.prune(now)
+                latencies = health.latencies("ttft")
+                result[model_name] = {
+                    "p50": percentile(latencies, 50),
+                    "p95": percentile(latencies, 95),
+                    "p95_complete": percentile(health.latencies("complete"), 95),
+                    "error_rate": health.error_rate(),
+                    "open": now < health.open_until,
+                    "slow": health.slow_latency(),
+                }
+            return result
+
+    # --- Fallbacks ---
+    def fallbacks(self, model_name: str, exclude: list = ()) -> list:
+        """
+        Fallback candidates for a model, best first: explicit FALLBACK_MODELS, then the same
+        tier at another provider, then the same tier at the same provider. Models in `exclude`
+        (e.g. already in the discussion) are tried last. Only providers with keys are returned.
+        """
+        if model_name in FALLBACK_MODELS:
+            candidates = list(FALLBACK_MODELS[model_name])
+        else:
+            provider = ALL_MODELS[model_name][0]
+            tier = MODEL_TIERS.get(model_name)
+            same_tier = [m for m in ALL_MODELS if m != model_name and MODEL_TIERS.get(m) == tier]
+            # Spread over providers first: the best model of each other provider, then the rest
+            others = [m for m in same_tier if ALL_MODELS[m][0] != provider]
+            firsts = [m for n, m in enumerate(others)
+                      if ALL_MODELS[m][0] not in {ALL_MODELS[o][0] for o in others[:n]}]
+            candidates = (firsts + [m for m in others if m not in firsts]
+                          + [m for m in same_tier if ALL_MODELS[m][0] == provider])
+        candidates = [m for m in candidates if m in ALL_MODELS and get_adapter(ALL_MODELS[m][0]).available]
+        candidates.sort(key=lambda m: m in exclude)  # stable: keeps preference order otherwise
+        return candidates[:ROUTING_CONFIG.get("max_fallbacks", 2)]
+
+    def route(self, model_name: str, exclude: list = ()) -> list:
+        """Models to try for a turn, in order. An unhealthy primary goes after its healthy fallbacks."""
+        if not ROUTING_CONFIG.get("enabled", True):
+            return [model_name]
+        fallbacks = self.fallbacks(model_name, exclude)
+        if self.is_healthy(model_name):
+            return [model_name] + fallbacks
+        healthy = [m for m in fallbacks if self.is_healthy(m)]
+        return healthy + [model_name] + [m for m in fallbacks if m not in healthy]
+
+
+_router = ModelRouter()
+
+
+def get_router() -> ModelRouter:
+    return _router
+
+
+def call_with_fallback(model_name: str, fn, exclude: list = (), on_reroute=None):
+    """
+    Run fn(candidate_model) on the routed candidates until one succeeds.
+    on_reroute(from_model, to_model, error) is called when moving to the next candidate
+    (error is None when the primary was skipped because it's unhealthy).
+    Returns (model_used, result); raises the last ProviderError if every candidate fails.
+    """
+    router = get_router()
+    candidates = router.route(model_name, exclude)
+    if candidates[0] != model_name and on_reroute:
+        on_reroute(model_name, candidates[0], None)
+    last_error = None
+    for index, candidate in enumerate(candidates):
+        router.start_call(candidate)
+        try:
+            # Latency of the attempt that answered (TTFT), without retry sleeps or queueing
+            with request_timing() as timing:
+                result = fn(candidate)
+        except ProviderError as e:
+            router.record_failure(candidate, e)
+            last_error = e
+            if index + 1 < len(candidates) and on_reroute:
+                on_reroute(candidate, candidates[index + 1], e)
+            continue
+        router.record_success(candidate, timing.latency, timing.kind)
+        return candidate, result
+    raise last_error
@@ -0,0 +1,144 @@
+"""
+AI Idea Lab - Hierarchical Synthesis
+Map-reduce preparation of long discussion logs for the facilitator: each round is
+summarized concurrently with a lightweight model (in the background while the next
+round runs), and the facilitator works from the round summaries instead of a
+truncated log.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ROUND_SUMMARY_PROMPT, SYNTHESIS_CONFIG
+from providers import first_available
+
+
+def chunk_log(full_log: str, max_chars: int) -> list:
+    """Split a log into chunks of whole messages (fallback when per-round logs aren't available)"""
+    chunks, current = [], ""
+    for message in full_log.split("\n\n"):
+        if current and len(current) + len(message) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{message}" if current else message
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def summarize_round(round_number: int, round_log: str, topic: str, clients: dict) -> str:
+    """
+    Summarize one round with a lightweight model.
+    Falls back to the raw (truncated) round log if no model is available or the call fails.
+    """
+    fallback = round_log[:SYNTHESIS_CONFIG.get("fallback_round_chars", 4000)]
+    selected = first_available("summary", clients)
+    if not selected:
+        return fallback
+    adapter, model_id = selected
+    prompt = ROUND_SUMMARY_PROMPT.format(round_number=round_number, topic=topic, round_log=round_log)
+    try:
+        return adapter.complete(
+            model_id, "", prompt,
+            temperature=0.2, max_tokens=SYNTHESIS_CONFIG.get("round_summary_max_tokens", 600)
+        ).strip() or fallback
+    except Exception as e:
+        print(f"Round {round_number} summary failed: {e}")
+        return fallback
+
+
+def summarize_rounds(round_logs: list, topic: str, clients: dict) -> list:
+    """Summarize all rounds concurrently; results keep the round order"""
+    if not round_logs:
+        return []
+    workers = min(len(round_logs), SYNTHESIS_CONFIG.get("max_workers", 5))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda item: summarize_round(item[0], item[1], topic, clients),
+            enumerate(round_logs, 1)
+        ))
+
+
+def format_round_summaries(summaries: list) -> str:
+    return "\n\n".join(f"### Round {i}\n{summary}" for i, summary in enumerate(summaries, 1))
+
+
+def use_map_reduce(log_chars: int) -> bool:
+    """Whether the facilitator should work from round summaries (SYNTHESIS_CONFIG["mode"])"""
+    mode = SYNTHESIS_CONFIG.get("mode", "auto")
+    if mode == "always":
+        return True
+    if mode == "never":
+        return False
+    return log_chars > SYNTHESIS_CONFIG.get("map_reduce_threshold_chars", 32000)
+
+
+def prepare_discussion_log(full_log: str, topic: str, clients: dict, round_logs: list = None,
+                           round_summaries: list = None) -> tuple:
+    """
+    Returns (log_text, section_title) for the facilitator prompt.
+    Short discussions are passed through; long ones are reduced to per-round summaries
+    (taken from round_summaries when they were already computed during the discussion).
+    """
+    if not use_map_reduce(len(full_log)):
+        return full_log, "Discussion Log"
+    if not round_summaries:
+        if not round_logs:
+            round_logs = chunk_log(full_log, SYNTHESIS_CONFIG.get("chunk_chars", 8000))
+        round_summaries = summarize_rounds(round_logs, topic, clients)
+    return format_round_summaries(round_summaries), "Discussion Summary by Round"
+
+
+class RoundSummarizer:
+    """
+    Summarizes finished rounds in the background while the next round runs. The summaries
+    stand in for older rounds in the collaborators' context (see summaries()), and the
+    facilitator only has to merge them at the end when map-reduce synthesis is used.
+    """
+
+    def __init__(self, topic: str, clients: dict):
+        self.topic = topic
+        self.clients = clients
+        self._round_logs = []
+        self._futures = {}  # round index -> Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=SYNTHESIS_CONFIG.get("max_workers", 5),
+            thread_name_prefix="round-summary"
+        )
+
+    def _submit(self, index: int, round_log: str):
+        if index not in self._futures:
+            self._futures[index] = self._executor.submit(
+                summarize_round, index + 1, round_log, self.topic, self.clients
+            )
+
+    def add_round(self, round_log: str):
+        """Record a finished round and start summarizing it"""
+        with self._lock:
+            self._round_logs.append(round_log)
+            self._submit(len(self._round_logs) - 1, round_log)
+
+    def summaries(self) -> dict:
+        """{round_index: summary} for the rounds summarized so far (never blocks)"""
+        with self._lock:
+            futures = dict(self._futures)
+        return {index: future.result() for index, future in futures.items()
+                if future.done() and future.exception() is None}
+
+    def finish(self, round_logs: list) -> list:
+        """Summaries for every round (waits for background work, summarizes any rounds not started yet)"""
+        with self._lock:
+            for index, log in enumerate(round_logs):
+                # A round whose text changed since add_round() (shouldn't happen) is redone
+                if index < len(self._round_logs) and self._round_logs[index] != log:
+                    self._futures.pop(index, None)
+                self._submit(index, log)
+            futures = [self._futures[index] for index in range(len(round_logs))]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            self.close()
+
+    def close(self):
+        """Release the worker threads (running summaries finish in the background)"""
+        self._executor.shutdown(wait=False)
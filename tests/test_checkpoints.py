@@ -0,0 +1,47 @@
+"""Checkpoint layout: write-once parts, small per-turn progress records, visible write failures"""
+from checkpoints import SQLiteCheckpointStore, CheckpointWriter
+
+
+CONFIG = {
+    "topic": "Test topic",
+    "rounds": 2,
+    "file_content": [{"file_info": {"name": "a.txt"}, "content": "本文" * 1000}, {"content": "second"}],
+}
+
+
+def test_config_documents_and_result_round_trip(tmp_path):
+    store = SQLiteCheckpointStore(str(tmp_path / "checkpoints.db"))
+    writer = CheckpointWriter(store, "s1")
+    assert writer.save_config(CONFIG)
+    writer.save_turn(0, 0, {"content": "first turn"})
+    writer.save_session({"status": "discussion", "current_round": 0, "current_model": 1})
+
+    session = store.load("s1")
+    assert session["config"] == CONFIG
+    assert session["turns"] == [{"content": "first turn"}]
+    assert session["current_model"] == 1
+    assert session["conclusion"] is None
+
+    writer.save_result({"conclusion": "done", "full_report": "report"})
+    writer.save_session({"status": "done", "current_round": 1, "current_model": 0})
+    session = store.load("s1")
+    assert session["status"] == "done" and session["conclusion"] == "done"
+
+
+def test_progress_record_stays_small(tmp_path):
+    store = SQLiteCheckpointStore(str(tmp_path / "checkpoints.db"))
+    writer = CheckpointWriter(store, "s1")
+    writer.save_config(CONFIG)
+    writer.save_session({"status": "discussion", "current_round": 0, "current_model": 0})
+    (data,) = store._conn.execute("SELECT data FROM sessions WHERE session_id = 's1'").fetchone()
+    assert "本文" not in data and len(data) < 200
+
+
+def test_write_failures_are_recorded():
+    class BrokenStore:
+        def save_session(self, session_id, data):
+            raise OSError("disk full")
+
+    writer = CheckpointWriter(BrokenStore(), "s1")
+    assert not writer.save_session({"status": "discussion"})
+    assert writer.error == "disk full" and writer.failed_writes == 1
@@ -0,0 +1,32 @@
+"""Context for collaborator turns: older rounds by their summaries, budgets not below the old caps"""
+from context_builder import ContextBuilder, token_budget, truncate_to_tokens
+
+
+def _discussion(rounds: int, models: int = 3):
+    history_log, round_starts = [], []
+    for r in range(rounds):
+        round_starts.append(len(history_log))
+        for m in range(models):
+            history_log.append(f"[model-{m} (Persona)]: First point of round {r + 1}. " + "Detail. " * 200)
+    return history_log, round_starts
+
+
+def test_older_rounds_use_round_summaries():
+    history_log, round_starts = _discussion(3)
+    summaries = {0: "Round one summary", 1: "Round two summary"}
+    context = ContextBuilder(history_log, max_recent_turns=3, round_starts=round_starts,
+                             round_summaries=lambda: summaries).build("gpt-4o")
+    assert "Round 1:\nRound one summary" in context
+    assert "Round 2:\nRound two summary" in context
+    assert context.count("First point of round 3") == 3  # Latest round verbatim
+
+
+def test_unsummarized_rounds_keep_more_than_the_first_sentence():
+    history_log, round_starts = _discussion(3)
+    context = ContextBuilder(history_log, max_recent_turns=3, round_starts=round_starts).build("gpt-4o")
+    assert "- [model-0 (Persona)]: First point of round 1. Detail. Detail." in context
+
+
+def test_document_budget_not_below_the_old_character_cap():
+    japanese = "議" * 8000
+    assert truncate_to_tokens(japanese, token_budget("gpt-4o", "document_tokens"), "gpt-4o") == japanese
@@ -0,0 +1,122 @@
+"""Deterministic checks for the streaming statistics in data_profile.py"""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from data_profile import ColumnProfile, HyperLogLog, Reservoir  # noqa: E402
+
+
+def _random_hashes(count: int, seed: int = 0):
+    return np.random.default_rng(seed).integers(0, np.iinfo(np.uint64).max, size=count, dtype=np.uint64,
+                                                endpoint=True)
+
+
+# --- HyperLogLog ---
+@pytest.mark.parametrize("distinct", [50_000, 200_000])
+def test_hyperloglog_large_cardinality_within_error_bound(distinct):
+    hll = HyperLogLog(precision=12)
+    hashes = _random_hashes(distinct)
+    for chunk in np.array_split(hashes, 7):
+        hll.add_hashes(chunk)
+    # Standard error is 1.04 / sqrt(4096) ~ 1.6%; allow about 3 standard errors
+    assert abs(hll.count() - distinct) / distinct < 0.05
+
+
+def test_hyperloglog_small_cardinality_uses_linear_counting():
+    hll = HyperLogLog(precision=12)
+    hll.add_hashes(_random_hashes(100))
+    assert abs(hll.count() - 100) <= 3
+
+
+def test_hyperloglog_ignores_duplicates():
+    hll = HyperLogLog(precision=12)
+    hashes = _random_hashes(10_000)
+    hll.add_hashes(hashes)
+    before = hll.count()
+    hll.add_hashes(hashes[::-1])
+    hll.add_hashes(hashes[:5000])
+    assert hll.count() == before
+
+
+def test_hyperloglog_empty():
+    hll = HyperLogLog(precision=10)
+    hll.add_hashes(np.array([], dtype=np.uint64))
+    assert hll.count() == 0
+
+
+# --- Reservoir ---
+def test_reservoir_keeps_everything_until_full():
+    reservoir = Reservoir(10, np.random.default_rng(0))
+    reservoir.offer(list(range(4)))
+    reservoir.offer(list(range(4, 7)))
+    assert reservoir.items == list(range(7))
+    assert reservoir.seen == 7
+
+
+def test_reservoir_size_is_bounded_and_items_come_from_the_stream():
+    reservoir = Reservoir(10, np.random.default_rng(0))
+    for start in range(0, 1000, 37):
+        reservoir.offer(list(range(start, min(start + 37, 1000))))
+    assert len(reservoir.items) == 10
+    assert len(set(reservoir.items)) == 10
+    assert all(0 <= item < 1000 for item in reservoir.items)
+    assert reservoir.seen == 1000
+
+
+def test_reservoir_sample_is_uniform():
+    rng = np.random.default_rng(1)
+    trials, population, size = 2000, 100, 10
+    counts = np.zeros(population)
+    for _ in range(trials):
+        reservoir = Reservoir(size, rng)
+        for start in range(0, population, 7):  # Uneven chunks cross the fill boundary
+            reservoir.offer(list(range(start, min(start + 7, population))))
+        counts[reservoir.items] += 1
+    expected = trials * size / population  # 200, standard deviation ~13.4
+    assert np.all(np.abs(counts - expected) < 5 * np.sqrt(expected * (1 - size / population)))
+    # Early and late items are equally likely
+    assert abs(counts[:50].mean() - counts[50:].mean()) < 10
+
+
+# --- Mean / standard deviation merge ---
+@pytest.mark.parametrize("chunk_sizes", [[1000], [1, 999], [250, 250, 250, 250], [3, 500, 1, 496]])
+def test_merge_moments_matches_numpy(chunk_sizes):
+    values = np.random.default_rng(2).normal(1e6, 37.5, size=sum(chunk_sizes))
+    profile = ColumnProfile("x", {}, np.random.default_rng(0))
+    for chunk in np.split(values, np.cumsum(chunk_sizes)[:-1]):
+        profile._merge_moments(len(chunk), float(chunk.mean()), float(((chunk - chunk.mean()) ** 2).sum()))
+
+    assert profile.numeric_count == len(values)
+    assert profile.mean == pytest.approx(values.mean(), rel=1e-12)
+    std = np.sqrt(profile.m2 / (profile.numeric_count - 1))
+    assert std == pytest.approx(values.std(ddof=1), rel=1e-9)
+
+
+def test_summary_stats_from_series_chunks():
+    pd = pytest.importorskip("pandas")
+    values = np.random.default_rng(3).exponential(5.0, size=3000)
+    profile = ColumnProfile("x", {}, np.random.default_rng(0))
+    for chunk in np.array_split(values, 4):
+        profile.update(pd.Series(chunk))
+    row = profile.summary(top_k=5)
+    assert row["mean"] == pytest.approx(values.mean())
+    assert row["std"] == pytest.approx(values.std(ddof=1))
+    assert row["min"] == values.min() and row["max"] == values.max()
+    assert abs(row["distinct≈"] - len(values)) / len(values) < 0.05
+
+
+def test_numeric_column_with_a_mixed_dtype_chunk():
+    pd = pytest.importorskip("pandas")
+    from data_profile import render_profile
+    profile = ColumnProfile("x", {}, np.random.default_rng(0))
+    profile.update(pd.Series([1.0, 2.0, 3.0]))
+    profile.update(pd.Series(["4", "N/A", "5.5", None], dtype=object))  # Read as object dtype
+    row = profile.summary(top_k=5)
+    assert row["mean"] == pytest.approx(np.mean([1.0, 2.0, 3.0, 4.0, 5.5]))
+    assert row["max"] == 5.5 and row["non_numeric"] == 1
+    assert "top" not in row
+
+    rendered = render_profile({"column_stats": [row], "columns": ["x"], "profiled_columns": 1, "rows": 7,
+                               "preview": pd.DataFrame(), "sample": pd.DataFrame()})
+    assert "x: 1 non-numeric values left out of the statistics" in rendered
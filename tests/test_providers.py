@@ -0,0 +1,52 @@
+"""Provider clients are built on the pooled HTTP client with the installed SDK versions"""
+import pytest
+
+openai = pytest.importorskip("openai")
+anthropic = pytest.importorskip("anthropic")
+pytest.importorskip("google.generativeai")
+
+import providers  # noqa: E402
+from config import PROVIDER_POOL_CONFIG  # noqa: E402
+
+
+@pytest.mark.parametrize("sdk, client_class", [(openai, openai.OpenAI), (anthropic, anthropic.Anthropic)])
+def test_sdk_client_accepts_pooled_http_client(sdk, client_class):
+    http_client = providers._build_http_client(sdk)
+    try:
+        client = client_class(api_key="test-key", http_client=http_client, max_retries=0)
+        assert client._client is http_client
+        assert http_client.timeout.read == PROVIDER_POOL_CONFIG.get("read_timeout", 120)
+        assert http_client.timeout.connect == PROVIDER_POOL_CONFIG.get("connect_timeout", 10)
+    finally:
+        http_client.close()
+
+
+def test_build_clients_builds_every_configured_provider(monkeypatch):
+    monkeypatch.setattr(providers, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(providers, "ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setattr(providers, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(providers, "_clients", None)
+
+    clients = providers.get_clients()
+    assert providers.client_errors() == {}
+    assert isinstance(clients["openai"], openai.OpenAI)
+    assert isinstance(clients["anthropic"], anthropic.Anthropic)
+    assert clients["google"] is True
+    # The batch APIs used by batch mode exist on these SDK versions
+    assert hasattr(clients["openai"], "batches")
+    assert hasattr(clients["anthropic"].messages, "batches")
+
+
+def test_client_construction_failure_is_reported(monkeypatch):
+    monkeypatch.setattr(providers, "OPENAI_API_KEY", None)
+    monkeypatch.setattr(providers, "GOOGLE_API_KEY", None)
+    monkeypatch.setattr(providers, "ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setattr(providers, "_clients", None)
+
+    def broken(**kwargs):
+        raise TypeError("Invalid `http_client` argument")
+
+    monkeypatch.setattr(providers.anthropic, "Anthropic", broken)
+    clients = providers.get_clients()
+    assert clients["anthropic"] is None
+    assert "Invalid `http_client` argument" in providers.client_errors()["anthropic"]
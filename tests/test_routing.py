@@ -0,0 +1,35 @@
+"""Latency SLOs are judged separately for time to first token and whole-call latency"""
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("anthropic")
+pytest.importorskip("google.generativeai")
+
+from routing import ModelRouter  # noqa: E402
+from config import ROUTING_CONFIG  # noqa: E402
+
+
+def test_long_complete_calls_do_not_trip_the_ttft_slo():
+    router = ModelRouter()
+    for _ in range(10):
+        router.record_success("GPT-5", 2.0, "ttft")
+        router.record_success("GPT-5", ROUTING_CONFIG["latency_slo_seconds"]["ttft"] + 30, "complete")
+    assert not router.is_slow("GPT-5")
+    assert router.snapshot()["GPT-5"]["slow"] is None
+
+
+@pytest.mark.parametrize("kind", ["ttft", "complete"])
+def test_each_kind_over_its_own_slo_is_slow(kind):
+    router = ModelRouter()
+    for _ in range(ROUTING_CONFIG.get("min_samples", 4)):
+        router.record_success("GPT-5", ROUTING_CONFIG["latency_slo_seconds"][kind] + 1, kind)
+    assert router.is_slow("GPT-5")
+    assert router.snapshot()["GPT-5"]["slow"][0] == kind
+
+
+def test_cache_hits_record_no_latency():
+    router = ModelRouter()
+    for _ in range(10):
+        router.record_success("GPT-5", None)
+    assert router.latency_percentile("GPT-5", 95) is None
+    assert not router.is_slow("GPT-5")
@@ -0,0 +1,193 @@
+"""
+AI Idea Lab - Upload Cache
+Content-addressed cache for processed uploads (extracted PDF text, data summaries,
+vision descriptions), keyed by the SHA-256 of the file bytes plus the extractor
+version, so the same file uploaded by several users is processed once.
+Backends: a directory on local disk with an LRU size cap, or Firestore (optional).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from config import UPLOAD_CACHE_CONFIG
+
+try:
+    from google.cloud import firestore
+    FIRESTORE_AVAILABLE = True
+except ImportError:
+    FIRESTORE_AVAILABLE = False
+
+
+def make_upload_key(file_bytes: bytes, extractor: str) -> str:
+    """SHA-256 over (extractor, extractor version, file bytes)"""
+    version = UPLOAD_CACHE_CONFIG.get("extractor_versions", {}).get(extractor, 1)
+    digest = hashlib.sha256(f"{extractor}:{version}:".encode("utf-8"))
+    digest.update(file_bytes)
+    return digest.hexdigest()
+
+
+# --- Backends ---
+class DiskUploadCacheBackend:
+    """One JSON file per entry; the least recently read entries are evicted past max_bytes."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the LRU timestamp
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: str):
+        # Write to a temp file and rename, so a concurrent reader never sees half an entry
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)
+
+
+class FirestoreUploadCacheBackend:
+    """Firestore collection shared by every Cloud Run instance. Expiry is checked on read."""
+
+    def __init__(self, collection: str = "upload_cache", ttl: float = None):
+        if not FIRESTORE_AVAILABLE:
+            raise RuntimeError("google-cloud-firestore library not installed.")
+        self._collection = firestore.Client().collection(collection)
+        self.ttl = ttl
+
+    def get(self, key: str):
+        snapshot = self._collection.document(key).get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        if self.ttl and data.get("created_at", 0) + self.ttl < time.time():
+            return None
+        return data.get("value")
+
+    def set(self, key: str, value: str):
+        self._collection.document(key).set({"value": value, "created_at": time.time()})
+
+    def clear(self):
+        for doc in self._collection.list_documents():
+            doc.delete()
+
+
+# --- Cache Front ---
+class UploadCache:
+    """Get-or-process front; concurrent uploads of the same file wait for one extraction."""
+
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [Lock, waiters]
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Upload cache read failed: {e}")
+            return None
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, result: dict):
+        try:
+            self.backend.set(key, json.dumps(result, ensure_ascii=False))
+        except Exception as e:
+            print(f"Upload cache write failed: {e}")
+
+    def get_or_process(self, key: str, process) -> dict:
+        """
+        Cached result for key, or process() (cached when it succeeds).
+        Returns the result dict with "cached": True when it came from the cache.
+        """
+        if not self.enabled:
+            return process()
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                result = self.get(key)
+                if result is not None:
+                    with self._lock:
+                        self.stats["hits"] += 1
+                    return dict(result, cached=True)
+                with self._lock:
+                    self.stats["misses"] += 1
+                result = process()
+                if result.get("success"):
+                    self.set(key, result)
+                return result
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    self._key_locks.pop(key, None)
+
+
+def _build_backend(config: dict):
+    if config.get("backend", "disk") == "firestore":
+        try:
+            return FirestoreUploadCacheBackend(config.get("firestore_collection", "upload_cache"),
+                                               config.get("ttl_seconds"))
+        except Exception as e:
+            print(f"Firestore upload cache unavailable, using local disk: {e}")
+    return DiskUploadCacheBackend(config.get("disk_path", ".cache/uploads"),
+                                  int(config.get("max_size_mb", 200) * 1024 * 1024))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_upload_cache() -> UploadCache:
+    """Get the process-wide upload cache configured by UPLOAD_CACHE_CONFIG"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UploadCache(_build_backend(UPLOAD_CACHE_CONFIG),
+                                     enabled=UPLOAD_CACHE_CONFIG.get("enabled", True))
+    return _cache